@@ -0,0 +1,85 @@
+"""
+collision_primitives.fit_primitives on rotated, translated Box / Cylinder / Capsule /
+Sphere meshes (the expected primitive should win with an error close to 0) and on
+ellipsoids of increasing resolution (fit time), then fit_bounding_objects on a robot
+whose bounding objects USE the visual meshes.
+
+Usage:
+    python benchmarks/bench_collision_primitives.py [subdivisions ...]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import trimesh
+from trimesh.transformations import rotation_matrix
+
+from urdf_converter.core import proto_parser as proto
+from urdf_converter.core.collision_primitives import fit_bounding_objects, fit_primitives
+
+SHAPES = {
+    "Box": lambda: trimesh.creation.box([0.1, 0.2, 0.4]),
+    "Cylinder": lambda: trimesh.creation.cylinder(0.05, 0.3, sections=64),
+    "Capsule": lambda: trimesh.creation.capsule(0.2, 0.05, count=[32, 32]),
+    "Sphere": lambda: trimesh.creation.icosphere(4, radius=0.08),
+}
+
+
+def placed(mesh, seed):
+    """Random rotation and translation, so that no fit can rely on the link axes"""
+    rng = np.random.default_rng(seed)
+    transform = rotation_matrix(rng.uniform(0, np.pi), rng.normal(size=3))
+    transform[:3, 3] = rng.uniform(-0.5, 0.5, size=3)
+    return mesh.apply_transform(transform)
+
+
+def generate_robot(folder, links):
+    """One link per shape (cycled), visual Shape with a DEF Mesh and boundingObject USE"""
+    os.mkdir(os.path.join(folder, "meshes"))
+    lines = ["PROTO bench [", "]", "{", "Robot {", "children ["]
+    kinds = list(SHAPES)
+    for i in range(links):
+        placed(SHAPES[kinds[i % len(kinds)]](), i).export(os.path.join(folder, "meshes", f"link{i}.STL"))
+        lines += [
+            "Solid {", "children [", "Shape {", f"geometry DEF link{i} Mesh {{", f'url "./meshes/link{i}.STL"',
+            "}", "}", "]", f'name "link{i}"', f"boundingObject USE link{i}", "}",
+        ]
+    lines += ["]", "}", "}"]
+    path = os.path.join(folder, "bench.proto")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def main():
+    levels = [int(arg) for arg in sys.argv[1:]] or [3, 5, 7]
+    for seed, (kind, make) in enumerate(SHAPES.items()):
+        mesh = placed(make(), seed)
+        fits = fit_primitives(np.asarray(mesh.vertices), np.asarray(mesh.faces))
+        print(f"{kind:8s}: best {fits[0].kind:8s} error {fits[0].error:7.2%}  "
+              + "  ".join(f"{fit.kind} {fit.error:.2%}" for fit in fits[1:]))
+
+    for subdivisions in levels:
+        mesh = placed(trimesh.creation.icosphere(subdivisions, radius=0.1), subdivisions)
+        mesh.vertices *= [1.0, 0.6, 0.3]
+        vertices, faces = np.asarray(mesh.vertices), np.asarray(mesh.faces)
+        start = time.perf_counter()
+        fits = fit_primitives(vertices, faces)
+        print(f"ellipsoid {len(vertices):>7} vertices: {(time.perf_counter() - start) * 1e3:7.1f} ms  "
+              f"best {fits[0].kind} {fits[0].error:.1%}")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        robot = proto.proto_robot(proto_filename=generate_robot(tmpdir, 40))
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = fit_bounding_objects(robot, tmpdir)
+        replaced = sum(row.replaced for row in report)
+        print(f"fit_bounding_objects: {replaced}/{len(report)} replaced in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+convex_decomposition.decompose on convex and concave meshes (hull count, volume error,
+time), then decompose_stl_files on a set of STLs with 1 worker, with the process pool,
+and with a cold / warm ifs_cache.
+
+Usage:
+    python benchmarks/bench_convex_decomposition.py [links]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import trimesh
+
+from urdf_converter.core.convex_decomposition import decompose, decompose_stl_files
+from urdf_converter.core.ifs_cache import ifs_cache
+
+
+def extrude(outline, triangles, height):
+    """Prism over a counter-clockwise outline, triangles: triangulation of the outline"""
+    n = len(outline)
+    outline = np.asarray(outline, dtype=float)
+    vertices = np.vstack((np.c_[outline, np.zeros(n)], np.c_[outline, np.full(n, height)]))
+    faces = [(c, b, a) for a, b, c in triangles] + [(a + n, b + n, c + n) for a, b, c in triangles]
+    for i in range(n):
+        j = (i + 1) % n
+        faces += [(i, j, j + n), (i, j + n, i + n)]
+    return trimesh.Trimesh(vertices, np.array(faces), process=False)
+
+
+SHAPES = {
+    "Box": lambda: trimesh.creation.box([0.1, 0.2, 0.4]),
+    "Sphere": lambda: trimesh.creation.icosphere(3, radius=0.08),
+    "L": lambda: extrude([(0, 0), (0.3, 0), (0.3, 0.1), (0.1, 0.1), (0.1, 0.4), (0, 0.4)],
+                         [(0, 1, 2), (0, 2, 3), (0, 3, 5), (3, 4, 5)], 0.1),
+    "U": lambda: extrude([(0, 0), (0.3, 0), (0.3, 0.3), (0.25, 0.3), (0.25, 0.05), (0.05, 0.05), (0.05, 0.3), (0, 0.3)],
+                         [(0, 1, 4), (1, 2, 4), (2, 3, 4), (0, 4, 5), (0, 5, 7), (5, 6, 7)], 0.05),
+    "Torus": lambda: trimesh.creation.torus(0.1, 0.03),
+}
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    links = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for kind, make in SHAPES.items():
+        mesh = make()
+        fit, seconds = timed(decompose, np.asarray(mesh.vertices), np.asarray(mesh.faces))
+        print(f"{kind:6s}: {len(fit.hulls)} hulls  error {fit.error:+7.1%}  concavity {fit.concavity:6.3f}  "
+              f"{seconds * 1e3:7.1f} ms")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kinds = list(SHAPES)
+        paths = []
+        for i in range(links):
+            path = os.path.join(tmpdir, f"link{i}.STL")
+            SHAPES[kinds[i % len(kinds)]]().apply_scale(1.0 + 0.01 * i).export(path)
+            paths.append(path)
+
+        serial, serial_time = timed(decompose_stl_files, paths, workers=1)
+        pooled, pool_time = timed(decompose_stl_files, paths)
+        assert all(len(serial[path].hulls) == len(pooled[path].hulls) for path in paths)
+        print(f"{links} STLs: 1 worker {serial_time:.2f} s  pool {pool_time:.2f} s  ({serial_time / pool_time:.1f}x)")
+
+        cache = ifs_cache(os.path.join(tmpdir, "cache"))
+        _, cold_time = timed(decompose_stl_files, paths, cache=cache)
+        _, warm_time = timed(decompose_stl_files, paths, cache=cache)
+        print(f"ifs_cache: cold {cold_time:.2f} s  warm {warm_time * 1e3:.1f} ms  {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
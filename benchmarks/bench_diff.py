@@ -0,0 +1,53 @@
+"""
+Structural diff (proto_parser.diff) of two robots of about 100k structures that
+differ in one link, against a line diff (difflib) of their proto text.
+
+The first diff hashes both trees, the next ones only rehash the edited path and
+walk the subtrees whose digests differ.
+
+Usage:
+    python benchmarks/bench_diff.py [links]
+"""
+import sys
+import time
+import difflib
+
+from urdf_converter.core import proto_parser as proto
+from bench_search import generate_proto_text
+
+
+def main():
+    links = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    text = generate_proto_text(links)
+    old = proto.proto_robot()
+    old.read_proto_string(text)
+    new = proto.proto_robot()
+    new.read_proto_string(text)
+    print(f"structures: {sum(1 for _ in old.iter_nodes())} per robot")
+
+    start = time.perf_counter()
+    old.digest()
+    new.digest()
+    print(f"hash both trees:       {(time.perf_counter() - start) * 1e3:8.2f} ms")
+
+    # edit one link of the new robot
+    motor = new.find_by_type("RotationalMotor")[links // 2]
+    with new.transaction() as tx:
+        tx.set_field(motor, "maxTorque", "0.001")
+
+    start = time.perf_counter()
+    changes = proto.diff(old, new)
+    diff_time = time.perf_counter() - start
+    assert [c.kind for c in changes] == ["changed"], changes
+    print(f"tree diff:             {diff_time * 1e3:8.2f} ms  {changes[0].path}")
+
+    start = time.perf_counter()
+    old_lines, new_lines = str(old).splitlines(), str(new).splitlines()
+    text_changes = [line for line in difflib.unified_diff(old_lines, new_lines, lineterm="", n=0)]
+    text_time = time.perf_counter() - start
+    assert any("0.001" in line for line in text_changes)
+    print(f"text diff (difflib):   {text_time * 1e3:8.2f} ms  ({text_time / diff_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+IndexedFaceSet size and proto_parser load time with the ifs_options of
+convert_collision_to_ifs, on a robot whose STLs are CAD-like triangle soups: every
+triangle has its own corners, jittered by 1e-7 m, so merge_vertices() alone
+cannot share them.
+
+Usage:
+    python benchmarks/bench_ifs_compact.py [links] [subdivisions]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import trimesh
+
+from urdf_converter.core import proto_parser as proto
+from urdf_converter.core.convert_collision_to_ifs import ifs_options, process_proto_file, size_report
+
+OPTIONS = {
+    "default": ifs_options(),
+    "compact": ifs_options(compact=True),
+    "step 1e-3 compact": ifs_options(step=1e-3, compact=True),
+    "relative 1e-3": ifs_options(relative_step=1e-3),
+    "weld 1e-5": ifs_options(weld=1e-5),
+    "weld 1e-5 compact": ifs_options(weld=1e-5, compact=True),
+}
+
+
+def generate_soup_robot(folder, links, subdivisions):
+    """Triangle-soup STL per link (icosphere corners jittered) and a proto using each once"""
+    os.mkdir(os.path.join(folder, "meshes"))
+    rng = np.random.default_rng(0)
+    lines = ["PROTO bench [", "]", "{", "Robot {", "children ["]
+    for i in range(links):
+        sphere = trimesh.creation.icosphere(subdivisions, radius=0.05 + 0.01 * i)
+        corners = sphere.vertices[sphere.faces].reshape(-1, 3) + rng.normal(scale=1e-7, size=(3 * len(sphere.faces), 3))
+        soup = trimesh.Trimesh(corners, np.arange(len(corners)).reshape(-1, 3), process=False)
+        soup.export(os.path.join(folder, "meshes", f"link{i}.STL"))
+        lines += [
+            "Solid {", f'name "link{i}"',
+            "boundingObject Mesh {", f'url "./meshes/link{i}.STL"', "}",
+            "}",
+        ]
+    lines += ["]", "}", "}"]
+    path = os.path.join(folder, "bench.proto")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def main():
+    links = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    subdivisions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = generate_soup_robot(tmpdir, links, subdivisions)
+        print(f"{links} links, {20 * 4 ** subdivisions} faces per STL")
+        for label, options in OPTIONS.items():
+            out = os.path.join(tmpdir, "bench_out.proto")
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                process_proto_file(path, output_path=out, workers=1, options=options)
+            convert_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            proto.proto_robot(proto_filename=out)
+            parse_time = time.perf_counter() - start
+
+            report = size_report([os.path.join(tmpdir, "meshes", f"link{i}.STL") for i in range(links)], options)
+            vertices = sum(row.optimized_vertices for row in report)
+            faces = sum(row.optimized_faces for row in report)
+            print(f"{label:18s}: {os.path.getsize(out) / 1e6:6.2f} MB  {vertices:7d} vertices  {faces:7d} faces  "
+                  f"convert {convert_time:5.2f} s  parse {parse_time:5.2f} s")
+
+
+if __name__ == "__main__":
+    main()
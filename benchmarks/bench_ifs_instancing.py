@@ -0,0 +1,86 @@
+"""
+process_proto_file with and without DEF / USE instancing on a legged robot: every
+leg link has a left and a right STL with identical bytes (plus a mirrored foot),
+each referenced by a visual and a bounding Mesh. Reports the output size, the
+conversion and proto_parser load times, and the rigid / mirror candidates.
+
+Usage:
+    python benchmarks/bench_ifs_instancing.py [legs] [subdivisions]
+"""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import trimesh
+
+from urdf_converter.core import proto_parser as proto
+from urdf_converter.core.convert_collision_to_ifs import instance_candidates, process_proto_file
+
+
+def generate_legged_robot(folder, legs, subdivisions):
+    """Per leg pair: hip / thigh / shin STLs copied left and right, a foot mirrored"""
+    meshes = os.path.join(folder, "meshes")
+    os.mkdir(meshes)
+    lines = ["PROTO bench [", "]", "{", "Robot {", "children ["]
+    for leg in range(legs):
+        for part, scale in (("hip", 1.0), ("thigh", 1.6), ("shin", 1.4), ("foot", 0.6)):
+            mesh = trimesh.creation.icosphere(subdivisions, radius=0.04)
+            mesh.vertices *= [scale, 0.5, 0.4 + 0.05 * leg]
+            mesh.vertices[0] += 0.005     # no mirror symmetry of its own
+            left = os.path.join(meshes, f"{part}{leg}_left.STL")
+            mesh.export(left)
+            if part == "foot":
+                mesh.vertices[:, 1] *= -1
+                mesh.invert()
+                mesh.export(os.path.join(meshes, f"{part}{leg}_right.STL"))
+            else:
+                shutil.copy(left, os.path.join(meshes, f"{part}{leg}_right.STL"))
+            for side in ("left", "right"):
+                url = f'url "./meshes/{part}{leg}_{side}.STL"'
+                lines += [
+                    "Solid {", "children [", "Shape {", "geometry Mesh {", url, "}", "}", "]",
+                    f'name "{part}{leg}_{side}"', "boundingObject Mesh {", url, "}", "}",
+                ]
+    lines += ["]", "}", "}"]
+    path = os.path.join(folder, "bench.proto")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def main():
+    legs = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    subdivisions = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = generate_legged_robot(tmpdir, legs, subdivisions)
+        print(f"{legs} legs, {legs * 8} STLs, {legs * 16} Mesh nodes, {20 * 4 ** subdivisions} faces per STL")
+        for instancing in (False, True):
+            out = os.path.join(tmpdir, "instanced" if instancing else "inline", "bench.proto")
+            os.mkdir(os.path.dirname(out))
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                process_proto_file(path, output_path=out, workers=1, instancing=instancing)
+            convert_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            robot = proto.proto_robot(proto_filename=out)
+            parse_time = time.perf_counter() - start
+            uses = sum(1 for _ in robot.iter_nodes(lambda node: node.__class__ is proto.property
+                                                   and (node.name == "USE" or node.content.startswith("USE "))))
+            print(f"instancing {str(instancing):5s}: {os.path.getsize(out) / 1e6:6.2f} MB  {uses:3d} USE  "
+                  f"convert {convert_time:5.2f} s  parse {parse_time:5.2f} s")
+
+        stl_paths = sorted(os.path.join(tmpdir, "meshes", name) for name in os.listdir(os.path.join(tmpdir, "meshes")))
+        start = time.perf_counter()
+        candidates = instance_candidates(stl_paths)
+        kinds = [candidate.kind for candidate in candidates]
+        print(f"candidates: {kinds.count('rigid')} rigid, {kinds.count('mirror')} mirror "
+              f"({time.perf_counter() - start:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
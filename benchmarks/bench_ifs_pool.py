@@ -0,0 +1,95 @@
+"""
+process_proto_file on a robot of 30 links, each STL referenced by a visual and a
+bounding Mesh, with 1, 2, 4 ... worker processes up to the CPU count, then with a
+cold and a warm ifs_cache, and finally the former regex rewrite. The converted copies
+are checked to be identical (the regex one to hold the same tree as the tree rewrite
+without instancing).
+
+Usage:
+    python benchmarks/bench_ifs_pool.py [links] [subdivisions]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import trimesh
+
+from urdf_converter.core import proto_parser as proto
+from urdf_converter.core.convert_collision_to_ifs import process_proto_file
+from urdf_converter.core.ifs_cache import ifs_cache
+
+
+def generate_robot(folder, links, subdivisions):
+    """STL per link (icosphere, 20 * 4**subdivisions faces) and a proto using each twice"""
+    os.mkdir(os.path.join(folder, "meshes"))
+    lines = ["PROTO bench [", "]", "{", "Robot {", "children ["]
+    for i in range(links):
+        sphere = trimesh.creation.icosphere(subdivisions, radius=0.05 + 0.001 * i)
+        sphere.export(os.path.join(folder, "meshes", f"link{i}.STL"))
+        lines += [
+            "Solid {", "children [", "Shape {",
+            f"geometry DEF link{i} Mesh {{", f'url "./meshes/link{i}.STL"', "}",
+            "}", "]", f'name "link{i}"',
+            "boundingObject Mesh {", f'url "./meshes/link{i}.STL"', "}",
+            "}",
+        ]
+    lines += ["]", "}", "}"]
+    path = os.path.join(folder, "bench.proto")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def main():
+    links = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    subdivisions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({1, cpus} | {n for n in (2, 4, 8, 16) if n < cpus})
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = generate_robot(tmpdir, links, subdivisions)
+        print(f"{links} links, {20 * 4 ** subdivisions} faces per STL, {cpus} CPUs")
+        expected = None
+        for workers in worker_counts:
+            out = os.path.join(tmpdir, "bench.proto".replace("bench", f"bench{workers}"))
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                process_proto_file(path, output_path=out, workers=workers)
+            elapsed = time.perf_counter() - start
+            with open(out, encoding="utf-8") as f:
+                text = f.read().replace(f"bench{workers}", "bench")
+            expected = expected or text
+            assert text == expected
+            print(f"workers {workers:2d}: {elapsed:6.2f} s")
+
+        cache = ifs_cache(os.path.join(tmpdir, "cache"))
+        for label in ("cold", "warm"):
+            out = os.path.join(tmpdir, "bench.proto".replace("bench", f"bench_{label}"))
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                process_proto_file(path, output_path=out, ifs_cache=cache)
+            elapsed = time.perf_counter() - start
+            with open(out, encoding="utf-8") as f:
+                assert f.read().replace(f"bench_{label}", "bench") == expected
+            print(f"ifs_cache {label}: {elapsed:6.2f} s  {cache.stats()['hits']} hits")
+
+        # the regex rewrite inlines every Mesh: compare with the tree rewrite without DEF / USE
+        os.mkdir(os.path.join(tmpdir, "regex"))
+        os.mkdir(os.path.join(tmpdir, "inline"))
+        out = os.path.join(tmpdir, "inline", "bench.proto")
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_proto_file(path, output_path=out, workers=1, instancing=False)
+        tree = proto.proto_robot(proto_filename=out)
+        out = os.path.join(tmpdir, "regex", "bench.proto")
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_proto_file(path, output_path=out, workers=1, rewrite="regex")
+        elapsed = time.perf_counter() - start
+        assert proto.proto_robot(proto_filename=out).digest() == tree.digest()
+        print(f"regex rewrite: {elapsed:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
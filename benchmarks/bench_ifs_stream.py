@@ -0,0 +1,41 @@
+"""
+Peak memory (tracemalloc) and time of process_proto_file with the regex, tree and
+stream rewrites, on a robot whose collision meshes add up to about 2M triangles
+(without DEF / USE instancing, so that the three write the same amount of text).
+
+Usage:
+    python benchmarks/bench_ifs_stream.py [links] [subdivisions]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from urdf_converter.core.convert_collision_to_ifs import process_proto_file
+from bench_ifs_pool import generate_robot
+
+
+def main():
+    links = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    subdivisions = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = generate_robot(tmpdir, links, subdivisions)
+        print(f"{links} links, {2 * links * 20 * 4 ** subdivisions / 1e6:.1f}M triangles inlined")
+        for rewrite in ("regex", "tree", "stream"):
+            out = os.path.join(tmpdir, rewrite, "bench.proto")
+            os.mkdir(os.path.dirname(out))
+            tracemalloc.start()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                process_proto_file(path, output_path=out, workers=1, rewrite=rewrite, instancing=False)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{rewrite:6s}: {elapsed:6.2f} s  peak {peak / 1e6:7.1f} MB  output {os.path.getsize(out) / 1e6:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
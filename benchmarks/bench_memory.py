@@ -0,0 +1,114 @@
+"""
+tracemalloc report of the memory held per parsed structure.
+
+"before" rebuilds the tree with the previous dict based classes (one __dict__
+and one children list per structure, one property per line of point / coordIndex),
+"after" is proto_robot as shipped (__slots__, shared empty children of leaf
+properties, interned field names, numeric fields as one NumPy array).
+
+Usage:
+    python benchmarks/bench_memory.py [size_mb]
+"""
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from urdf_converter.core import proto_parser as proto
+from bench_parse import generate_proto
+
+
+class LegacyStructure:
+    def __init__(self, name, parent, stage=0, DEF=None):
+        self.name = name
+        self.stage = stage
+        self.parent = parent
+        self.children = []
+        self.DEF = DEF
+
+
+class LegacyProperty(LegacyStructure):
+    def __init__(self, name, parent, stage=0, content=""):
+        super().__init__(name, parent, stage, DEF=None)
+        self.content = content
+
+
+class LegacyRoot:
+    def __init__(self):
+        self.children = []
+        self.parent = self
+
+
+def build_legacy_tree(buf):
+    """Same tokenizer, previous node layout"""
+    root = LegacyRoot()
+    cursor = root
+    stage = -1
+    for event in proto._tokenize(buf):
+        kind = event[0]
+        if kind == proto._LINES:
+            for line in buf[event[1]:event[2]].split("\n"):
+                name, _, content = line.strip().partition(" ")
+                cursor.children.append(LegacyProperty(name, cursor, stage + 1, content))
+        elif kind == proto._PROPERTY:
+            cursor.children.append(LegacyProperty(event[1], cursor, stage + 1, event[2]))
+        elif kind in (proto._OPEN_NODE, proto._OPEN_CONTAINER):
+            stage += 1
+            cursor.children.append(LegacyStructure(event[1], cursor, stage, event[2]))
+            cursor = cursor.children[-1]
+        elif kind == proto._CLOSE:
+            stage -= 1
+            cursor = cursor.parent
+    return root
+
+
+def build_tree(buf):
+    robot = proto.proto_robot()
+    robot.read_proto_string(buf)
+    return robot
+
+
+def count_structures(root):
+    count = 0
+    stack = list(root.children)
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+def measure(build, buf):
+    """Return (tree, bytes still allocated after building it)"""
+    gc.collect()
+    tracemalloc.start()
+    tree = build(buf)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tree, size
+
+
+def main():
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "bench.proto")
+        generate_proto(path, size_mb)
+        with open(path, 'r', encoding='utf-8') as f:
+            buf = f.read()
+
+    tree, before = measure(build_legacy_tree, buf)
+    count = count_structures(tree)
+    del tree
+    tree, after = measure(build_tree, buf)
+    count_after = count_structures(tree)
+
+    print(f"proto size:      {len(buf) / 1e6:.1f} MB")
+    print(f"before (dict):   {before / 1e6:8.1f} MB  {count:9d} structures  {before / count:6.1f} bytes/structure")
+    print(f"after (slots):   {after / 1e6:8.1f} MB  {count_after:9d} structures")
+    print(f"saved:           {(1 - after / before) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Editor selection on a robot of about 50k nodes: looking the clicked object up by
+proto_robot.node_id() against the former scan of the tree comparing id() values.
+
+Usage:
+    python benchmarks/bench_node_id.py [links]
+"""
+import random
+import sys
+import time
+
+from urdf_converter.core import proto_parser as proto
+from bench_search import generate_proto_text
+
+
+def find_object_by_id(root, obj_id):
+    """Reference: scan of the tree as done by ProtoEditorUI before node ids"""
+    if id(root) == obj_id:
+        return root
+    return next(root.iter_nodes(lambda node: id(node) == obj_id), None)
+
+
+def main():
+    links = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    robot = proto.proto_robot()
+    robot.read_proto_string(generate_proto_text(links))
+    nodes = [node for node in robot.iter_nodes() if not isinstance(node, proto.property)]
+    print(f"nodes: {len(nodes)}")
+
+    start = time.perf_counter()
+    ids = [robot.node_id(node) for node in nodes]      # what populate_tree() hands out
+    print(f"assign ids:            {(time.perf_counter() - start) * 1e3:8.2f} ms")
+
+    picks = random.Random(0).sample(range(len(nodes)), 20)
+
+    start = time.perf_counter()
+    for i in picks:
+        assert find_object_by_id(robot, id(nodes[i])) is nodes[i]
+    scan_time = (time.perf_counter() - start) / len(picks)
+    print(f"select by id() scan:   {scan_time * 1e3:8.3f} ms")
+
+    start = time.perf_counter()
+    for i in picks:
+        assert robot.node_by_id(ids[i]) is nodes[i]
+    lookup_time = (time.perf_counter() - start) / len(picks)
+    print(f"select by node id:     {lookup_time * 1e3:8.4f} ms  ({scan_time / lookup_time:.0f}x)")
+
+    # ids survive edits
+    motor = robot.find_by_type("RotationalMotor")[links // 2]
+    nid = robot.node_id(motor)
+    with robot.transaction() as tx:
+        tx.set(motor, DEF="RotationalMotor {")
+        tx.set_field(motor, "maxTorque", "0.001")
+    assert robot.node_id(motor) == nid and robot.node_by_id(nid) is motor
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Parse throughput of proto_parser on a synthetic proto with inlined IndexedFaceSet geometry.
+
+Compares the single-pass buffer tokenizer (proto_robot.read_proto_file) against
+the previous line based parser, kept here as a reference implementation.
+
+Usage:
+    python benchmarks/bench_parse.py [size_mb]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from urdf_converter.core import proto_parser as proto
+
+
+def generate_proto(path, size_mb=50, seed=0):
+    """Write a proto of roughly size_mb megabytes made of links with inlined IFS geometry"""
+    rnd = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("#VRML_SIM R2023b utf8\n\n")
+        f.write("PROTO bench [\n  field  SFVec3f     translation     0 0 0\n]\n{\n  Robot {\n    translation IS translation\n    children [\n")
+        link = 0
+        while f.tell() < size_mb * 1e6:
+            block = [f"      DEF link{link} Solid {{\n", "        children [\n", "          Shape {\n",
+                     "            geometry IndexedFaceSet {\n", "              coord Coordinate {\n", "                point [\n"]
+            block += [f"                  {rnd.random():.4f} {rnd.random():.4f} {rnd.random():.4f}\n" for _ in range(2000)]
+            block.append("                ]\n              }\n              coordIndex [\n")
+            block += [f"                {rnd.randrange(2000)}, {rnd.randrange(2000)}, {rnd.randrange(2000)}, -1\n" for _ in range(2000)]
+            block.append("              ]\n            }\n          }\n        ]\n")
+            block.append(f"        name \"link{link}\"\n        boundingObject USE link{link}\n")
+            block.append("        physics Physics {\n          density -1\n          centerOfMass [ 0 0 0 ]\n        }\n      }\n")
+            f.write("".join(block))
+            link += 1
+        f.write("    ]\n  }\n}\n")
+
+
+def add_child(parent, child):
+    """add_child() of the previous parser: a plain append, no search index / digest upkeep"""
+    parent.children.append(child)
+
+
+def read_proto_file_linewise(robot, proto_filename):
+    """Previous line based parser (readlines + strip/endswith/split per line)"""
+    current_stage = -1
+    with open(proto_filename, 'r', encoding='utf-8') as file:
+        lines = file.readlines()
+    for line in lines:
+        line = line.strip()
+        if line.startswith("#"):
+            robot.header += line + "\n"
+        elif line.endswith("["):
+            line = line.split(" ", 1)
+            current_stage += 1
+            add_child(robot.cursor, proto.container(name=line[0], parent=robot.cursor, DEF=line[1], stage=current_stage))
+            robot.set_current(robot.cursor.children[-1])
+        elif line.endswith("{"):
+            current_stage += 1
+            if line != "{":
+                line = line.split(" ", 1)
+                add_child(robot.cursor, proto.Node(name=line[0], parent=robot.cursor, DEF=line[1], stage=current_stage))
+            else:
+                add_child(robot.cursor, proto.Node(name="", parent=robot.cursor, stage=current_stage))
+            robot.set_current(robot.cursor.children[-1])
+        elif line.endswith("]") or line.endswith("}"):
+            if line.startswith("centerOfMass"):
+                line = line.split(" ", 1)
+                add_child(robot.cursor, proto.property(name=line[0], parent=robot.cursor, content=line[1], stage=current_stage + 1))
+            else:
+                current_stage -= 1
+                robot.set_current(robot.cursor.parent)
+        else:
+            line = line.split(" ", 1)
+            content = line[1] if len(line) > 1 else ""
+            add_child(robot.cursor, proto.property(name=line[0], parent=robot.cursor, content=content, stage=current_stage + 1))
+
+
+def main():
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "bench.proto")
+        generate_proto(path, size_mb)
+        mb = os.path.getsize(path) / 1e6
+
+        start = time.perf_counter()
+        legacy = proto.proto_robot()
+        read_proto_file_linewise(legacy, path)
+        legacy_time = time.perf_counter() - start
+        del legacy
+
+        start = time.perf_counter()
+        proto.proto_robot(proto_filename=path)
+        new_time = time.perf_counter() - start
+
+    print(f"proto size:          {mb:.1f} MB")
+    print(f"line based parser:   {legacy_time:.2f} s  ({mb / legacy_time:.1f} MB/s)")
+    print(f"buffer tokenizer:    {new_time:.2f} s  ({mb / new_time:.1f} MB/s)")
+    print(f"speedup:             {legacy_time / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+save_robot after a one-field edit against a plain file copy, and against formatting
+the whole tree again (the same tree restored from a proto_cache snapshot, which has
+no source spans).
+
+Usage:
+    python benchmarks/bench_save.py [size_mb]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from urdf_converter.core import proto_parser as proto
+from urdf_converter.core import proto_cache
+from bench_parse import generate_proto
+
+
+def changed_lines(path_a, path_b):
+    with open(path_a, encoding='utf-8') as a, open(path_b, encoding='utf-8') as b:
+        return sum(1 for x, y in zip(a, b) if x != y)
+
+
+def main():
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "bench.proto")
+        generate_proto(path, size_mb)
+        print(f"proto size:            {os.path.getsize(path) / 1e6:.1f} MB")
+        out_dir = os.path.join(tmpdir, "out")
+        os.mkdir(out_dir)
+        out = os.path.join(out_dir, "bench.proto")    # same name, save_robot keeps the PROTO name
+
+        start = time.perf_counter()
+        shutil.copyfile(path, out)
+        print(f"file copy:             {(time.perf_counter() - start) * 1e3:8.1f} ms")
+
+        for lazy in (False, True):
+            robot = proto.proto_robot(proto_filename=path, lazy=lazy)
+            densities = robot.find_by_name("density")
+            with robot.transaction() as tx:
+                tx.set(densities[len(densities) // 2], "1000")
+            start = time.perf_counter()
+            robot.save_robot(out)
+            elapsed = time.perf_counter() - start
+            label = "lazy" if lazy else "eager"
+            print(f"save one edit ({label:5s}): {elapsed * 1e3:8.1f} ms  changed lines: {changed_lines(path, out)}")
+
+        robot = proto.proto_robot()
+        proto_cache.restore(robot, proto_cache.snapshot(proto.proto_robot(proto_filename=path)))
+        start = time.perf_counter()
+        robot.save_robot(out)
+        print(f"format whole tree:     {(time.perf_counter() - start) * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Indexed lookups (proto_robot.find_by_*) against the recursive tree search
+on a synthetic robot of about 10k structures, and a path selector
+(proto_robot.select) against the equivalent chain of nested searches.
+
+Usage:
+    python benchmarks/bench_search.py [links]
+"""
+import sys
+import time
+
+from urdf_converter.core import proto_parser as proto
+
+QUERIES = ["geometry", "boundingObject", "endPoint", "RotationalMotor", "maxTorque"]
+SELECTOR = "HingeJoint > device > RotationalMotor > maxTorque"
+
+
+def generate_proto_text(links=500):
+    """Chain of HingeJoints, about 20 structures per link"""
+    lines = ["PROTO bench [", "]", "{", "Robot {", "children ["]
+    for i in range(links):
+        lines += [
+            "HingeJoint {",
+            "jointParameters HingeJointParameters {", "axis 0 0 1", "}",
+            "device [", "RotationalMotor {", f'name "joint{i}"', "maxTorque 10000", "}",
+            "PositionSensor {", f'name "joint{i}_sensor"', "}", "]",
+            "endPoint Solid {",
+            "children [", "Shape {", f"geometry DEF link{i} Mesh {{", f'url "./meshes/link{i}.STL"', "}", "}", "]",
+            f'name "link{i}"', f"boundingObject USE link{i}",
+            "physics Physics {", "density -1", "mass 1.0", "}",
+            "}", "}",
+        ]
+    lines += ["]", "}", "}"]
+    return "\n".join(lines) + "\n"
+
+
+def generate_chain_text(links=200):
+    """Serial chain as written by urdf2webots: every link nested in the endPoint of the previous joint"""
+    lines = ["PROTO bench [", "]", "{", "Robot {", "children ["]
+    for i in range(links):
+        lines += [
+            "HingeJoint {",
+            "device [", "RotationalMotor {", f'name "joint{i}"', "maxTorque 10000", "}", "]",
+            "endPoint Solid {", f'name "link{i}"', "children [",
+        ]
+    lines += ["]", "}", "}"] * links
+    lines += ["]", "}", "}"]
+    return "\n".join(lines) + "\n"
+
+
+def search_recursive(root, name):
+    """Reference: recursive search building results with list +="""
+    result_list = []
+    for child in root.children:
+        if child.name == name:
+            result_list.append(child)
+        result_list += search_recursive(child, name)
+    return result_list
+
+
+def nested_search(robot):
+    """Reference for SELECTOR: one subtree search per step and per match"""
+    result_list = []
+    for joint in robot.search("HingeJoint"):
+        for device in joint.search("device"):
+            for motor in device.search("RotationalMotor"):
+                result_list += motor.search("maxTorque")
+    return result_list
+
+
+def count_structures(root):
+    return sum(1 + count_structures(child) for child in root.children)
+
+
+def main():
+    links = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    robot = proto.proto_robot()
+    robot.read_proto_string(generate_proto_text(links))
+    print(f"structures: {count_structures(robot)}")
+    chain = proto.proto_robot()
+    chain.read_proto_string(generate_chain_text(links // 2))
+
+    for label, tree in (("flat", robot), ("chain", chain)):
+        start = time.perf_counter()
+        expected = nested_search(tree)
+        nested_time = time.perf_counter() - start
+        start = time.perf_counter()
+        found = tree.select(SELECTOR)
+        select_time = time.perf_counter() - start
+        # on a chain the nested searches find every later motor once per enclosing joint
+        assert found == list(dict.fromkeys(expected))
+        print(f"selector {label:5s} k={len(found):4d}  nested search {nested_time * 1e3:8.2f} ms"
+              f"  select (one pass) {select_time * 1e3:8.2f} ms  ({nested_time / select_time:.1f}x)")
+
+    start = time.perf_counter()
+    robot.build_index()
+    print(f"index build:         {(time.perf_counter() - start) * 1e3:8.2f} ms")
+
+    for query in QUERIES:
+        start = time.perf_counter()
+        expected = search_recursive(robot, query)
+        recursive_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = robot.find_by_name(query)
+        index_time = time.perf_counter() - start
+
+        assert len(found) == len(expected)
+        print(f"{query:16s} k={len(found):5d}  recursive {recursive_time * 1e3:8.2f} ms"
+              f"  indexed {index_time * 1e3:8.3f} ms  ({recursive_time / index_time:.0f}x)")
+
+    start = time.perf_counter()
+    hinges = robot.find_by_type("HingeJoint")
+    print(f"find_by_type('HingeJoint') k={len(hinges)}: {(time.perf_counter() - start) * 1e3:.3f} ms")
+
+    start = time.perf_counter()
+    found = robot.select(SELECTOR)
+    select_time = time.perf_counter() - start
+    assert found == nested_search(robot)
+    print(f"selector flat with index: {select_time * 1e3:8.2f} ms")
+
+    # set maxTorque on every motor: cursor update per motor vs one transaction
+    start = time.perf_counter()
+    for motor in robot.search("RotationalMotor"):
+        for t in motor.search("maxTorque"):
+            temp = robot.cursor
+            robot.set_current(t)
+            robot.cursor.update(proto.property(name = "maxTorque", parent = t.parent, content = "0.001", stage = t.stage))
+            robot.set_current(temp)
+    cursor_time = time.perf_counter() - start
+    start = time.perf_counter()
+    with robot.transaction() as tx:
+        tx.set_all("RotationalMotor > maxTorque", "0.002")
+    tx_time = time.perf_counter() - start
+    assert all(t.content == "0.002" for t in robot.find_by_name("maxTorque"))
+    print(f"set maxTorque k={len(found)}: cursor updates {cursor_time * 1e3:8.2f} ms"
+          f"  transaction {tx_time * 1e3:8.2f} ms  ({cursor_time / tx_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
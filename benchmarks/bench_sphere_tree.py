@@ -0,0 +1,39 @@
+"""
+sphere_tree.fit_spheres on convex and concave meshes with growing sphere budgets
+(sphere count, spheres per tree level, coverage, overshoot, time).
+
+Usage:
+    python benchmarks/bench_sphere_tree.py [max_spheres ...]
+"""
+import sys
+import time
+
+import numpy as np
+import trimesh
+
+from urdf_converter.core.sphere_tree import fit_spheres, sphere_options
+
+SHAPES = {
+    "Box": lambda: trimesh.creation.box([0.1, 0.2, 0.4]),
+    "Cylinder": lambda: trimesh.creation.cylinder(0.05, 0.3, sections=64),
+    "Sphere": lambda: trimesh.creation.icosphere(4, radius=0.08),
+    "Torus": lambda: trimesh.creation.torus(0.1, 0.03),
+    "Annulus": lambda: trimesh.creation.annulus(0.05, 0.1, 0.05, sections=64),
+}
+
+
+def main():
+    budgets = [int(arg) for arg in sys.argv[1:]] or [4, 8, 16, 32]
+    for kind, make in SHAPES.items():
+        mesh = make()
+        vertices, faces = np.asarray(mesh.vertices), np.asarray(mesh.faces)
+        for budget in budgets:
+            start = time.perf_counter()
+            fit = fit_spheres(vertices, faces, sphere_options(max_spheres=budget))
+            levels = "/".join(str(len(level.radii)) for level in fit.levels)
+            print(f"{kind:8s} {budget:3d}: {len(fit.radii):3d} spheres  levels {levels:9s}  coverage {fit.coverage:6.1%}  "
+                  f"overshoot {fit.overshoot:6.1%}  {(time.perf_counter() - start) * 1e3:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
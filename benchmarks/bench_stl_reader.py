@@ -0,0 +1,57 @@
+"""
+stl_reader.read_stl (memory-mapped binary STL, hashed np.unique vertex merge) against
+trimesh.load + merge_vertices, and the header-only stl_face_count against loading the
+mesh, on binary and ASCII icospheres. The merged arrays are checked to be identical.
+
+Usage:
+    python benchmarks/bench_stl_reader.py [subdivisions ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import trimesh
+
+from urdf_converter.core.stl_reader import read_stl, stl_face_count
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def trimesh_merged(path):
+    """Reference: loading as done by stl_to_mesh before stl_reader"""
+    mesh = trimesh.load(path)
+    mesh.merge_vertices()
+    return np.asarray(mesh.vertices), np.asarray(mesh.faces)
+
+
+def main():
+    levels = [int(arg) for arg in sys.argv[1:]] or [5, 6, 7]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for subdivisions in levels:
+            sphere = trimesh.creation.icosphere(subdivisions, radius=0.07)
+            for kind, data in (("binary", trimesh.exchange.stl.export_stl(sphere)),
+                               ("ascii", trimesh.exchange.stl.export_stl_ascii(sphere).encode("ascii"))):
+                if kind == "ascii" and subdivisions > 6:
+                    continue
+                path = os.path.join(tmpdir, f"sphere{subdivisions}_{kind}.STL")
+                with open(path, "wb") as f:
+                    f.write(data)
+
+                expected, reference_time = timed(trimesh_merged, path)
+                result, reader_time = timed(read_stl, path)
+                assert all(np.array_equal(a, b) for a, b in zip(expected, result))
+                count, probe_time = timed(stl_face_count, path)
+                assert count == len(expected[1])
+                print(f"{len(sphere.faces):>8} faces {kind:6s}: trimesh {reference_time * 1e3:8.1f} ms  "
+                      f"read_stl {reader_time * 1e3:8.1f} ms  ({reference_time / reader_time:.1f}x)  "
+                      f"stl_face_count {probe_time * 1e3:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,513 @@
+"""
+以基本形狀 (Box / Cylinder / Capsule / Sphere) 取代 boundingObject 的碰撞網格
+
+每個連桿的 STL 以向量化的方式擬合包圍形狀:
+    Box      面積加權 PCA 的定向包圍盒 (OBB), 與連桿座標軸對齊的包圍盒取體積較小者
+    Sphere   最小包圍球 (對最遠點 pivot)
+    Cylinder 沿 PCA 軸或連桿座標軸, 最小包圍圓 x 軸向範圍
+    Capsule  同一組軸, 半徑由最小包圍圓放大數個倍率, 取體積最小的線段長度
+以體積誤差 (形狀體積 / 網格體積 - 1) 評分, 誤差最小且不超過門檻的形狀改寫進 proto:
+    boundingObject Transform {
+      translation ...
+      rotation ...
+      children [
+        Box { size ... }
+      ]
+    }
+Cylinder / Capsule 的軸為 Transform 的 Z 軸 (Webots R2023 之後的慣例)。
+
+用法:
+    python -m urdf_converter.core.collision_primitives robot.proto [max_error]
+或在 main.py 設定 URDF_CONVERTER_COLLISION=primitive, 於換成 collision 網格之前執行
+"""
+import os
+import re
+import sys
+import math
+import argparse
+import itertools
+from collections import namedtuple
+
+import numpy as np
+
+from urdf_converter.core import proto_parser as proto
+from urdf_converter.core.stl_reader import read_stl
+from urdf_converter.core.convert_collision_to_ifs import stl_url
+
+COLLISION_ENV = "URDF_CONVERTER_COLLISION"     # main.py: "primitive" / "convex" / "spheres" 時啟用
+
+PRIMITIVES = ("Box", "Cylinder", "Capsule", "Sphere")
+MAX_ERROR = 0.3         # 體積誤差門檻 (形狀比網格大 30%)
+NUMBER_FORMAT = "%.6g"
+
+# 形狀的欄位, 與 primitive_fit.size 的順序相同
+_FIELDS = {
+    "Box": ("size",),
+    "Cylinder": ("height", "radius"),
+    "Capsule": ("height", "radius"),
+    "Sphere": ("radius",),
+}
+
+# 膠囊半徑相對於最小包圍圓的倍率
+_CAPSULE_SCALES = (1.0, 1.05, 1.1, 1.2, 1.35, 1.5, 1.75, 2.0)
+_EXTREME_DIRECTIONS = 64    # 找包圍球 / 圓候選點的方向數
+_HULL_DIRECTIONS = 256      # 各形狀共用的凸包候選點的方向數
+_EXTREME_CHUNK = 8192       # 投影時一次處理的點數
+_BALL_TOLERANCE = 1e-9      # 點在球內的相對容許誤差
+_PIVOT_ITERATIONS = 1000    # 最小包圍球 pivot 的上限 (實際通常在數十次內收斂)
+
+_DEF_NAME = re.compile(r'\bDEF\s+([^\s{]+)')
+
+# kind: "Box" / "Cylinder" / "Capsule" / "Sphere"
+# translation (3,) 與 rotation (3, 3): 形狀座標系在連桿座標系中的位置與旋轉 (行向量為 x, y, z 軸)
+# size: Box 為 ((x, y, z),), Cylinder / Capsule 為 (height, radius), Sphere 為 (radius,)
+primitive_fit = namedtuple("primitive_fit", ("kind", "translation", "rotation", "size", "volume", "error"))
+
+# 每個 boundingObject 的報告: fit 為誤差最小的形狀 (無法擬合為 None), replaced 為是否已改寫
+collision_report = namedtuple("collision_report", ("link", "stl_path", "fit", "replaced", "note"))
+
+
+# ================== 幾何 ==================
+def mesh_volume(vertices, faces):
+    """
+    封閉網格的體積 (有號四面體體積總和的絕對值, 法向朝內也適用)
+    """
+    a, b, c = (vertices[faces[:, i]] for i in range(3))
+    return abs(np.einsum("ij,ij->", a, np.cross(b, c))) / 6.0
+
+def is_closed(faces):
+    """
+    每條邊都恰好被兩個面共用
+    """
+    if not len(faces):
+        return False
+    edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    _, counts = np.unique(edges[:, 0] * (int(faces.max()) + 1) + edges[:, 1], return_counts=True)
+    return bool((counts == 2).all())
+
+def _surface_frame(vertices, faces):
+    """
+    面積加權 PCA: 回傳 (表面重心, 主軸 (3, 3) 行向量, 由大到小)
+    """
+    a, b, c = (vertices[faces[:, i]] for i in range(3))
+    area = np.linalg.norm(np.cross(b - a, c - a), axis=1) / 2.0
+    total = area.sum()
+    if total <= 0:
+        return vertices.mean(axis=0), np.eye(3)
+    corners = a + b + c
+    mean = (area[:, None] * corners).sum(axis=0) / (3.0 * total)
+    # 三角形的二次矩: A / 12 * (sum v v^T + (sum v)(sum v)^T)
+    second = (np.einsum("i,ij,ik->jk", area, a, a) + np.einsum("i,ij,ik->jk", area, b, b)
+              + np.einsum("i,ij,ik->jk", area, c, c) + np.einsum("i,ij,ik->jk", area, corners, corners)) / 12.0
+    covariance = second / total - np.outer(mean, mean)
+    _, axes = np.linalg.eigh(covariance)
+    axes = axes[:, ::-1]
+    if np.linalg.det(axes) < 0:
+        axes[:, 2] *= -1
+    return mean, axes
+
+def _directions(count, dims):
+    """
+    近似均勻分布的單位方向 (3D 為 Fibonacci 球面的上半部, 2D 為半圓), 正反方向各取極值
+    """
+    i = np.arange(count) + 0.5
+    if dims == 2:
+        angle = np.pi * i / count
+        return np.column_stack((np.cos(angle), np.sin(angle)))
+    z = i / count
+    radius = np.sqrt(1.0 - z * z)
+    angle = np.pi * (1.0 + 5.0 ** 0.5) * i
+    return np.column_stack((radius * np.cos(angle), radius * np.sin(angle), z))
+
+def extreme_points(points, count=_EXTREME_DIRECTIONS):
+    """
+    在各方向投影最大 / 最小的點的索引 (凸包頂點的子集, 最小包圍球的候選)
+    """
+    directions = _directions(count, points.shape[1])
+    index = []
+    for start in range(0, len(points), _EXTREME_CHUNK):
+        # (方向, 點) 的排列讓 argmax / argmin 沿連續記憶體進行
+        projection = directions @ points[start:start + _EXTREME_CHUNK].T
+        index.append(start + projection.argmax(axis=1))
+        index.append(start + projection.argmin(axis=1))
+    index = np.unique(np.concatenate(index))
+    # 分段找到的是各段的極值, 再在候選中取一次
+    projection = points[index] @ directions.T
+    return index[np.unique(np.concatenate((projection.argmax(axis=0), projection.argmin(axis=0))))]
+
+def _ball_through(boundary):
+    """
+    通過 boundary 上所有點 (最多 d + 1 個) 的最小球: (球心, 半徑平方)
+    """
+    p0 = boundary[0]
+    if len(boundary) == 1:
+        return p0, 0.0
+    A = boundary[1:] - p0
+    # 球心 c = p0 + A^T x, 滿足 2 (p_i - p0) . (c - p0) = |p_i - p0|^2
+    x = np.linalg.lstsq(2.0 * A @ A.T, (A * A).sum(axis=1), rcond=None)[0]
+    offset = A.T @ x
+    return p0 + offset, float(offset @ offset)
+
+def _small_ball(points):
+    """
+    最多 d + 2 個點的最小包圍球: 列舉做為球面點的子集, 取包含全部點中最小者
+    回傳 (球心, 半徑平方, 球面上的點)
+    """
+    best = None
+    for size in range(1, min(len(points), points.shape[1] + 1) + 1):
+        for subset in itertools.combinations(range(len(points)), size):
+            center, r2 = _ball_through(points[list(subset)])
+            if best is not None and r2 >= best[1]:
+                continue
+            if (((points - center) ** 2).sum(axis=1) <= r2 * (1.0 + _BALL_TOLERANCE) + 1e-18).all():
+                best = (center, r2, points[list(subset)])
+    if best is None:
+        # 只有在數值誤差讓每個子集都被拒絕時發生: 以重心為球心包住全部點
+        center = points.mean(axis=0)
+        best = (center, float(((points - center) ** 2).sum(axis=1).max()), points)
+    return best
+
+def _pivot(points, center, r2, support):
+    """
+    最遠點加入球面點集合並重新求最小球, 直到所有點都在球內 (每次半徑嚴格增加)
+    """
+    for _ in range(_PIVOT_ITERATIONS):
+        d2 = ((points - center) ** 2).sum(axis=1)
+        far = int(d2.argmax())
+        if d2[far] <= r2 * (1.0 + _BALL_TOLERANCE) + 1e-18:
+            break
+        center, r2, support = _small_ball(np.vstack((support, points[far])))
+    return center, r2, support
+
+def enclosing_ball(points, candidates=None):
+    """
+    點集 (N, d) 的最小包圍球 / 圓: (中心, 半徑)
+    先在候選點 (預設為各方向的極值點) 上以 pivot 求解, 再對全部點繼續, 通常只需再一兩次
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if candidates is None:
+        candidates = extreme_points(points)
+    subset = points[candidates]
+    center, r2, support = _pivot(subset, subset[0], 0.0, subset[:1])
+    center, r2, support = _pivot(points, center, r2, support)
+    # 數值誤差下仍保證包住每個點
+    return center, math.sqrt(max(r2, float(((points - center) ** 2).sum(axis=1).max())))
+
+def _frames(axes):
+    """
+    以 PCA 主軸與連桿座標軸為候選的旋轉 (行向量為 x, y, z)
+    """
+    return (axes, np.eye(3))
+
+def _axis_frame(axis):
+    """
+    Z 軸為 axis 的右手座標系
+    """
+    axis = axis / np.linalg.norm(axis)
+    helper = np.eye(3)[np.argmin(np.abs(axis))]
+    x = np.cross(helper, axis)
+    x /= np.linalg.norm(x)
+    return np.column_stack((x, np.cross(axis, x), axis))
+
+
+# ================== 擬合 ==================
+def fit_box(vertices, faces, volume, frame=None):
+    """
+    定向包圍盒: PCA 主軸與連桿座標軸兩個候選, 取體積較小者
+    """
+    mean, axes = frame or _surface_frame(vertices, faces)
+    best = None
+    for rotation in _frames(axes):
+        local = (vertices - mean) @ rotation
+        lo, hi = local.min(axis=0), local.max(axis=0)
+        size = tuple(float(x) for x in hi - lo)
+        box_volume = math.prod(size)
+        if best is None or box_volume < best.volume:
+            center = mean + rotation @ ((lo + hi) / 2.0)
+            best = primitive_fit("Box", center, rotation, (size,), box_volume, box_volume / volume - 1.0)
+    return best
+
+def fit_sphere(vertices, volume, hull=None):
+    """
+    最小包圍球
+    """
+    center, radius = enclosing_ball(vertices, hull)
+    sphere_volume = 4.0 / 3.0 * math.pi * radius ** 3
+    return primitive_fit("Sphere", center, np.eye(3), (radius,), sphere_volume, sphere_volume / volume - 1.0)
+
+def _axis_fits(vertices, faces, frame=None, hull=None):
+    """
+    每個候選軸: (重心, 軸座標系, 垂直面上的最小包圍圓心 (2,), 半徑, 軸向座標 t, 到圓心的距離)
+    """
+    mean, axes = frame or _surface_frame(vertices, faces)
+    if hull is None:
+        hull = extreme_points(vertices)
+    fits = []
+    for rotation in _frames(axes):
+        for axis in rotation.T:
+            axis_frame = _axis_frame(axis)
+            local = (vertices - mean) @ axis_frame
+            center, radius = enclosing_ball(local[:, :2], hull)
+            distance = np.linalg.norm(local[:, :2] - center, axis=1)
+            fits.append((mean, axis_frame, center, radius, local[:, 2], distance))
+    return fits
+
+def _placed(mean, frame, center, t_center):
+    """
+    軸座標系中的 (圓心, t_center) 轉回連桿座標
+    """
+    return mean + frame @ np.array((center[0], center[1], t_center))
+
+def fit_cylinder(vertices, faces, volume, axis_fits=None):
+    """
+    最小包圍圓 x 軸向範圍, 在各候選軸中取體積最小者
+    """
+    best = None
+    for mean, frame, center, radius, t, _ in axis_fits or _axis_fits(vertices, faces):
+        lo, hi = float(t.min()), float(t.max())
+        cylinder_volume = math.pi * radius ** 2 * (hi - lo)
+        if best is None or cylinder_volume < best.volume:
+            best = primitive_fit("Cylinder", _placed(mean, frame, center, (lo + hi) / 2.0), frame,
+                                 (hi - lo, radius), cylinder_volume, cylinder_volume / volume - 1.0)
+    return best
+
+def fit_capsule(vertices, faces, volume, axis_fits=None):
+    """
+    膠囊 (圓柱段長 height + 兩端半球): 半徑 r 時, 點 (t, d) 要求線段端點
+        lo <= t + sqrt(r^2 - d^2),  hi >= t - sqrt(r^2 - d^2)
+    各候選軸與半徑倍率中取體積最小者
+    """
+    best = None
+    for mean, frame, center, radius, t, distance in axis_fits or _axis_fits(vertices, faces):
+        for scale in _CAPSULE_SCALES:
+            r = radius * scale
+            reach = np.sqrt(np.maximum(r * r - distance * distance, 0.0))
+            lo, hi = float((t + reach).min()), float((t - reach).max())
+            height = max(hi - lo, 0.0)
+            capsule_volume = math.pi * r * r * height + 4.0 / 3.0 * math.pi * r ** 3
+            if best is None or capsule_volume < best.volume:
+                best = primitive_fit("Capsule", _placed(mean, frame, center, (lo + hi) / 2.0), frame,
+                                     (height, r), capsule_volume, capsule_volume / volume - 1.0)
+    return best
+
+def fit_primitives(vertices, faces, kinds=PRIMITIVES):
+    """
+    擬合 kinds 中的每種形狀, 依體積誤差由小到大排序; 網格未封閉或沒有體積時回傳 []
+    PCA 主軸、凸包候選點與各軸的最小包圍圓只計算一次, 由各形狀共用
+    """
+    if not len(faces) or not is_closed(faces):
+        return []
+    volume = mesh_volume(vertices, faces)
+    if volume <= 0:
+        return []
+    frame = _surface_frame(vertices, faces)
+    hull = extreme_points(vertices, _HULL_DIRECTIONS)
+    axis_fits = _axis_fits(vertices, faces, frame, hull) if {"Cylinder", "Capsule"} & set(kinds) else None
+    fitters = {
+        "Box": lambda: fit_box(vertices, faces, volume, frame),
+        "Cylinder": lambda: fit_cylinder(vertices, faces, volume, axis_fits),
+        "Capsule": lambda: fit_capsule(vertices, faces, volume, axis_fits),
+        "Sphere": lambda: fit_sphere(vertices, volume, hull),
+    }
+    return sorted((fitters[kind]() for kind in kinds), key=lambda fit: fit.error)
+
+def fit_stl(stl_path, kinds=PRIMITIVES):
+    """
+    讀取 STL 並擬合, 回傳 (依誤差排序的形狀, 無法擬合時的原因)
+    """
+    vertices, faces = read_stl(stl_path)
+    if not len(faces):
+        return [], "沒有三角面"
+    if not is_closed(faces):
+        return [], "網格未封閉"
+    fits = fit_primitives(vertices, faces, kinds)
+    return fits, None if fits else "網格沒有體積"
+
+
+# ================== proto 節點 ==================
+def _numbers(values):
+    return " ".join(NUMBER_FORMAT % (float(v) + 0.0) for v in values)
+
+def axis_angle(rotation):
+    """
+    旋轉矩陣 -> Webots rotation 欄位 (x, y, z, angle)
+    """
+    angle = math.acos(max(-1.0, min(1.0, (np.trace(rotation) - 1.0) / 2.0)))
+    if angle < 1e-9:
+        return (0.0, 0.0, 1.0, 0.0)
+    if math.pi - angle < 1e-6:
+        # 接近 180 度: 軸為 (R + I) / 2 最大的一行
+        symmetric = (rotation + np.eye(3)) / 2.0
+        axis = symmetric[:, np.argmax(np.diag(symmetric))]
+    else:
+        axis = np.array((rotation[2, 1] - rotation[1, 2], rotation[0, 2] - rotation[2, 0], rotation[1, 0] - rotation[0, 1]))
+    axis = axis / np.linalg.norm(axis)
+    return (*axis, angle)
+
+def primitive_node(fit, name="boundingObject"):
+    """
+    形狀的 Transform 節點: name 為 "boundingObject" 時為 "boundingObject Transform {",
+    為 None 時為 children 中的 "Transform {"
+    """
+    if name is None:
+        node = proto.Node(name="Transform", parent=None, DEF="{")
+    else:
+        node = proto.Node(name=name, parent=None, DEF="Transform {")
+    node.add_child(proto.property(name="translation", parent=node, stage=1, content=_numbers(fit.translation)))
+    if fit.kind != "Sphere":
+        node.add_child(proto.property(name="rotation", parent=node, stage=1, content=_numbers(axis_angle(fit.rotation))))
+    children = proto.container(name="children", parent=node, DEF="[", stage=1)
+    shape = proto.Node(name=fit.kind, parent=children, DEF="{", stage=2)
+    for field, value in zip(_FIELDS[fit.kind], fit.size):
+        values = value if isinstance(value, tuple) else (value,)
+        shape.add_child(proto.property(name=field, parent=shape, stage=3, content=_numbers(values)))
+    children.add_child(shape)
+    node.add_child(children)
+    return node
+
+
+# ================== proto 改寫 ==================
+def _interface_default(node, field_name):
+    """
+    PROTO 介面欄位的預設值 (例如 field SFString name "robot" -> "robot"),
+    沒有這個欄位時為 PROTO 名稱, 不在 PROTO 中時為 ""
+    """
+    while node.parent is not None and node.parent is not node:
+        node = node.parent
+    declaration = node.search_first("PROTO")
+    if declaration is None:
+        return ""
+    for field in declaration.children:
+        if isinstance(field, proto.property) and field.name.endswith("ield"):
+            parts = field.content.split(None, 2)
+            if len(parts) == 3 and parts[1] == field_name:
+                # urdf2webots 在預設值後加上註解: field SFString name "robot"  # Is `Robot.name`.
+                value = parts[2].strip()
+                if value.startswith('"'):
+                    return value[1:].split('"', 1)[0]
+                return value.split("#", 1)[0].strip()
+    return declaration.DEF.split()[0]
+
+def link_name(bounding_object):
+    """
+    boundingObject 所屬 Solid 的 name 欄位 (去掉引號), 沒有時為 "";
+    PROTO 根節點的 "name IS name" 取介面欄位的預設值
+    """
+    name = bounding_object.parent.select_first("> name") if bounding_object.parent is not None else None
+    if name is None:
+        return ""
+    content = name.content.strip()
+    if content.startswith("IS "):
+        return _interface_default(name.parent, content[3:].strip())
+    return content.strip('"')
+
+def _mesh_of(node, mesh_ids, shape_ids):
+    """
+    url 指向 STL 的 Mesh 節點本身, 或 Shape 的 geometry Mesh; 其他 (例如含多個網格的 Group) 為 None
+    """
+    if id(node) in shape_ids:
+        node = node.select_first("> geometry")
+    if node is None or id(node) not in mesh_ids:
+        return None
+    return node if stl_url(node) else None
+
+def bounding_sites(robot, proto_dir):
+    """
+    boundingObject 中指向 STL 的位置, 依文件順序回傳 [(boundingObject, 位置, STL 路徑)]
+    位置可以是 boundingObject 本身 ("boundingObject Mesh {" 或 "boundingObject USE X"),
+    或其中 Transform / Pose / Group 的 children 裡的 Mesh 節點與 "USE X" 項目
+    """
+    mesh_ids = {id(node) for node in robot.find_by_type("Mesh")}
+    shape_ids = {id(node) for node in robot.find_by_type("Shape")}
+    sites = []
+    for bo in robot.iter_nodes(lambda node: node.name == "boundingObject"):
+        if isinstance(bo, proto.property) or id(bo) in mesh_ids:
+            candidates = [bo]
+        else:
+            candidates = [node for node in bo.iter_nodes(lambda n: id(n) in mesh_ids or robot.resolve_use(n) is not None)
+                          if node.parent.__class__ is proto.container]
+        for site in candidates:
+            target = robot.resolve_use(site) if isinstance(site, proto.property) else site
+            mesh = _mesh_of(target, mesh_ids, shape_ids) if target is not None else None
+            if mesh is not None:
+                sites.append((bo, site, os.path.normpath(os.path.join(proto_dir, stl_url(mesh)))))
+    return sites
+
+def def_is_used(robot, site):
+    """
+    位置本身有 DEF 且被其他 USE 引用 (取代後 USE 會失效)
+    """
+    match = _DEF_NAME.search(f"{site.name} {site.DEF or ''}")
+    return bool(match and robot.find_uses(match.group(1)))
+
+def fit_bounding_objects(robot, proto_dir, max_error=MAX_ERROR, kinds=PRIMITIVES):
+    """
+    擬合每個 boundingObject 指向的 STL, 誤差不超過 max_error 的改寫為 Transform + 基本形狀
+    同一個 STL 只擬合一次; 回傳 collision_report 列表
+    """
+    fits = {}
+    report = []
+    with robot.transaction() as tx:
+        for bo, site, path in bounding_sites(robot, proto_dir):
+            if path not in fits:
+                fits[path] = fit_stl(path, kinds) if os.path.exists(path) else ([], "找不到檔案")
+            candidates, note = fits[path]
+            fit = candidates[0] if candidates else None
+            replaced = False
+            if fit is not None and fit.error > max_error:
+                note = f"誤差超過 {max_error:g}"
+            elif fit is not None and def_is_used(robot, site):
+                note = "DEF 被其他 USE 引用"
+            elif fit is not None:
+                tx.replace(site, primitive_node(fit, "boundingObject" if site is bo else None))
+                replaced = True
+            report.append(collision_report(link_name(bo), path, fit, replaced, note))
+    return report
+
+def print_collision_report(report, label="基本形狀"):
+    """
+    列印每個連桿選用的形狀與體積誤差, label 為取代後的形狀名稱
+    """
+    for row in report:
+        name = row.link or os.path.basename(row.stl_path)
+        if row.fit is None:
+            print(f"  ⚠️  {name}: 保留網格 ({row.note})")
+        elif row.replaced:
+            print(f"  🧊 {name}: {row.fit.kind} (體積誤差 {row.fit.error:.1%})")
+        else:
+            print(f"  ➖ {name}: 保留網格, 最佳為 {row.fit.kind} (體積誤差 {row.fit.error:.1%}, {row.note})")
+    replaced = sum(row.replaced for row in report)
+    print(f"📦 {replaced}/{len(report)} 個 boundingObject 改為{label}")
+
+def process_proto_file(proto_file_path, output_path=None, max_error=MAX_ERROR, kinds=PRIMITIVES, cache=None):
+    """
+    讀取 proto, 以基本形狀取代可擬合的 boundingObject 並寫入 output_path
+    (預設為同目錄下的 "copy_" + 檔名), 回傳輸出路徑
+    """
+    proto_file_path = os.path.abspath(proto_file_path)
+    if output_path is None:
+        output_path = os.path.join(os.path.dirname(proto_file_path), "copy_" + os.path.basename(proto_file_path))
+    robot = proto.proto_robot(proto_filename=proto_file_path, cache=cache)
+    report = fit_bounding_objects(robot, os.path.dirname(proto_file_path), max_error, kinds)
+    print_collision_report(report)
+    if robot.search_first("PROTO") is None:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            robot.write(f)
+    else:
+        robot.save_robot(output_path)
+    print(f"✅ 已寫入: {output_path}")
+    return output_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="以 Box / Cylinder / Capsule / Sphere 取代 boundingObject 的 STL 網格")
+    parser.add_argument("proto", help="proto 檔案")
+    parser.add_argument("max_error", nargs="?", type=float, default=MAX_ERROR, help="體積誤差門檻 (預設 0.3)")
+    parser.add_argument("--output", help="輸出路徑 (預設 copy_<檔名>)")
+    parser.add_argument("--kinds", default=",".join(PRIMITIVES), help="可用的形狀, 以逗號分隔")
+    args = parser.parse_args()
+    kinds = tuple(kind.strip() for kind in args.kinds.split(",") if kind.strip())
+    unknown = [kind for kind in kinds if kind not in PRIMITIVES]
+    if unknown:
+        parser.error(f"未知的形狀: {', '.join(unknown)}")
+    process_proto_file(args.proto, args.output, args.max_error, kinds)
+    sys.exit(0)
@@ -1,65 +1,710 @@
 import re
 import os
-import trimesh
 import sys
+import numpy as np
+import hashlib
+import functools
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from urdf_converter.core import proto_parser as proto
+from urdf_converter.core.proto_cache import file_digest
+from urdf_converter.core.stl_reader import read_stl
 
-def stl_to_ifs_str(stl_path, indent_level=6):
+# 頂點與三角面每一列的格式
+POINT_FORMAT = "%.4f %.4f %.4f"
+POINT_DECIMALS = 4
+FACE_FORMAT = "%d, %d, %d, -1"
+
+# 快取合併後頂點 / 面陣列與頂點列格式的參數 (樹狀改寫使用)
+_MESH_PARAMS = ("merged_mesh", "merge_vertices", "point_format")
+
+# Mesh 節點: url 中的 STL 路徑, 型別名稱, 以及變數引用 (例如 $robot)
+_STL_URL = re.compile(r'"([^"]+?\.stl)"', re.IGNORECASE)
+_MESH_IN_DEF = re.compile(r'\bMesh(?=\s*\{)')
+_MESH_NAME = re.compile(r'\bMesh$')
+_ROBOT_VARIABLE = re.compile(r'\$robot\b', re.IGNORECASE)
+_DEF_NAME = re.compile(r'\bDEF\s+([^\s{]+)')
+
+# 網格精簡選項 (預設全部關閉, 輸出與 merge_vertices + POINT_FORMAT 相同):
+#   step:          絕對量化步長 (公尺), 例如 0.0005
+#   relative_step: 相對於包圍盒對角線的量化步長, 例如 1e-4, 取不大於它的 10 的次方
+#   weld:          焊接距離, 相距約在此距離內的頂點合併為平均位置 (空間雜湊)
+#   compact:       數字去掉尾端的 0 (0.1000 -> 0.1), 未指定步長時以 POINT_DECIMALS 量化
+ifs_options = collections.namedtuple("ifs_options", ("step", "relative_step", "weld", "compact"),
+                                     defaults=(None, None, None, False))
+DEFAULT_OPTIONS = ifs_options()
+
+# 轉換結果: 頂點 (N, 3), 三角面 (M, 3), 以及頂點每一列的格式
+ifs_mesh = collections.namedtuple("ifs_mesh", ("vertices", "faces", "point_format"))
+
+def _conversion_params(indent_level, options=None):
+    """
+    影響輸出內容的轉換參數, 作為 IFS 快取 key 的一部分
+    """
+    params = ("merge_vertices", POINT_FORMAT, FACE_FORMAT, indent_level)
+    if options and options != DEFAULT_OPTIONS:
+        params += (tuple(options),)
+    return params
+
+def _mesh_params(options=None):
+    """
+    快取合併後 (與精簡後) 頂點 / 面陣列的參數
+    """
+    if options and options != DEFAULT_OPTIONS:
+        return _MESH_PARAMS + (tuple(options),)
+    return _MESH_PARAMS
+
+def _quantization_step(vertices, options):
+    """
+    options 對應的量化步長, 不量化時為 None
+    """
+    if options.step:
+        return options.step
+    if options.relative_step and len(vertices):
+        diagonal = float(np.linalg.norm(vertices.max(axis=0) - vertices.min(axis=0)))
+        if diagonal > 0:
+            return 10.0 ** np.floor(np.log10(options.relative_step * diagonal))
+    if options.compact:
+        return 10.0 ** -POINT_DECIMALS
+    return None
+
+def _decimals(step):
+    """
+    剛好能寫出 step 整數倍的小數位數 (0.0005 -> 4, 0.01 -> 2)
+    """
+    for decimals in range(16):
+        scaled = step * 10 ** decimals
+        if abs(scaled - round(scaled)) < 1e-6 * max(scaled, 1.0):
+            return decimals
+    return 15
+
+def _point_format(vertices, step, compact):
+    """
+    頂點列的格式: 以 step 的小數位數寫出, compact 時用 %g 省略尾端的 0
+    """
+    decimals = POINT_DECIMALS if step is None else _decimals(step)
+    if compact:
+        # 有效位數 = 整數位數 + 小數位數, 量化後的值以 %g 寫出時不會多出尾數
+        largest = float(np.abs(vertices).max()) if len(vertices) else 0.0
+        integer_digits = len(str(int(largest)))
+        return " ".join([f"%.{integer_digits + decimals}g"] * 3)
+    return " ".join([f"%.{decimals}f"] * 3)
+
+def _cluster(keys):
+    """
+    整數 keys (N, 3) 相同的列歸為一群, 回傳 (每列的群編號, 每群第一列的位置),
+    群依第一次出現的順序編號, 讓輸出順序與原始頂點一致
+    """
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(len(first))
+    return rank[inverse.ravel()], np.sort(first)
+
+# 焊接時檢查的相鄰格 (26 個相鄰格的一半, 另一半由對方檢查)
+_NEIGHBOUR_CELLS = np.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)
+                             if (x, y, z) > (0, 0, 0)], dtype=np.int64)
+
+def _components(count, a, b):
+    """
+    無向邊 (a[i], b[i]) 的連通元件, 回傳每個點所屬元件中最小的編號
+    """
+    labels = np.arange(count)
+    while True:
+        smaller = np.minimum(labels[a], labels[b])
+        merged = labels.copy()
+        np.minimum.at(merged, a, smaller)
+        np.minimum.at(merged, b, smaller)
+        merged = merged[merged]
+        if np.array_equal(merged, labels):
+            return labels
+        labels = merged
+
+def _weld_labels(vertices, tolerance):
+    """
+    空間雜湊分群: 以 tolerance 為格寬分格, 同一格的頂點為一群,
+    再把相鄰格中距離小於 tolerance 的群連在一起, 回傳每個頂點的群編號 (依第一次出現的順序)
+    """
+    cells = np.floor(vertices / tolerance).astype(np.int64)
+    cell_labels, first = _cluster(cells)
+    cells = cells[first] - cells.min(axis=0) + 1    # 相鄰格的座標也不為負
+    size = cells.max(axis=0) + 2
+    if float(size[0]) * float(size[1]) * float(size[2]) >= 2.0 ** 62:
+        raise ValueError(f"weld tolerance {tolerance} is too small for the mesh extent")
+    keys = (cells[:, 0] * size[1] + cells[:, 1]) * size[2] + cells[:, 2]
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+
+    # 每格的平均位置, 與相鄰格的平均位置比較距離
+    counts = np.bincount(cell_labels)
+    centers = np.stack([np.bincount(cell_labels, weights=vertices[:, axis]) for axis in range(3)], axis=1) / counts[:, None]
+    a, b = [], []
+    for dx, dy, dz in _NEIGHBOUR_CELLS:
+        neighbour_keys = keys + (dx * size[1] + dy) * size[2] + dz
+        index = np.minimum(np.searchsorted(sorted_keys, neighbour_keys), len(keys) - 1)
+        found = np.flatnonzero(sorted_keys[index] == neighbour_keys)
+        other = order[index[found]]
+        close = np.linalg.norm(centers[found] - centers[other], axis=1) < tolerance
+        a.append(found[close])
+        b.append(other[close])
+    groups = _components(len(keys), np.concatenate(a), np.concatenate(b))
+    return _cluster(np.stack([groups[cell_labels]] * 3, axis=1))[0]
+
+def _weld(vertices, faces, tolerance):
+    """
+    空間雜湊焊接 (見 _weld_labels), 每群合併為平均位置
+    """
+    labels = _weld_labels(vertices, tolerance)
+    counts = np.bincount(labels)
+    vertices = np.stack([np.bincount(labels, weights=vertices[:, axis]) for axis in range(3)], axis=1) / counts[:, None]
+    return vertices, labels[faces]
+
+def _quantize(vertices, faces, step):
+    """
+    頂點對齊到 step 的整數倍, 對齊後位置相同的頂點合併
+    """
+    keys = np.round(vertices / step).astype(np.int64)
+    labels, first = _cluster(keys)
+    # keys * step 不會產生 -0.0 (寫出時不會出現 "-0")
+    return keys[first] * step, labels[faces]
+
+def _clean_faces(vertices, faces):
+    """
+    移除焊接 / 量化後退化 (兩個角落在同一頂點) 與重複 (同三個頂點, 不論順序) 的三角面,
+    以及不再被引用的頂點
+    """
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    faces = faces[keep]
+    _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    faces = faces[np.sort(first)]
+    used = np.zeros(len(vertices), dtype=bool)
+    used[faces.ravel()] = True
+    remap = np.cumsum(used) - 1
+    return vertices[used], remap[faces]
+
+def optimize_mesh(vertices, faces, options=None):
+    """
+    依 options 焊接、量化並清理三角面, 回傳 ifs_mesh (vertices, faces, point_format)
+    預設選項不改動陣列, point_format 即為 POINT_FORMAT
+    """
+    options = options or DEFAULT_OPTIONS
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    if options == DEFAULT_OPTIONS or not len(vertices):
+        return ifs_mesh(vertices, faces, POINT_FORMAT)
+    if options.weld:
+        vertices, faces = _weld(vertices, faces, options.weld)
+    step = _quantization_step(vertices, options)
+    if step:
+        vertices, faces = _quantize(vertices, faces, step)
+    if options.weld or step:
+        vertices, faces = _clean_faces(vertices, faces)
+    return ifs_mesh(vertices, faces, _point_format(vertices, step, options.compact))
+
+# 每次 % 運算格式化的列數 (串流輸出時每段的大小)
+CHUNK_ROWS = 65536
+
+def _iter_rows(array, row_format, separator, chunk_rows=CHUNK_ROWS):
+    """
+    以 row_format 格式化陣列的每一列並用 separator 連接, 每次產生 chunk_rows 列
+    (一次 % 運算處理一整段, 結果與逐列 f-string 相同)
+    """
+    for start in range(0, len(array), chunk_rows):
+        block = array[start:start + chunk_rows]
+        template = separator.join([row_format] * len(block))
+        yield (separator if start else "") + template % tuple(block.ravel().tolist())
+
+def iter_ifs_str(vertices, faces, indent_level=6, chunk_rows=CHUNK_ROWS, point_format=POINT_FORMAT):
+    """
+    頂點 (N, 3) 與三角面 (M, 3) 陣列 -> Webots IndexedFaceSet 字串的片段,
+    串接後即為 ifs_str(), 每段最多 chunk_rows 列, 可直接寫入檔案而不必組出整個字串
+    (注意：這裡不加 geometry 前綴，因為我們要替換掉 Mesh)
+    """
+    # 準備縮排
+    indent = " " * indent_level
+    sub_indent = " " * (indent_level + 2)
+    row_separator = f"\n{sub_indent}  "
+
+    # coord Coordinate
+    yield f"IndexedFaceSet {{\n{indent}creaseAngle 1.0\n{indent}coord Coordinate {{\n{sub_indent}point [\n{sub_indent}  "
+    yield from _iter_rows(vertices, point_format, row_separator, chunk_rows)
+    yield f"\n{sub_indent}]\n{indent}}}\n"
+
+    # coordIndex
+    yield f"{indent}coordIndex [\n{sub_indent}  "
+    yield from _iter_rows(faces, FACE_FORMAT, row_separator, chunk_rows)
+    yield f"\n{indent}]\n{indent[:-2]}}}"
+
+def ifs_str(vertices, faces, indent_level=6, point_format=POINT_FORMAT):
+    """
+    頂點 (N, 3) 與三角面 (M, 3) 陣列 -> Webots IndexedFaceSet 字串
+    """
+    return "".join(iter_ifs_str(vertices, faces, indent_level, point_format=point_format))
+
+def stl_to_mesh(stl_path, options=None):
+    """
+    讀取 STL 並合併頂點, 依 options 精簡 (見 optimize_mesh),
+    回傳 ifs_mesh (vertices (N, 3), faces (M, 3), point_format), 找不到檔案時回傳 None
+    """
+    if not os.path.exists(stl_path):
+        print(f"  ❌ 找不到檔案: {stl_path}")
+        return None
+
+    # 1. 讀取網格 (binary STL 以 memory map 讀取) 並合併頂點
+    #    (關鍵：減少檔案大小並符合 IFS 結構, 結果與 trimesh.load + merge_vertices 相同)
+    vertices, faces = read_stl(stl_path)
+    return optimize_mesh(vertices, faces, options)
+
+def stl_to_ifs_str(stl_path, indent_level=6, cache=None, options=None):
     """
     讀取 STL 並回傳 Webots IndexedFaceSet 的字串格式
+    cache: 選用的 ifs_cache, STL 內容與參數相同時直接取用先前的結果
+    options: 選用的 ifs_options (量化、焊接、精簡數字)
     """
     if not os.path.exists(stl_path):
         print(f"  ❌ 找不到檔案: {stl_path}")
         return None
 
-    # 1. 讀取網格
-    mesh = trimesh.load(stl_path)
-    
-    # 2. 合併頂點 (關鍵：減少檔案大小並符合 IFS 結構)
-    mesh.merge_vertices()
-    
-    # 3. 準備縮排
-    indent = " " * indent_level
-    sub_indent = " " * (indent_level + 2)
+    params = _conversion_params(indent_level, options)
+    if cache is not None:
+        ifs_text = cache.get(stl_path, params)
+        if ifs_text is not None:
+            return ifs_text
 
-    # 4. 建構 coord Coordinate
-    coord_str = f"{indent}coord Coordinate {{\n{sub_indent}point [\n"
-    points_list = [f"{v[0]:.4f} {v[1]:.4f} {v[2]:.4f}" for v in mesh.vertices]
-    coord_str += f"{sub_indent}  " + f"\n{sub_indent}  ".join(points_list)
-    coord_str += f"\n{sub_indent}]\n{indent}}}"
-
-    # 5. 建構 coordIndex
-    index_str = f"{indent}coordIndex [\n"
-    faces_list = [f"{f[0]}, {f[1]}, {f[2]}, -1" for f in mesh.faces]
-    index_str += f"{sub_indent}  " + f"\n{sub_indent}  ".join(faces_list)
-    index_str += f"\n{indent}]"
-
-    # 6. 組合 IndexedFaceSet (注意：這裡不加 geometry 前綴，因為我們要替換掉 Mesh)
-    ifs_block = f"""IndexedFaceSet {{
-{indent}creaseAngle 1.0
-{coord_str}
-{index_str}
-{indent[:-2]}}}"""
+    vertices, faces, point_format = stl_to_mesh(stl_path, options)
     
-    return ifs_block
+    # 3. 格式化頂點與面 (整個陣列一次格式化)
+    ifs_text = ifs_str(vertices, faces, indent_level, point_format)
+    if cache is not None:
+        cache.put(stl_path, params, ifs_text)
+    return ifs_text
 
-def process_proto_file(proto_file_path, output_path=None):
-    print(f"🔵 正在處理 PROTO: {proto_file_path}")
-    
-    if not os.path.exists(proto_file_path):
-        print("❌ PROTO 檔案不存在")
-        return
+def ifs_node(vertices, faces, name="geometry", DEF="IndexedFaceSet {", parent=None, stage=0, point_format=POINT_FORMAT):
+    """
+    頂點與三角面陣列 -> IndexedFaceSet 的 proto_parser 節點 (內容與 ifs_str 相同,
+    point / coordIndex 為 array_field, 寫檔時才整塊格式化)
+    """
+    node = proto.Node(name=name, parent=parent, DEF=DEF, stage=stage)
+    node.add_child(proto.property(name="creaseAngle", parent=node, content="1.0", stage=stage + 1))
+    coord = proto.Node(name="coord", parent=node, DEF="Coordinate {", stage=stage + 1)
+    coord.add_child(proto.array_field(name="point", parent=coord, stage=stage + 2, values=vertices, row_format=point_format))
+    node.add_child(coord)
+    node.add_child(proto.array_field(name="coordIndex", parent=node, stage=stage + 1, values=faces, row_format=FACE_FORMAT))
+    return node
+
+def _pool_context():
+    """
+    fork 讓子行程不必重新匯入呼叫端的 script (main.py 沒有 __main__ 保護)
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+def map_stl_files(convert, stl_paths, workers, get=None, put=None):
+    """
+    以 convert 轉換每個不重複的 STL, 回傳 {路徑: 結果, 失敗為 None}
+    get / put: 選用的快取讀寫, 只在目前行程執行, 命中的 STL 不送進行程池
+    """
+    results = {}
+    stl_paths = list(dict.fromkeys(stl_paths))
+    if get is not None:
+        for path in stl_paths:
+            cached = get(path) if os.path.exists(path) else None
+            if cached is not None:
+                results[path] = cached
+        stl_paths = [path for path in stl_paths if path not in results]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(stl_paths))
+    if workers <= 1:
+        converted = {path: convert(path) for path in stl_paths}
+    else:
+        # 大檔先送出, 避免最後只剩一個行程在處理大網格
+        stl_paths.sort(key=lambda path: os.path.getsize(path) if os.path.exists(path) else 0, reverse=True)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+            converted = dict(zip(stl_paths, pool.map(convert, stl_paths)))
+
+    if put is not None:
+        for path, result in converted.items():
+            if result is not None:
+                put(path, result)
+    results.update(converted)
+    return results
+
+def convert_stl_files(stl_paths, workers=None, cache=None, options=None):
+    """
+    轉換多個 STL (重複的路徑只轉換一次), 回傳 {路徑: IndexedFaceSet 字串, 失敗為 None}
+    workers: 行程數, None 為 CPU 核心數, 1 則在目前行程依序轉換
+    cache: 選用的 ifs_cache, 命中的 STL 不再讀取網格, 其餘轉換後寫入
+    options: 選用的 ifs_options
+    """
+    convert = functools.partial(stl_to_ifs_str, options=options)
+    if cache is None:
+        return map_stl_files(convert, stl_paths, workers)
+    params = _conversion_params(6, options)
+    return map_stl_files(convert, stl_paths, workers,
+                          lambda path: cache.get(path, params),
+                          lambda path, ifs_text: cache.put(path, params, ifs_text))
+
+def _get_mesh(cache, path, options):
+    mesh = cache.get_mesh(path, _mesh_params(options))
+    return ifs_mesh(*mesh) if mesh is not None else None
+
+def _put_mesh(cache, path, options, mesh):
+    cache.put_mesh(path, _mesh_params(options), *mesh)
+
+def load_stl_meshes(stl_paths, workers=None, cache=None, options=None):
+    """
+    同 convert_stl_files, 但回傳合併 (與精簡) 後的 ifs_mesh (樹狀改寫使用)
+    """
+    load = functools.partial(stl_to_mesh, options=options)
+    if cache is None:
+        return map_stl_files(load, stl_paths, workers)
+    return map_stl_files(load, stl_paths, workers,
+                          lambda path: _get_mesh(cache, path, options),
+                          lambda path, mesh: _put_mesh(cache, path, options, mesh))
+
+# 一個 STL 精簡前後的頂點數、面數與 IndexedFaceSet 文字大小 (bytes)
+ifs_size = collections.namedtuple("ifs_size", ("path", "vertices", "faces", "bytes",
+                                               "optimized_vertices", "optimized_faces", "optimized_bytes"))
+
+def _text_bytes(vertices, faces, point_format, indent_level):
+    return sum(len(piece.encode('utf-8')) for piece in iter_ifs_str(vertices, faces, indent_level, point_format=point_format))
+
+def size_report(stl_paths, options=None, indent_level=6):
+    """
+    每個不重複的 STL 以預設選項與 options 轉換後的大小, 回傳 ifs_size 的 list (找不到的 STL 略過)
+    """
+    report = []
+    for path in dict.fromkeys(stl_paths):
+        if not os.path.exists(path):
+            continue
+        vertices, faces, point_format = optimize_mesh(*read_stl(path))
+        optimized = optimize_mesh(vertices, faces, options)
+        report.append(ifs_size(
+            path, len(vertices), len(faces), _text_bytes(vertices, faces, point_format, indent_level),
+            len(optimized.vertices), len(optimized.faces), _text_bytes(*optimized, indent_level),
+        ))
+    return report
+
+def print_size_report(report):
+    """
+    列印 size_report() 的結果與總計
+    """
+    def saved(before, after):
+        return f"{(before - after) / before:.1%}" if before else "-"
+
+    for row in report:
+        print(f"  📉 {os.path.basename(row.path)}: 頂點 {row.vertices} -> {row.optimized_vertices}, "
+              f"面 {row.faces} -> {row.optimized_faces}, "
+              f"{row.bytes / 1024:.1f} KB -> {row.optimized_bytes / 1024:.1f} KB (節省 {saved(row.bytes, row.optimized_bytes)})")
+    before = sum(row.bytes for row in report)
+    after = sum(row.optimized_bytes for row in report)
+    print(f"📦 IndexedFaceSet 總計: {before / 1024:.1f} KB -> {after / 1024:.1f} KB, "
+          f"節省 {(before - after) / 1024:.1f} KB ({saved(before, after)})")
+
+# 兩個網格在剛體變換 (rigid) 或鏡像 (mirror) 下相同: other 的頂點 ≈ path 的頂點 @ rotation.T + translation
+instance_candidate = collections.namedtuple("instance_candidate", ("path", "other", "kind", "rotation", "translation", "error"))
+
+# 8 種主軸方向 (正負號) 組合
+_AXIS_SIGNS = [np.diag([x, y, z]).astype(np.float64) for x in (1, -1) for y in (1, -1) for z in (1, -1)]
+
+def _principal_frame(vertices):
+    """
+    (重心, 主軸特徵值 (遞增), 主軸 (3, 3) 每行一軸)
+    """
+    center = vertices.mean(axis=0)
+    centered = vertices - center
+    eigenvalues, axes = np.linalg.eigh(centered.T @ centered / len(vertices))
+    return center, eigenvalues, axes
+
+def _match_transform(a, b, tolerance):
+    """
+    以主軸對齊 a 與 b 的頂點, 回傳 (rotation, translation, error), 對不上時為 None
+    主軸特徵值相近 (對稱形狀) 時方向不唯一, 不做判斷
+    """
+    center_a, values_a, axes_a = _principal_frame(a)
+    center_b, values_b, axes_b = _principal_frame(b)
+    scale = max(values_a[-1], 1e-30)
+    if np.min(np.diff(values_a)) < 1e-6 * scale:
+        return None
+    # 對齊後與 b 一起以空間雜湊分群, 每群恰好一個 a 與一個 b 的頂點才算相同
+    # (先試旋轉, 本身對稱的網格在旋轉與鏡像下都相同時回報為 rigid)
+    centered_b = b - center_b
+    rotations = sorted((axes_b @ signs @ axes_a.T for signs in _AXIS_SIGNS), key=lambda r: np.linalg.det(r) < 0)
+    for rotation in rotations:
+        moved = (a - center_a) @ rotation.T
+        labels = _weld_labels(np.concatenate([moved, centered_b]), tolerance)
+        labels_a, labels_b = labels[:len(a)], labels[len(a):]
+        order_a, order_b = np.argsort(labels_a), np.argsort(labels_b)
+        if not (np.array_equal(labels_a[order_a], labels_b[order_b]) and np.unique(labels_a).size == len(a)):
+            continue
+        error = float(np.linalg.norm(moved[order_a] - centered_b[order_b], axis=1).max())
+        return rotation, center_b - center_a @ rotation.T, error
+    return None
+
+def instance_candidates(stl_paths, options=None, tolerance=1e-5):
+    """
+    內容不同但在剛體變換或鏡像下相同的網格 (例如左右腳各自匯出的 STL), 回傳 instance_candidate 的 list
+    內容完全相同的網格已由 instancing 共用, 不列入; USE 無法帶變換, 這裡只做報告
+    """
+    meshes = {}
+    for path in dict.fromkeys(stl_paths):
+        mesh = stl_to_mesh(path, options) if os.path.exists(path) else None
+        if mesh is not None and len(mesh.vertices):
+            meshes.setdefault(mesh_digest(*mesh), (path, mesh))
+
+    # 頂點數、面數相同且主軸特徵值相近的才進一步比對
+    groups = {}
+    for path, mesh in meshes.values():
+        groups.setdefault((len(mesh.vertices), len(mesh.faces)), []).append((path, mesh, _principal_frame(mesh.vertices)[1]))
+
+    candidates = []
+    for group in groups.values():
+        for i, (path, mesh, eigenvalues) in enumerate(group):
+            for other, other_mesh, other_eigenvalues in group[i + 1:]:
+                if not np.allclose(np.sqrt(eigenvalues), np.sqrt(other_eigenvalues), rtol=0, atol=tolerance):
+                    continue
+                match = _match_transform(mesh.vertices, other_mesh.vertices, tolerance)
+                if match is not None:
+                    rotation, translation, error = match
+                    kind = "mirror" if np.linalg.det(rotation) < 0 else "rigid"
+                    candidates.append(instance_candidate(path, other, kind, rotation, translation, error))
+    return candidates
+
+def print_instance_candidates(candidates):
+    """
+    列印 instance_candidates() 的結果
+    """
+    for candidate in candidates:
+        print(f"  🪞 {os.path.basename(candidate.other)} ≈ {os.path.basename(candidate.path)} "
+              f"({candidate.kind}, 誤差 {candidate.error:.2g})")
+    if candidates:
+        print(f"🔎 {len(candidates)} 組網格只差剛體變換或鏡像, 可考慮改用同一個 STL 加 Transform")
+
+def stl_url(mesh_node):
+    """
+    Mesh 節點的 url 指向的 .stl 路徑 (例如 url "./meshes/a.STL" 或 url [ "a.stl" ]), 其他為 None
+    """
+    url = mesh_node.select_first("> url")
+    if url is None:
+        return None
+    if isinstance(url, proto.property):
+        text = url.content
+    else:
+        text = " ".join(child.content for child in url.children if isinstance(child, proto.property))
+    match = _STL_URL.search(text)
+    return match.group(1) if match else None
+
+def _ifs_header(mesh_node):
+    """
+    取代 Mesh 節點的 (name, DEF), 只把型別換成 IndexedFaceSet:
+        "geometry DEF link1 Mesh {" -> "geometry DEF link1 IndexedFaceSet {"
+    """
+    DEF = mesh_node.DEF or "{"
+    if _MESH_IN_DEF.search(DEF):
+        return mesh_node.name, _MESH_IN_DEF.sub("IndexedFaceSet", DEF, count=1)
+    return _MESH_NAME.sub("IndexedFaceSet", mesh_node.name, count=1), DEF
+
+def mesh_digest(vertices, faces, point_format=POINT_FORMAT):
+    """
+    合併後頂點 / 面陣列 (與頂點列格式) 的 blake2b, 內容相同的網格寫出的文字也相同
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for array in (vertices, faces):
+        array = np.ascontiguousarray(array)
+        h.update(f"{array.dtype.str}{array.shape}".encode('utf-8'))
+        h.update(array.tobytes())
+    h.update(point_format.encode('utf-8'))
+    return h.hexdigest()
 
+def _def_identifier(robot, stl_path, taken):
+    """
+    新的 DEF 名稱 (例如 "IFS_link1"), 不與 proto 中既有的 DEF 重複
+    """
+    stem = re.sub(r'\W', '_', os.path.splitext(os.path.basename(stl_path))[0])
+    identifier = base = f"IFS_{stem}"
+    suffix = 2
+    while identifier in taken or robot.resolve(identifier) is not None:
+        identifier = f"{base}_{suffix}"
+        suffix += 1
+    taken.add(identifier)
+    return identifier
+
+def _with_def(name, DEF, identifier):
+    """
+    在 IndexedFaceSet 的 (name, DEF) 加上 DEF 名稱:
+        ("geometry", "IndexedFaceSet {") -> ("geometry", "DEF IFS_a IndexedFaceSet {")
+        ("IndexedFaceSet", "{")          -> ("DEF", "IFS_a IndexedFaceSet {")   (children 中的節點)
+    """
+    if name == "IndexedFaceSet":
+        return "DEF", f"{identifier} IndexedFaceSet {{"
+    return name, f"DEF {identifier} {DEF}"
+
+def _use_site(mesh_node, identifier):
+    """
+    取代 Mesh 節點的 USE: "geometry USE IFS_a", children 中則為 "USE IFS_a"
+    """
+    if mesh_node.name == "DEF" or _MESH_NAME.search(mesh_node.name):
+        return proto.property(name="USE", parent=None, content=identifier)
+    return proto.property(name=mesh_node.name, parent=None, content=f"USE {identifier}")
+
+def _plan_instances(robot, targets, keys):
+    """
+    內容相同 (keys 相同) 的 Mesh 只在第一次出現 (文件順序) 寫出 IndexedFaceSet 並加上 DEF,
+    之後的改成 USE; 本身的 DEF 已被其他 USE 引用的 Mesh 仍完整寫出
+    回傳 {Mesh 節點: (DEF 名稱, 是否為第一次出現)}
+    """
+    plan = {}
+    first = {}
+    taken = set()
+    for mesh_node, path in targets:
+        key = keys.get(path)
+        if key is None:
+            continue
+        match = _DEF_NAME.search(f"{mesh_node.name} {mesh_node.DEF}")
+        identifier = match.group(1) if match else None
+        if key in first and not (identifier and robot.find_uses(identifier)):
+            plan[mesh_node] = (first[key], False)
+        elif key not in first:
+            first[key] = identifier or _def_identifier(robot, path, taken)
+            plan[mesh_node] = (first[key], True)
+    return plan
+
+class _streamed_ifs(proto.Node):
+    """
+    串流改寫的 IndexedFaceSet 節點: 寫檔時才讀取網格, 以 ifs_node() 建出的節點分段寫出
+    (與樹狀改寫的文字相同), 讀取失敗時寫出原本的 Mesh 節點
+    """
+    __slots__ = ("stl_path", "load_mesh", "mesh_node")
+    _streamed = True
+
+    def __init__(self, name, DEF, stl_path, load_mesh, mesh_node):
+        super().__init__(name, None, DEF)
+        self.stl_path = stl_path
+        self.load_mesh = load_mesh
+        self.mesh_node = mesh_node
+
+    def _iter_text(self, tab):
+        mesh = self.load_mesh(self.stl_path)
+        if mesh is None:
+            yield from self.mesh_node.iter_text()
+            return
+        vertices, faces, point_format = mesh
+        yield from ifs_node(vertices, faces, self.name, self.DEF, stage=self.stage, point_format=point_format).iter_text()
+
+    def _close_line(self, tab):
+        return ""
+
+def _last_mesh_loader(cache, options=None):
+    """
+    寫檔時讀取網格的函式, 只保留最後一個網格 (同一 STL 的 visual 與 bounding 通常相鄰),
+    找不到檔案時回傳 None (不寫入快取)
+    """
+    last = {}
+    def load(path):
+        if path not in last:
+            last.clear()
+            mesh = _get_mesh(cache, path, options) if cache is not None and os.path.exists(path) else None
+            if mesh is None:
+                mesh = stl_to_mesh(path, options)
+                if cache is not None and mesh is not None:
+                    _put_mesh(cache, path, options, mesh)
+            last[path] = mesh
+        return last[path]
+    return load
+
+def _rewrite_tree(proto_file_path, copy_proto_path, robot_name, cache, workers, ifs_cache, options, instancing,
+                  streamed=False):
+    """
+    解析一次, 在樹上把指向 STL 的 Mesh 節點換成 IndexedFaceSet 節點, 只寫入一次
+    instancing: 內容相同的網格只寫出一次 (DEF), 其餘改成 USE
+    streamed: 寫檔時才逐一讀取網格並分段寫出, 記憶體只需容納最大的單一網格
+    回傳 (成功數, 失敗數, 指向的 STL 路徑)
+    """
+    proto_dir = os.path.dirname(proto_file_path)
+    robot = proto.proto_robot(proto_filename=proto_file_path, cache=cache)
+
+    # 1. 依文件順序找出 url 指向 .stl/.STL 的 Mesh 節點 (不限 visual 或 bounding)
+    targets = []
+    mesh_ids = {id(node) for node in robot.find_by_type("Mesh")}
+    for mesh_node in robot.iter_nodes(lambda node: id(node) in mesh_ids):
+        stl_relative_path = stl_url(mesh_node)
+        if stl_relative_path:
+            print(f"  🔍 發現 STL Mesh: {stl_relative_path}")
+            targets.append((mesh_node, os.path.normpath(os.path.join(proto_dir, stl_relative_path))))
+
+    # 2. 不重複的 STL 以行程池一次讀取 (串流模式在寫檔時才讀取)
+    stl_paths = [path for _, path in targets]
+    unique_count = len(set(stl_paths))
+    if unique_count:
+        print(f"  ⚙️  轉換 {unique_count} 個不重複的 STL ({len(stl_paths)} 個 Mesh)")
+    if streamed:
+        load_mesh = _last_mesh_loader(ifs_cache, options)
+        meshes = {}
+        for path in stl_paths:
+            meshes[path] = path if os.path.exists(path) else None
+            if meshes[path] is None:
+                print(f"  ❌ 找不到檔案: {path}")
+    else:
+        meshes = load_stl_meshes(stl_paths, workers, ifs_cache, options)
+
+    # 3. 內容相同的網格共用一個 DEF (串流模式以 STL 檔案內容判斷)
+    instances = {}
+    if instancing:
+        if streamed:
+            keys = {path: file_digest(path) for path, mesh in meshes.items() if mesh is not None}
+        else:
+            keys = {path: mesh_digest(*mesh) for path, mesh in meshes.items() if mesh is not None}
+        instances = _plan_instances(robot, targets, keys)
+        used = sum(not first for _, first in instances.values())
+        if used:
+            print(f"  🔁 {used} 個 Mesh 改為 USE 共用 {len(instances) - used} 個 IndexedFaceSet")
+
+    # 4. 替換節點, 並處理可能的變數引用 (例如 $robot)
+    count = 0
+    failed = 0
+    with robot.transaction() as tx:
+        for mesh_node, path in targets:
+            if meshes[path] is None:
+                failed += 1
+                continue
+            count += 1
+            identifier, first = instances.get(mesh_node, (None, True))
+            if not first:
+                tx.replace(mesh_node, _use_site(mesh_node, identifier))
+                continue
+            name, DEF = _ifs_header(mesh_node)
+            if identifier and not _DEF_NAME.search(f"{name} {DEF}"):
+                name, DEF = _with_def(name, DEF, identifier)
+            if streamed:
+                tx.replace(mesh_node, _streamed_ifs(name, DEF, path, load_mesh, mesh_node))
+            else:
+                vertices, faces, point_format = meshes[path]
+                tx.replace(mesh_node, ifs_node(vertices, faces, name=name, DEF=DEF, point_format=point_format))
+        # 只改寫內容真的改變的欄位, 其餘保留原文
+        for prop in robot.iter_nodes(lambda node: node.__class__ is proto.property and _ROBOT_VARIABLE.search(node.content)):
+            content = _ROBOT_VARIABLE.sub(f"${robot_name}", prop.content)
+            if content != prop.content:
+                tx.set(prop, content)
+
+    # 5. 寫入副本 (save_robot 同時把 PROTO 宣告名稱改成與副本檔名一致)
+    if robot.search_first("PROTO") is None:
+        with open(copy_proto_path, 'w', encoding='utf-8') as f:
+            robot.write(f)
+    else:
+        robot.save_robot(copy_proto_path)
+    return count, failed, stl_paths
+
+def _rewrite_regex(proto_file_path, copy_proto_path, robot_name, cache, workers, ifs_cache, options, instancing):
+    """
+    舊的文字替換流程: 建立副本、以 regex 替換 Mesh 區塊、再以 parser 重新解析存檔
+    (不支援 instancing, 每個 Mesh 都完整寫出)
+    回傳 (成功數, 失敗數, 指向的 STL 路徑)
+    """
     proto_dir = os.path.dirname(proto_file_path)
 
-    # --- [關鍵修改] ---
-    # 1. 建立副本檔案
-    proto_basename = os.path.basename(proto_file_path)
-    default_copy_path = os.path.join(proto_dir, "copy_" + proto_basename)
-    copy_proto_path = output_path if output_path else default_copy_path
-    
-    print(f"  📋 正在建立副本: {copy_proto_path}")
-    
     with open(proto_file_path, 'r', encoding='utf-8') as f:
         original_content = f.read()
     
@@ -69,57 +714,106 @@ def process_proto_file(proto_file_path, output_path=None):
     with open(copy_proto_path, 'r', encoding='utf-8') as f:
         copied_content = f.read()
     
-    # 2. 從檔案名稱提取機器人名字
-    # 移除 .proto 副檔名，並轉換為小寫
-    robot_name = os.path.splitext(os.path.basename(copy_proto_path))[0]
-    print(f"  🤖 機器人名字: {robot_name}")
-    
-    # 3. 抓取所有連結到 .stl/.STL 的 Mesh { ... } 區塊（不限 visual 或 bounding）
+    # 抓取所有連結到 .stl/.STL 的 Mesh { ... } 區塊（不限 visual 或 bounding）
     pattern = re.compile(
         r'(Mesh\s*\{[\s\S]*?url\s*(?:\[\s*)?"([^"]+?\.stl)"(?:\s*\])?[\s\S]*?\})',
         re.IGNORECASE | re.DOTALL
     )
 
+    # 修改 PROTO 宣告名稱，使其與副本檔名一致
+    proto_name_pattern = re.compile(r'(\bPROTO\s+)([A-Za-z_][A-Za-z0-9_]*)')
+    copied_content = proto_name_pattern.sub(rf'\1{robot_name}', copied_content, count=1)
+
+    # 同時處理可能的變數引用 (例如 $robot)
+    copied_content = _ROBOT_VARIABLE.sub(f'${robot_name}', copied_content)
+
     count = 0
     failed = 0
+    inserted = [] # 插入的 IFS 文字在 new_content 中的 (起點, 終點)
+    shift = 0
+
+    def stl_full_path(match):
+        return os.path.normpath(os.path.join(proto_dir, match.group(2)))
+
+    # 先收集所有不重複的 STL (visual 與 bounding 共用、鏡像連桿), 以行程池一次轉換
+    stl_paths = [stl_full_path(match) for match in pattern.finditer(copied_content)]
+    unique_count = len(set(stl_paths))
+    if unique_count:
+        print(f"  ⚙️  轉換 {unique_count} 個不重複的 STL ({len(stl_paths)} 個 Mesh)")
+    ifs_texts = convert_stl_files(stl_paths, workers, ifs_cache, options)
 
     def replacement_handler(match):
         nonlocal count
         nonlocal failed
+        nonlocal shift
         full_match_text = match.group(1) # 整個 Mesh { ... }
         stl_relative_path = match.group(2) # 只有路徑
         
-        stl_full_path = os.path.join(proto_dir, stl_relative_path)
         print(f"  🔍 發現 STL Mesh: {stl_relative_path}")
         
-        ifs_text = stl_to_ifs_str(stl_full_path)
+        ifs_text = ifs_texts[stl_full_path(match)]
         
         if ifs_text:
             count += 1
+            inserted.append((match.start() + shift, match.start() + shift + len(ifs_text)))
+            shift += len(ifs_text) - len(full_match_text)
             return ifs_text
         else:
             failed += 1
             return full_match_text
 
-    # 執行替換
+    # 執行替換 (套用預先轉換的結果)
     new_content = pattern.sub(replacement_handler, copied_content)
 
-    # 修改 PROTO 宣告名稱，使其與副本檔名一致
-    proto_name_pattern = re.compile(r'(\bPROTO\s+)([A-Za-z_][A-Za-z0-9_]*)')
-    new_content = proto_name_pattern.sub(rf'\1{robot_name}', new_content, count=1)
-
-    # 同時處理可能的變數引用 (例如 $robot)
-    new_content = re.sub(r'\$robot\b', f'${robot_name}', new_content, flags=re.IGNORECASE)
-
     with open(copy_proto_path, 'w', encoding='utf-8') as f:
         f.write(new_content)
 
-    # 使用既有 parser 進一步對齊 PROTO 內部名稱欄位
+    # 使用既有 parser 進一步對齊 PROTO 內部名稱欄位,
+    # 插入的 IFS 以樹的格式重寫 (縮排與 tree / stream 模式的輸出相同), 其餘原樣寫回
     try:
-        parsed_copy = proto.proto_robot(proto_filename=copy_proto_path)
+        parsed_copy = proto.proto_robot(proto_filename=copy_proto_path, cache=cache)
+        parsed_copy.reformat_spans(inserted)
         parsed_copy.save_robot(copy_proto_path)
     except Exception as e:
         print(f"⚠️  名稱欄位二次對齊失敗，保留目前內容: {e}")
+    return count, failed, stl_paths
+
+def process_proto_file(proto_file_path, output_path=None, cache=None, workers=None, ifs_cache=None, rewrite="tree",
+                       options=None, report=False, instancing=True):
+    """
+    建立 PROTO 副本, 並把所有指向 STL 的 Mesh 換成 IndexedFaceSet
+    rewrite: "tree" 解析一次、在樹上替換節點並只寫入一次 (預設),
+             "stream" 同 tree, 但寫檔時才逐一讀取網格並分段寫出 (不使用行程池),
+             "regex" 為舊的文字替換流程
+    options: 選用的 ifs_options (量化、焊接、精簡數字), 預設輸出與先前相同
+    report: 列印每個 STL 精簡前後的大小與可剛體 / 鏡像共用的候選 (會再讀取一次網格)
+    instancing: 內容相同的網格 (例如左右共用的 STL) 只寫出一次 DEF, 其餘以 USE 引用 (tree / stream)
+    """
+    if rewrite not in _REWRITERS:
+        raise ValueError(f"unknown rewrite mode {rewrite!r}, expected one of {sorted(_REWRITERS)}")
+    print(f"🔵 正在處理 PROTO: {proto_file_path}")
+    
+    if not os.path.exists(proto_file_path):
+        print("❌ PROTO 檔案不存在")
+        return
+
+    proto_dir = os.path.dirname(proto_file_path)
+
+    # --- [關鍵修改] ---
+    # 1. 建立副本檔案
+    proto_basename = os.path.basename(proto_file_path)
+    default_copy_path = os.path.join(proto_dir, "copy_" + proto_basename)
+    copy_proto_path = output_path if output_path else default_copy_path
+    
+    print(f"  📋 正在建立副本: {copy_proto_path}")
+    
+    # 2. 從檔案名稱提取機器人名字
+    # 移除 .proto 副檔名
+    robot_name = os.path.splitext(os.path.basename(copy_proto_path))[0]
+    print(f"  🤖 機器人名字: {robot_name}")
+    
+    # 3. 替換所有連結到 .stl/.STL 的 Mesh 並寫入副本
+    count, failed, stl_paths = _REWRITERS[rewrite](proto_file_path, copy_proto_path, robot_name, cache, workers, ifs_cache, options, instancing)
 
     # 存檔
     if count > 0:
@@ -131,12 +825,35 @@ def process_proto_file(proto_file_path, output_path=None):
     if failed > 0:
         print(f"⚠️  有 {failed} 個 STL 轉換失敗，已保留原始 Mesh 區塊。")
 
+    if report:
+        print_size_report(size_report(stl_paths, options))
+        print_instance_candidates(instance_candidates(stl_paths, options))
+
     return copy_proto_path
 
+_REWRITERS = {
+    "tree": _rewrite_tree,
+    "stream": functools.partial(_rewrite_tree, streamed=True),
+    "regex": _rewrite_regex,
+}
+
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="把 PROTO 中指向 STL 的 Mesh 換成 IndexedFaceSet")
+    parser.add_argument("proto", nargs="?", help="PROTO 檔案 (省略時以 Zenity 選擇)")
+    parser.add_argument("workers", nargs="?", type=int, help="轉換 STL 的行程數 (預設為 CPU 核心數)")
+    parser.add_argument("--rewrite", choices=sorted(_REWRITERS), default="tree")
+    parser.add_argument("--step", type=float, help="絕對量化步長 (公尺)")
+    parser.add_argument("--relative-step", type=float, help="相對於包圍盒對角線的量化步長")
+    parser.add_argument("--weld", type=float, help="焊接距離 (公尺)")
+    parser.add_argument("--compact", action="store_true", help="數字去掉尾端的 0")
+    parser.add_argument("--report", action="store_true", help="列印精簡前後的大小與剛體 / 鏡像共用候選")
+    parser.add_argument("--no-instancing", dest="instancing", action="store_false", help="相同網格不以 DEF / USE 共用")
+    args = parser.parse_args()
+
     # 優先使用 CLI 參數
-    if len(sys.argv) > 1:
-        target_proto = sys.argv[1]
+    if args.proto:
+        target_proto = args.proto
     else:
         from urdf_converter.ui.ui_picker import zenity_select_file    
         # 透過 Zenity 選擇 PROTO 檔案
@@ -147,4 +864,11 @@ if __name__ == "__main__":
             print("未選擇 PROTO 檔案，退出")
             exit(1)
 
-    process_proto_file(target_proto)
\ No newline at end of file
+    options = ifs_options(args.step, args.relative_step, args.weld, args.compact)
+    # 選用的 IFS 快取 (設定 URDF_CONVERTER_IFS_CACHE 才會啟用)
+    from urdf_converter.core import ifs_cache
+    mesh_cache = ifs_cache.ifs_cache.from_env()
+    process_proto_file(target_proto, workers=args.workers, ifs_cache=mesh_cache, rewrite=args.rewrite,
+                       options=options, report=args.report, instancing=args.instancing)
+    if mesh_cache:
+        print(f"--- IFS 快取: {mesh_cache.stats()} ---")
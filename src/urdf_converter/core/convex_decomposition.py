@@ -0,0 +1,445 @@
+"""
+近似凸分解: 把 boundingObject 的網格切成最多 N 個凸包, 以 Group 內的小型凸 IndexedFaceSet 取代
+
+流程 (只使用 NumPy):
+    1. 體素化: 沿 x / y / z 三個方向的射線奇偶判斷內外, 至少兩個方向判為內部的體素為實心;
+       射線與網格的交點同時做為表面取樣點
+    2. 以軸向平面反覆切割凹度最大的部分, 直到部分數達到 max_hulls 或凹度都不超過門檻
+       凹度 = (部分的凸包體積 - 部分的體素體積) / 網格體積
+       每次切割在三個軸各取數個位置, 選兩側凹度總和最小者
+    3. 每個部分的表面點與切面點求凸包, 以最遠點優先加入頂點, 最多 max_hull_vertices 個
+       (內接凸包, 平滑曲面上會略小於網格)
+寫出:
+    boundingObject Group {
+      children [
+        IndexedFaceSet { ... }
+        IndexedFaceSet { ... }
+      ]
+    }
+各 STL 以行程池分解, 結果可存入 ifs_cache (以 STL 內容雜湊與參數為鍵)。
+
+用法:
+    python -m urdf_converter.core.convex_decomposition robot.proto [max_hulls]
+"""
+import os
+import sys
+import heapq
+import argparse
+import functools
+from collections import namedtuple
+
+import numpy as np
+
+from urdf_converter.core import proto_parser as proto
+from urdf_converter.core.stl_reader import read_stl
+from urdf_converter.core.convert_collision_to_ifs import POINT_FORMAT, ifs_node, map_stl_files
+from urdf_converter.core.collision_primitives import (
+    bounding_sites, collision_report, def_is_used, extreme_points, is_closed, link_name, mesh_volume,
+    print_collision_report,
+)
+
+# max_hulls: 每個網格最多的凸包數
+# concavity: 凹度門檻 (相對於網格體積), 所有部分都不超過時停止切割
+# resolution: 網格最長邊的體素數
+# max_hull_vertices: 每個凸包最多的頂點數
+convex_options = namedtuple("convex_options", ("max_hulls", "concavity", "resolution", "max_hull_vertices"),
+                            defaults=(8, 0.02, 40, 64))
+DEFAULT_OPTIONS = convex_options()
+
+# kind: 報告中顯示的名稱, hulls: [(vertices, faces)], volume: 凸包體積總和,
+# error: 凸包體積總和 / 網格體積 - 1, concavity: 最大的部分凹度
+convex_fit = namedtuple("convex_fit", ("kind", "hulls", "volume", "error", "concavity"))
+
+_SPLIT_POSITIONS = 7        # 每個軸嘗試的切割位置數
+_SPLIT_VERTICES = 32        # 評估切割時凸包的頂點數上限
+_HULL_DIRECTIONS = 128      # 凸包候選點 (各方向極值點) 的方向數
+_RAY_JITTER = (0.5 + 1.234e-4, 0.5 + 2.345e-4)   # 射線稍微偏離體素中心, 避免正好穿過網格的邊或頂點
+
+
+# ================== 凸包 ==================
+def _face_planes(points, faces):
+    a, b, c = (points[faces[:, i]] for i in range(3))
+    normals = np.cross(b - a, c - a)
+    normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-300)[:, None]
+    return normals, (normals * a).sum(axis=1)
+
+def convex_hull(points, max_vertices=None):
+    """
+    三維點集的凸包 (增量法: 每次加入離目前凸包最遠的點, 移除看得到它的面, 沿地平線補上新面)
+    max_vertices: 頂點數到達時停止, 得到以最遠點優先挑選頂點的內接凸包
+    回傳 (頂點 (V, 3), 面 (F, 3) 索引, 外法向右手定則); 點數不足或共面時回傳 None
+    """
+    points = np.unique(np.asarray(points, dtype=np.float64), axis=0)
+    if len(points) < 4:
+        return None
+    eps = 1e-9 * max(float(np.ptp(points, axis=0).max()), 1e-300)
+
+    # 初始四面體: 最遠的兩點、離其連線最遠的點、離其平面最遠的點
+    i0 = int(points[:, 0].argmin())
+    i1 = int(((points - points[i0]) ** 2).sum(axis=1).argmax())
+    line = points[i1] - points[i0]
+    i2 = int(np.linalg.norm(np.cross(points - points[i0], line), axis=1).argmax())
+    normal = np.cross(line, points[i2] - points[i0])
+    if np.linalg.norm(normal) <= eps * np.linalg.norm(line):
+        return None
+    heights = (points - points[i0]) @ normal / np.linalg.norm(normal)
+    i3 = int(np.abs(heights).argmax())
+    if abs(heights[i3]) <= eps:
+        return None
+    faces = np.array([(i0, i1, i2), (i0, i3, i1), (i1, i3, i2), (i2, i3, i0)])
+    if heights[i3] > 0:
+        faces = faces[:, ::-1]
+
+    candidates = np.setdiff1d(np.arange(len(points)), faces.ravel())
+    n = len(points)
+    vertices = 4
+    while len(candidates) and (max_vertices is None or vertices < max_vertices):
+        normals, offsets = _face_planes(points, faces)
+        distance = points[candidates] @ normals.T - offsets
+        farthest = distance.max(axis=1)
+        outside = farthest > eps
+        if not outside.any():
+            break
+        j = int(farthest.argmax())
+        visible = distance[j] > eps
+        apex = candidates[j]
+        # 地平線: 看得到的面的有向邊中, 反向邊不屬於看得到的面者
+        edges = faces[visible][:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+        horizon = edges[~np.isin(edges[:, 1] * n + edges[:, 0], edges[:, 0] * n + edges[:, 1])]
+        faces = np.vstack((faces[~visible], np.column_stack((horizon, np.full(len(horizon), apex)))))
+        keep = outside.copy()
+        keep[j] = False
+        candidates = candidates[keep]
+        vertices = len(np.unique(faces))
+
+    used, faces = np.unique(faces, return_inverse=True)
+    return points[used], faces.reshape(-1, 3)
+
+def hull_volume(vertices, faces):
+    """
+    外法向凸包的體積
+    """
+    a, b, c = (vertices[faces[:, i]] for i in range(3))
+    return float(np.einsum("ij,ij->", a, np.cross(b, c))) / 6.0
+
+def _reduced_hull(points, max_vertices, directions=_HULL_DIRECTIONS):
+    """
+    最多 max_vertices 個頂點的內接凸包, 候選為 directions 個方向的極值點
+    """
+    if len(points) < 4:
+        return None
+    return convex_hull(points[extreme_points(points, directions)], max_vertices)
+
+
+# ================== 體素化 ==================
+def _ray_hits(triangles, lo, pitch, shape, axis):
+    """
+    沿 axis 方向穿過每個體素欄中心 (稍微偏移) 的射線與三角形的交點
+    回傳 (欄位索引 (K, 2), 沿 axis 的交點座標 (K,)), 欄位索引為另外兩軸的體素索引
+    """
+    u, v = [a for a in range(3) if a != axis]
+    tu, tv, tw = triangles[:, :, u], triangles[:, :, v], triangles[:, :, axis]
+    # 每個三角形投影後涵蓋的欄位範圍
+    u0 = np.ceil((tu.min(axis=1) - lo[u]) / pitch - _RAY_JITTER[0]).astype(np.int64).clip(0, shape[u] - 1)
+    u1 = np.floor((tu.max(axis=1) - lo[u]) / pitch - _RAY_JITTER[0]).astype(np.int64).clip(-1, shape[u] - 1)
+    v0 = np.ceil((tv.min(axis=1) - lo[v]) / pitch - _RAY_JITTER[1]).astype(np.int64).clip(0, shape[v] - 1)
+    v1 = np.floor((tv.max(axis=1) - lo[v]) / pitch - _RAY_JITTER[1]).astype(np.int64).clip(-1, shape[v] - 1)
+    nu, nv = np.maximum(u1 - u0 + 1, 0), np.maximum(v1 - v0 + 1, 0)
+    counts = nu * nv
+    tri = np.repeat(np.arange(len(triangles)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    iu = u0[tri] + k // nv[tri]
+    iv = v0[tri] + k % nv[tri]
+    pu = lo[u] + (iu + _RAY_JITTER[0]) * pitch
+    pv = lo[v] + (iv + _RAY_JITTER[1]) * pitch
+
+    # 投影平面上的重心座標, 三個同號則射線穿過三角形
+    au, av = tu[tri], tv[tri]
+    w = np.empty((len(tri), 3))
+    for i in range(3):
+        j, m = (i + 1) % 3, (i + 2) % 3
+        w[:, i] = (au[:, j] - pu) * (av[:, m] - pv) - (au[:, m] - pu) * (av[:, j] - pv)
+    inside = (w >= 0).all(axis=1) | (w <= 0).all(axis=1)
+    total = w.sum(axis=1)
+    inside &= np.abs(total) > 1e-300
+    w, tri, total = w[inside], tri[inside], total[inside]
+    hits = (w * tw[tri]).sum(axis=1) / total
+    return np.column_stack((iu[inside], iv[inside])), hits
+
+def voxelize(vertices, faces, resolution):
+    """
+    封閉網格的體素化: 回傳 (原點, 體素邊長, 內部 (nx, ny, nz) bool, 表面取樣點 (P, 3))
+    內部為三個軸向射線中至少兩個判為內部 (奇數個交點在體素中心之前) 的體素,
+    其數量 x 體素體積即網格體積的不偏估計
+    """
+    lo = vertices.min(axis=0)
+    pitch = float(np.ptp(vertices, axis=0).max()) / resolution
+    shape = np.maximum(np.ceil(np.ptp(vertices, axis=0) / pitch).astype(np.int64), 1)
+    triangles = vertices[faces]
+    votes = np.zeros(shape, dtype=np.int8)
+    samples = [vertices]
+    for axis in range(3):
+        u, v = [a for a in range(3) if a != axis]
+        columns, hits = _ray_hits(triangles, lo, pitch, shape, axis)
+        # 交點在第 k 個體素中心之前 -> 第 k 個之後的體素穿越次數 +1
+        k = np.floor((hits - lo[axis]) / pitch - 0.5).astype(np.int64) + 1
+        crossings = np.zeros((shape[u], shape[v], shape[axis] + 1), dtype=np.int32)
+        np.add.at(crossings, (columns[:, 0], columns[:, 1], k.clip(0, shape[axis])), 1)
+        inside = (np.cumsum(crossings, axis=2)[:, :, :shape[axis]] % 2).astype(np.int8)
+        votes += np.moveaxis(inside, (0, 1, 2), (u, v, axis))
+        point = np.empty((len(hits), 3))
+        point[:, u] = lo[u] + (columns[:, 0] + _RAY_JITTER[0]) * pitch
+        point[:, v] = lo[v] + (columns[:, 1] + _RAY_JITTER[1]) * pitch
+        point[:, axis] = hits
+        samples.append(point)
+    return lo, pitch, votes >= 2, np.vstack(samples)
+
+
+# ================== 切割 ==================
+class _part:
+    """
+    分解中的一個部分: 內部體素的索引與凸包點 (表面點 + 切面點)
+    """
+    __slots__ = ("voxels", "points", "concavity")
+
+    def __init__(self, voxels, points):
+        self.voxels = voxels
+        self.points = points
+        self.concavity = 0.0
+
+    def evaluate(self, pitch, total_volume, max_vertices=_SPLIT_VERTICES):
+        hull = _reduced_hull(self.points, max_vertices)
+        solid = len(self.voxels) * pitch ** 3
+        self.concavity = max(hull_volume(*hull) - solid, 0.0) / total_volume if hull is not None else 0.0
+        return self.concavity
+
+    def split(self, lo, pitch, inside, axis, index):
+        """
+        以平面 x_axis = lo + index * pitch 切成兩個部分, 兩側都補上切面上的點
+        正好在平面上的表面點 (例如與平面重合的網格面) 分給平面旁有內部體素的一側
+        """
+        plane = lo[axis] + index * pitch
+        left = self.voxels[:, axis] < index
+        offset = self.points[:, axis] - plane
+        below, above = offset < 0, offset >= 0
+        on_plane = np.flatnonzero(np.abs(offset) <= 1e-6 * pitch)
+        if len(on_plane):
+            cell = np.floor((self.points[on_plane] - lo) / pitch).astype(np.int64).clip(0, np.array(inside.shape) - 1)
+            cell[:, axis] = max(index - 1, 0)
+            solid_below = inside[tuple(cell.T)]
+            cell[:, axis] = min(index, inside.shape[axis] - 1)
+            solid_above = inside[tuple(cell.T)]
+            # 兩側都沒有內部體素 (比體素薄的部分) 時維持依座標分配
+            either = solid_below | solid_above
+            below[on_plane[either]] = solid_below[either]
+            above[on_plane[either]] = solid_above[either]
+        parts = []
+        for side, points, layer in ((left, below, index - 1), (~left, above, index)):
+            face = lo + (self.voxels[side & (self.voxels[:, axis] == layer)] + 0.5) * pitch
+            face[:, axis] = plane
+            parts.append(_part(self.voxels[side], np.vstack((self.points[points], face))))
+        return parts
+
+def _try_split(part, lo, pitch, inside, total_volume, axis, index):
+    """
+    (兩側凹度總和, 左, 右, 軸, 位置), 有一側沒有體素時為 None
+    """
+    left, right = part.split(lo, pitch, inside, axis, index)
+    if not len(left.voxels) or not len(right.voxels):
+        return None
+    return (left.evaluate(pitch, total_volume) + right.evaluate(pitch, total_volume), left, right, axis, index)
+
+def _best_split(part, lo, pitch, inside, total_volume):
+    """
+    三個軸各取 _SPLIT_POSITIONS 個等距位置, 再在最佳位置兩側的間隔內逐格細找,
+    回傳兩側凹度總和最小的 (凹度總和, 左, 右, 軸, 位置)
+    """
+    best = None
+    steps = {}
+    for axis in range(3):
+        first, last = int(part.voxels[:, axis].min()), int(part.voxels[:, axis].max())
+        if last <= first:
+            continue
+        positions = np.unique(np.linspace(first + 1, last, _SPLIT_POSITIONS + 2)[1:-1].round().astype(np.int64))
+        steps[axis] = max((last - first) // (_SPLIT_POSITIONS + 1), 1)
+        for index in positions:
+            split = _try_split(part, lo, pitch, inside, total_volume, axis, int(index))
+            if split is not None and (best is None or split[0] < best[0]):
+                best = split
+    if best is None:
+        return None
+    axis, center = best[3], best[4]
+    for index in range(center - steps[axis] + 1, center + steps[axis]):
+        if index != center:
+            split = _try_split(part, lo, pitch, inside, total_volume, axis, index)
+            if split is not None and split[0] < best[0]:
+                best = split
+    return best
+
+def decompose(vertices, faces, options=DEFAULT_OPTIONS):
+    """
+    封閉網格的近似凸分解, 回傳 convex_fit; 網格未封閉或沒有體積時回傳 None
+    """
+    if not len(faces) or not is_closed(faces):
+        return None
+    total_volume = mesh_volume(vertices, faces)
+    if total_volume <= 0:
+        return None
+    lo, pitch, inside, samples = voxelize(vertices, faces, options.resolution)
+    root = _part(np.argwhere(inside), samples)
+    root.evaluate(pitch, total_volume)
+
+    # 每次切割凹度最大的部分 (heap 以負凹度排序, 序號避免比較 _part)
+    heap = [(-root.concavity, 0, root)]
+    serial = 1
+    while len(heap) < options.max_hulls and -heap[0][0] > options.concavity:
+        _, _, part = heapq.heappop(heap)
+        split = _best_split(part, lo, pitch, inside, total_volume)
+        if split is None:
+            heapq.heappush(heap, (0.0, serial, part))
+            serial += 1
+            continue
+        for child in split[1:3]:
+            heapq.heappush(heap, (-child.concavity, serial, child))
+            serial += 1
+
+    hulls = []
+    for _, _, part in sorted(heap, key=lambda item: item[1]):
+        hull = _reduced_hull(part.points, options.max_hull_vertices, max(_HULL_DIRECTIONS, options.max_hull_vertices))
+        if hull is not None:
+            hulls.append(hull)
+    if not hulls:
+        return None
+    volume = sum(hull_volume(*hull) for hull in hulls)
+    concavity = max(-item[0] for item in heap)
+    return convex_fit(f"Group ({len(hulls)} 凸包)", hulls, volume, volume / total_volume - 1.0, concavity)
+
+def _pack(fit):
+    """
+    convex_fit -> 可序列化的陣列 (行程池回傳與 ifs_cache 儲存)
+    """
+    vertices = np.vstack([hull[0] for hull in fit.hulls])
+    faces = np.vstack([hull[1] for hull in fit.hulls]).astype(np.int32)
+    counts = np.array([(len(hull[0]), len(hull[1])) for hull in fit.hulls], dtype=np.int64)
+    stats = np.array((fit.volume, fit.error, fit.concavity))
+    return vertices, faces, counts, stats
+
+def _unpack(items):
+    vertices, faces, counts, stats = items
+    v_end, f_end = np.cumsum(counts[:, 0]), np.cumsum(counts[:, 1])
+    hulls = [(vertices[v - nv:v], faces[f - nf:f].astype(np.int64))
+             for (nv, nf), v, f in zip(counts, v_end, f_end)]
+    return convex_fit(f"Group ({len(hulls)} 凸包)", hulls, *(float(x) for x in stats))
+
+def decompose_stl(stl_path, options=DEFAULT_OPTIONS):
+    """
+    讀取並分解一個 STL, 回傳 _pack() 的陣列, 失敗為 None (在行程池中執行)
+    """
+    try:
+        vertices, faces = read_stl(stl_path)
+        fit = decompose(vertices, faces, options)
+    except Exception as e:
+        print(f"❌ 凸分解失敗 {os.path.basename(stl_path)}: {e}")
+        return None
+    if fit is None:
+        print(f"⚠️  {os.path.basename(stl_path)}: 網格未封閉或沒有體積, 無法凸分解")
+        return None
+    return _pack(fit)
+
+def _cache_params(options):
+    return ("convex", tuple(options))
+
+def decompose_stl_files(stl_paths, workers=None, cache=None, options=DEFAULT_OPTIONS):
+    """
+    以行程池分解多個 STL (重複的路徑只分解一次), 回傳 {路徑: convex_fit, 失敗為 None}
+    cache: 選用的 ifs_cache, 以 STL 內容雜湊與 options 為鍵
+    """
+    convert = functools.partial(decompose_stl, options=options)
+    if cache is None:
+        packed = map_stl_files(convert, stl_paths, workers)
+    else:
+        params = _cache_params(options)
+        packed = map_stl_files(convert, stl_paths, workers,
+                               lambda path: cache.get_arrays(path, params),
+                               lambda path, items: cache.put_arrays(path, params, items))
+    return {path: _unpack(items) if items is not None else None for path, items in packed.items()}
+
+
+# ================== proto 改寫 ==================
+def hull_group_node(fit, name="boundingObject", point_format=POINT_FORMAT):
+    """
+    凸包的 Group 節點: name 為 "boundingObject" 時為 "boundingObject Group {",
+    為 None 時為 children 中的 "Group {"
+    """
+    if name is None:
+        node = proto.Node(name="Group", parent=None, DEF="{")
+    else:
+        node = proto.Node(name=name, parent=None, DEF="Group {")
+    children = proto.container(name="children", parent=node, DEF="[", stage=1)
+    for vertices, faces in fit.hulls:
+        children.add_child(ifs_node(vertices, faces, name="IndexedFaceSet", DEF="{", parent=children, stage=2,
+                                    point_format=point_format))
+    node.add_child(children)
+    return node
+
+def decompose_bounding_objects(robot, proto_dir, options=DEFAULT_OPTIONS, workers=None, cache=None):
+    """
+    把每個 boundingObject 指向的 STL 換成凸包的 Group (同一個 STL 只分解一次)
+    無法分解或 DEF 被其他 USE 引用的位置保留網格; 回傳 collision_report 列表
+    """
+    sites = bounding_sites(robot, proto_dir)
+    paths = [path for _, _, path in sites if os.path.exists(path)]
+    fits = decompose_stl_files(paths, workers, cache, options) if paths else {}
+    report = []
+    with robot.transaction() as tx:
+        for bo, site, path in sites:
+            fit = fits.get(path)
+            replaced = False
+            if not os.path.exists(path):
+                note = "找不到檔案"
+            elif fit is None:
+                note = "無法凸分解"
+            elif def_is_used(robot, site):
+                note = "DEF 被其他 USE 引用"
+            else:
+                tx.replace(site, hull_group_node(fit, "boundingObject" if site is bo else None))
+                replaced = True
+                note = None
+            report.append(collision_report(link_name(bo), path, fit, replaced, note))
+    return report
+
+def process_proto_file(proto_file_path, output_path=None, options=DEFAULT_OPTIONS, workers=None, cache=None,
+                       ifs_cache=None):
+    """
+    讀取 proto, 以凸分解取代 boundingObject 的 STL 網格並寫入 output_path
+    (預設為同目錄下的 "copy_" + 檔名), 回傳輸出路徑
+    cache: 選用的 proto_cache, ifs_cache: 選用的分解結果快取
+    """
+    proto_file_path = os.path.abspath(proto_file_path)
+    if output_path is None:
+        output_path = os.path.join(os.path.dirname(proto_file_path), "copy_" + os.path.basename(proto_file_path))
+    robot = proto.proto_robot(proto_filename=proto_file_path, cache=cache)
+    report = decompose_bounding_objects(robot, os.path.dirname(proto_file_path), options, workers, ifs_cache)
+    print_collision_report(report, "凸包組合")
+    if robot.search_first("PROTO") is None:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            robot.write(f)
+    else:
+        robot.save_robot(output_path)
+    print(f"✅ 已寫入: {output_path}")
+    return output_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="以凸包的 Group 取代 boundingObject 的 STL 網格")
+    parser.add_argument("proto", help="proto 檔案")
+    parser.add_argument("max_hulls", nargs="?", type=int, default=DEFAULT_OPTIONS.max_hulls, help="每個網格最多的凸包數")
+    parser.add_argument("--concavity", type=float, default=DEFAULT_OPTIONS.concavity, help="凹度門檻 (相對於網格體積)")
+    parser.add_argument("--resolution", type=int, default=DEFAULT_OPTIONS.resolution, help="網格最長邊的體素數")
+    parser.add_argument("--max-hull-vertices", type=int, default=DEFAULT_OPTIONS.max_hull_vertices,
+                        help="每個凸包最多的頂點數")
+    parser.add_argument("--workers", type=int, help="行程數 (預設為 CPU 核心數)")
+    parser.add_argument("--output", help="輸出路徑 (預設 copy_<檔名>)")
+    args = parser.parse_args()
+    options = convex_options(args.max_hulls, args.concavity, args.resolution, args.max_hull_vertices)
+    process_proto_file(args.proto, args.output, options, args.workers)
+    sys.exit(0)
@@ -1,12 +1,14 @@
 import sys
 import os
 from urdf_converter.core.convert_collision_to_ifs import stl_to_ifs_str
+from urdf_converter.core.ifs_cache import ifs_cache
 
-def export_single_stl_to_ifs(stl_path, output_path=None):
+def export_single_stl_to_ifs(stl_path, output_path=None, cache=None, options=None):
     print(f"🔵 正在處理 STL: {stl_path}")
     
-    # 呼叫既有的 stl_to_ifs_str 函數
-    ifs_text = stl_to_ifs_str(stl_path)
+    # 呼叫既有的 stl_to_ifs_str 函數 (有快取且 STL 未變更時不讀取網格)
+    # options: 選用的 ifs_options (量化、焊接、精簡數字)
+    ifs_text = stl_to_ifs_str(stl_path, cache=cache, options=options)
     
     if not ifs_text:
         print("❌ 轉換失敗或檔案不存在")
@@ -35,4 +37,5 @@ if __name__ == "__main__":
             sys.exit(1)
         output_txt = None
     
-    export_single_stl_to_ifs(input_stl, output_txt)
+    # 選用的 IFS 快取 (設定 URDF_CONVERTER_IFS_CACHE 才會啟用)
+    export_single_stl_to_ifs(input_stl, output_txt, cache=ifs_cache.from_env())
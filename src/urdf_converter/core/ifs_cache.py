@@ -0,0 +1,175 @@
+"""
+Persistent cache of generated IndexedFaceSet text.
+
+An entry holds the IFS text of one STL, or its merged vertex / face arrays and
+point row format for the tree rewrite of process_proto_file (or any other tuple of
+arrays computed from it, e.g. its convex decomposition), keyed by the blake2b
+of the STL content plus the conversion parameters (indent, number formats, vertex
+merging, quantization / weld options), so a copied or renamed STL still hits and
+an edited one misses. To avoid even reading unchanged STLs, the content digest of
+every path is remembered together with the file size and mtime. The cache directory is bounded in size, the least
+recently used entries are evicted first.
+
+The cache is opt-in:
+    cache = ifs_cache("~/.cache/urdf_converter/ifs")
+    text = stl_to_ifs_str("link1.STL", cache=cache)
+    print(cache.stats())
+
+or set URDF_CONVERTER_IFS_CACHE to a directory and use ifs_cache.from_env().
+"""
+import os
+import time
+import marshal
+import hashlib
+import numpy as np
+
+from urdf_converter.core.proto_cache import file_digest
+
+CACHE_ENV = "URDF_CONVERTER_IFS_CACHE"
+
+_TEXT_SUFFIX = ".ifs"       # IFS text (utf-8) or marshalled arrays, named by content digest + parameters
+_STAT_SUFFIX = ".stat"      # {"path", "size", "mtime_ns", "digest"} of an STL, named by its path
+
+
+class ifs_cache:
+    def __init__(self, cache_dir, max_bytes = 1024 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: directory holding the entries (created if missing)
+            max_bytes: total size of the entries kept, least recently used are evicted
+        """
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds = 0.0     # time spent reading cached entries
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Cache in $URDF_CONVERTER_IFS_CACHE, None if the variable is not set"""
+        cache_dir = os.environ.get(CACHE_ENV)
+        return cls(cache_dir) if cache_dir else None
+
+    def _stat_path(self, stl_path):
+        key = hashlib.blake2b(os.path.abspath(stl_path).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, key + _STAT_SUFFIX)
+
+    def content_digest(self, stl_path):
+        """blake2b of the STL content, only read again when its size or mtime changed"""
+        st = os.stat(stl_path)
+        memo = self._stat_path(stl_path)
+        try:
+            with open(memo, 'rb') as f:
+                meta = marshal.loads(f.read())
+            if (meta["path"], meta["size"], meta["mtime_ns"]) == (os.path.abspath(stl_path), st.st_size, st.st_mtime_ns):
+                return meta["digest"]
+        except (OSError, ValueError, TypeError, EOFError, KeyError):
+            pass
+        meta = {
+            "path": os.path.abspath(stl_path),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "digest": file_digest(stl_path),
+        }
+        self._write(memo, marshal.dumps(meta))
+        return meta["digest"]
+
+    def _entry_path(self, stl_path, params):
+        key = hashlib.blake2b(f"{self.content_digest(stl_path)}\n{params!r}".encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, key + _TEXT_SUFFIX)
+
+    def _load(self, stl_path, params, decode):
+        start = time.perf_counter()
+        try:
+            entry = self._entry_path(stl_path, params)
+            with open(entry, 'rb') as f:
+                value = decode(f.read())
+        except (OSError, ValueError, TypeError, EOFError):
+            self.misses += 1
+            return None
+        os.utime(entry)     # entry mtime = last use, for the LRU eviction
+        self.hits += 1
+        self.load_seconds += time.perf_counter() - start
+        return value
+
+    def _store(self, stl_path, params, data):
+        try:
+            self._write(self._entry_path(stl_path, params), data)
+        except OSError as e:
+            print(f"⚠️  無法寫入 IFS 快取: {e}")
+            return False
+        self.evict()
+        return True
+
+    def get(self, stl_path, params):
+        """Cached IFS text of stl_path converted with params, None on a miss"""
+        return self._load(stl_path, params, lambda data: data.decode('utf-8'))
+
+    def put(self, stl_path, params, text):
+        """Store the IFS text of stl_path converted with params, returns False if it could not be cached"""
+        return self._store(stl_path, params, text.encode('utf-8'))
+
+    def get_arrays(self, stl_path, params):
+        """Cached tuple of arrays / strings computed from stl_path with params, None on a miss"""
+        def decode(data):
+            items = marshal.loads(data)
+            return tuple(np.frombuffer(item[2], dtype=item[0]).reshape(item[1]) if isinstance(item, tuple) else item
+                         for item in items)
+        return self._load(stl_path, params, decode)
+
+    def put_arrays(self, stl_path, params, items):
+        """Store a tuple of arrays / strings computed from stl_path with params"""
+        items = tuple((a.dtype.str, a.shape, a.tobytes()) if isinstance(a, np.ndarray) else a for a in items)
+        return self._store(stl_path, params, marshal.dumps(items))
+
+    def get_mesh(self, stl_path, params):
+        """Cached (vertices, faces, point_format) of stl_path loaded with params, None on a miss"""
+        return self.get_arrays(stl_path, params)
+
+    def put_mesh(self, stl_path, params, vertices, faces, point_format):
+        """Store the (vertices, faces) arrays of stl_path loaded with params and their row format"""
+        return self.put_arrays(stl_path, params, (vertices, faces, point_format))
+
+    def _write(self, path, data):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _entries(self):
+        return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                if name.endswith((_TEXT_SUFFIX, _STAT_SUFFIX))]
+
+    def evict(self):
+        """Drop the least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for path in self._entries():
+            st = os.stat(path)
+            entries.append((st.st_mtime_ns, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.evictions += 1
+
+    def invalidate(self):
+        """Forget every entry"""
+        for path in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "load_seconds": self.load_seconds,
+        }
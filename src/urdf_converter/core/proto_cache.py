@@ -0,0 +1,310 @@
+"""
+Persistent parse cache for proto files.
+
+A parsed proto_robot tree is stored on disk as a compact binary snapshot
+(the open / close / property-run operations that rebuild it, packed
+with marshal) keyed by the absolute path of the
+proto file. An entry is reused when the file size and mtime are unchanged, or
+when they changed but the content hash is still the same (e.g. after a copy
+or a touch). The snapshot keeps the source spans of the structures: on a hit
+the file text is read again (without parsing it), so the restored tree writes
+its unmodified parts back verbatim, exactly like a freshly parsed one. The cache directory is bounded in size, the least recently used
+snapshots are evicted first.
+
+The cache is opt-in:
+    cache = proto_cache("~/.cache/urdf_converter/proto")
+    robot = proto_robot(proto_filename="robot.proto", cache=cache)
+    print(cache.stats())
+
+or set URDF_CONVERTER_PROTO_CACHE to a directory and use proto_cache.from_env().
+"""
+import os
+import gc
+import time
+import struct
+import marshal
+import hashlib
+import numpy as np
+
+from urdf_converter.core import proto_parser as proto
+
+CACHE_ENV = "URDF_CONVERTER_PROTO_CACHE"
+
+_MAGIC = b"PRC3"
+_HEADER = struct.Struct("<4sI")     # magic, length of the metadata block
+_SUFFIX = ".snap"
+
+# snapshot operations, replayed in order to rebuild the tree
+_RUN = 0            # (_RUN, stage, "\n".join(names), "\n".join(contents)): consecutive leaf properties
+_OPEN = 1           # (_OPEN, class index, name, DEF, stage, span): open a Node / container
+_CLOSE = 2          # (_CLOSE,)
+_ONE_PROPERTY = 3   # (_ONE_PROPERTY, name, content, DEF, stage): property that cannot go in a run
+_ARRAY = 4          # (_ARRAY, name, DEF, stage, row_format, dtype, shape, raw bytes, span): array_field
+# span: (start, end) of the structure in the file text, None if it has to be formatted again
+_CLASSES = (proto.Node, proto.container)
+_CLOSE_MARK = object()
+
+def file_digest(path):
+    """blake2b of the file content"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def snapshot(robot):
+    """
+    Flatten a proto_robot into a marshal-able tuple (header, operations, whole),
+    whole is True if the robot is still the unmodified text of its file.
+    Runs of leaf properties are stored as two newline-joined strings, which
+    marshal and split() handle at memcpy speed.
+    Returns None if the tree holds structures the snapshot does not know.
+    """
+    source = robot._src[0] if robot._src is not None else None
+
+    def span(node):
+        src = getattr(node, "_src", None)
+        if src is None or source is None or src[0] is not source:
+            return None
+        return (src[1], src[2])
+
+    ops = []
+    names = []
+    contents = []
+    run_stage = None
+
+    def flush():
+        if names:
+            ops.append((_RUN, run_stage, "\n".join(names), "\n".join(contents)))
+            names.clear()
+            contents.clear()
+
+    stack = list(reversed(robot.children))
+    while stack:
+        node = stack.pop()
+        if node is _CLOSE_MARK:
+            flush()
+            ops.append((_CLOSE,))
+        elif node.__class__ is proto.property:
+            if node.children:
+                return None
+            if node.DEF is None and "\n" not in node.name and "\n" not in node.content:
+                if node.stage != run_stage:
+                    flush()
+                    run_stage = node.stage
+                names.append(node.name)
+                contents.append(node.content)
+            else:
+                flush()
+                ops.append((_ONE_PROPERTY, node.name, node.content, node.DEF, node.stage))
+        elif node.__class__ is proto.array_field:
+            flush()
+            values = node.values
+            ops.append((_ARRAY, node.name, node.DEF, node.stage, node.row_format, values.dtype.str, values.shape, values.tobytes(), span(node)))
+        elif node.__class__ in _CLASSES:
+            flush()
+            ops.append((_OPEN, _CLASSES.index(node.__class__), node.name, node.DEF, node.stage, span(node)))
+            stack.append(_CLOSE_MARK)
+            stack.extend(reversed(node.children))
+        else:
+            return None
+    flush()
+    return (robot.header, ops, source is not None)
+
+
+def restore(robot, data, text = None):
+    """
+    Rebuild the tree of robot from a snapshot() tuple. text: content of the file
+    the snapshot was taken from, gives back the source spans (written verbatim);
+    without it every structure is formatted again when written
+    """
+    header, ops, whole = data
+    robot.header = header
+    robot.children = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()    # see proto_robot.read_proto_string
+    try:
+        _replay(robot, ops, text)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    robot.set_current(robot)
+    robot.invalidate_index()
+    robot._digest = None
+    robot._src = (text, 0, len(text)) if whole and text is not None else None
+
+
+def _replay(robot, ops, text):
+    new = object.__new__
+    property = proto.property
+    no_children = proto._NO_CHILDREN
+    cursor = robot
+    for op in ops:
+        kind = op[0]
+        if kind == _RUN:
+            stage = op[1]
+            append = cursor.children.append
+            for name, content in zip(op[2].split("\n"), op[3].split("\n")):
+                p = new(property)
+                p.name = name
+                p.stage = stage
+                p.parent = cursor
+                p.children = no_children
+                p.DEF = None
+                p.content = content
+                append(p)
+        elif kind == _OPEN:
+            node = new(_CLASSES[op[1]])
+            node.name = op[2]
+            node.DEF = op[3]
+            node.stage = op[4]
+            node.parent = cursor
+            node.children = []
+            node._src = (text, *op[5]) if op[5] is not None and text is not None else None
+            cursor.children.append(node)
+            cursor = node
+        elif kind == _CLOSE:
+            cursor = cursor.parent
+        elif kind == _ARRAY:
+            values = np.frombuffer(op[7], dtype=op[5]).reshape(op[6]).copy()
+            field = proto.array_field(name = op[1], parent = cursor, DEF = op[2], stage = op[3], values = values, row_format = op[4])
+            field._src = (text, *op[8]) if op[8] is not None and text is not None else None
+            cursor.children.append(field)
+        else:   # _ONE_PROPERTY
+            cursor.children.append(property(name = op[1], parent = cursor, content = op[2], stage = op[4]))
+            cursor.children[-1].DEF = op[3]
+
+
+class proto_cache:
+    def __init__(self, cache_dir, max_bytes = 512 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: directory holding the snapshots (created if missing)
+            max_bytes: total size of the snapshots kept, least recently used are evicted
+        """
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds = 0.0     # time spent loading snapshots
+        self.saved_seconds = 0.0    # parse time avoided by the hits, minus their load time
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Cache in $URDF_CONVERTER_PROTO_CACHE, None if the variable is not set"""
+        cache_dir = os.environ.get(CACHE_ENV)
+        return cls(cache_dir) if cache_dir else None
+
+    def _entry_path(self, proto_filename):
+        key = hashlib.blake2b(os.path.abspath(proto_filename).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, key + _SUFFIX)
+
+    def _read_meta(self, f):
+        magic, length = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError("not a proto snapshot")
+        return marshal.loads(f.read(length))
+
+    def load(self, robot, proto_filename):
+        """Fill robot from the snapshot of proto_filename, returns False on a miss"""
+        start = time.perf_counter()
+        entry = self._entry_path(proto_filename)
+        try:
+            st = os.stat(proto_filename)
+            with open(entry, 'rb') as f:
+                meta = self._read_meta(f)
+                if meta["path"] != os.path.abspath(proto_filename) or meta["size"] != st.st_size:
+                    raise LookupError
+                payload = f.read()
+            if meta["mtime_ns"] != st.st_mtime_ns:
+                # touched or copied: still valid if the content is the same
+                if meta["digest"] != file_digest(proto_filename):
+                    raise LookupError
+                meta["mtime_ns"] = st.st_mtime_ns
+                self._write_entry(entry, meta, payload)
+            data = marshal.loads(payload)
+            # the spans of the snapshot point into the file text (read as read_proto_file does)
+            with open(proto_filename, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (OSError, ValueError, TypeError, EOFError, LookupError, struct.error):
+            self.misses += 1
+            return False
+        restore(robot, data, text)
+        os.utime(entry)     # entry mtime = last use, for the LRU eviction
+        elapsed = time.perf_counter() - start
+        self.hits += 1
+        self.load_seconds += elapsed
+        self.saved_seconds += max(meta["parse_seconds"] - elapsed, 0.0)
+        return True
+
+    def _write_entry(self, entry, meta, payload):
+        meta_bytes = marshal.dumps(meta)
+        tmp = entry + ".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, len(meta_bytes)))
+            f.write(meta_bytes)
+            f.write(payload)
+        os.replace(tmp, entry)
+
+    def store(self, robot, proto_filename, parse_seconds = 0.0):
+        """Save the snapshot of a freshly parsed robot, returns False if it could not be cached"""
+        data = snapshot(robot)
+        if data is None:
+            return False
+        st = os.stat(proto_filename)
+        meta = {
+            "path": os.path.abspath(proto_filename),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "digest": file_digest(proto_filename),
+            "parse_seconds": parse_seconds,
+        }
+        try:
+            self._write_entry(self._entry_path(proto_filename), meta, marshal.dumps(data))
+        except OSError as e:
+            print(f"⚠️  無法寫入 proto 快取: {e}")
+            return False
+        self.evict()
+        return True
+
+    def evict(self):
+        """Drop the least recently used snapshots until the cache fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(_SUFFIX):
+                path = os.path.join(self.cache_dir, name)
+                st = os.stat(path)
+                entries.append((st.st_mtime_ns, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.evictions += 1
+
+    def invalidate(self, proto_filename = None):
+        """Forget the snapshot of proto_filename, or every snapshot if no file is given"""
+        if proto_filename is not None:
+            paths = [self._entry_path(proto_filename)]
+        else:
+            paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(_SUFFIX)]
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "load_seconds": self.load_seconds,
+            "saved_seconds": self.saved_seconds,
+        }
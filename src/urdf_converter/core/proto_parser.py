@@ -11,15 +11,31 @@ Functions:
     proto_robot.__init__: Initializes the proto_robot object.
     proto_robot.add_child: Adds a child to the current node.
     proto_robot.set_current: Sets the current node.
+    proto_robot.transaction: Batched set / replace / insert / delete edits, applied in one pass.
     proto_robot.read_proto_file: Reads a proto file and builds the robot structure.
+    proto_robot.read_proto_string: Builds the robot structure from the text of a proto file.
+    proto_robot.read_proto_lazy / load_all: Memory-mapped lazy reading, nodes are parsed on first access.
     proto_robot.search: Searches the robot structure with the given name.
+    proto_robot.search_first: Returns the first structure with the given name.
+    proto_robot.iter_nodes / iter_search: Lazy, non-recursive traversal with filter, depth limit and pre/post order.
+    proto_robot.find_by_name / find_by_type / find_by_def: Indexed lookups by field name, node type and DEF identifier.
+    proto_robot.select / select_first / iter_select: Path selector queries, see compile_selector().
+    proto_robot.invalidate_index: Drops the search index after direct edits.
+    proto_robot.digest / invalidate_hashes, diff: Cached Merkle subtree digests and structural diff of two trees.
+    structure.mark_modified: Marks a structure edited in place, see proto_robot.write.
+    proto_robot.resolve / resolve_use / find_uses / rename_def: DEF / USE symbol table.
+    proto_robot.remove_child / structure.remove_child: Removes a child and its subtree.
     proto_robot.save_robot: Saves the robot structure to a file.
+    proto_robot.write: Streams the robot structure to a file handle.
     proto_robot.__str__: Returns the string representation of the robot structure.
     proto_robot.__repr__: Returns the string representation of the robot structure.
     proto_robot.__dict__: Returns the dictionary representation of the robot structure.
     structure.__init__: Initializes the structure object.
     structure.add_child: Adds a child to the structure.
+    structure.replace_child: Replaces a direct child of the structure.
     structure.search: Searches the structure with the given name.
+    structure.search_first / iter_nodes / iter_search / select*: Same as proto_robot, on the subtree.
+    structure.write: Streams the structure to a file handle.
     structure.__str__: Returns the string representation of the structure.
     structure.__repr__: Returns the string representation of the structure.
     Node.__init__: Initializes the Node object.
@@ -34,6 +50,8 @@ Functions:
     container.get_self_only: Returns the string representation of the container itself.
     container.__str__: Returns the string representation of the container.
     container.__dict__: Returns the dictionary representation of the container.
+    array_field: Numeric field (point, coordIndex, ...) stored as one NumPy array.
+    LazyNode / lazy_container: Node / container whose children are parsed from the file on first access.
 Usage:
     The script can be run as a standalone program to open a proto file, parse it, and save the modified robot structure.
 """
@@ -41,77 +59,1451 @@ from tkinter import Tk     # from tkinter import Tk for Python 3.x
 from tkinter.filedialog import askopenfilename
 from tkinter.filedialog import asksaveasfilename
 import os
+import io
 import json
+import gc
+import time
+import contextlib
+import mmap
+import array
+import bisect
+import builtins
+import functools
+import warnings
+import hashlib
+import difflib
+import itertools
+import weakref
+import collections
+import numpy as np
+
+# ================== Tokenizer ==================
+# events produced by _tokenize()
+_LINES = 0              # (_LINES, start, end): block of plain property lines buf[start:end]
+_PROPERTY = 1           # (_PROPERTY, name, content)
+_OPEN_NODE = 2          # (_OPEN_NODE, name, DEF, line start or -1)
+_OPEN_CONTAINER = 3     # (_OPEN_CONTAINER, name, DEF, line start or -1)
+_CLOSE = 4              # (_CLOSE, end of line or -1)
+_HEADER = 5             # (_HEADER, comment line)
+_ARRAY = 6              # (_ARRAY, name, DEF, start, end, line start, end of line): numeric field whose rows are buf[start:end]
+# line start: offset of the line of an opening bracket when nothing precedes the
+# structure on that line, end of line: offset after the "\n" of a closing bracket
+# that ends its line; the source span of a structure lies between the two
+
+# characters that need the token level scanner, every other line is a plain property
+_SPECIAL_CHARS = '{}[]#"'
+# one token inside a line: whitespace, string, comment, bracket or a bare word
+_TOKEN_RE = re.compile(r'[ \t\r\f\v]+|"(?:[^"\\\n]|\\.)*"?|#.*|[{}\[\]]|[^\s{}\[\]#"]+')
+# rest of a "[ ... ]" value that is closed on the same line, e.g. "centerOfMass [ 0 0 0 ]"
+_INLINE_LIST_RE = re.compile(r'(?:[^\[\]{}"#\n]|"(?:[^"\\\n]|\\.)*")*\]')
+
+def _tokenize(buf, pos = 0, n = None):
+    """
+    Scan the proto text buf[pos:n] in a single pass and yield structure events.
+    Runs of lines without any of '{}[]#"' are reported as one _LINES block,
+    the other lines are split into tokens so that several nodes, properties
+    and closing brackets may share a line (e.g. "Shape { ... }").
+    """
+    if n is None:
+        n = len(buf)
+    find = buf.find
+    # next position of every special character (str.find is a plain memchr,
+    # far cheaper than a regex character class over the whole buffer)
+    next_special = [find(c, pos, n) for c in _SPECIAL_CHARS]
+    next_special = [i if i >= 0 else n for i in next_special]
+    while pos < n:
+        special = min(next_special)
+        if special >= n:
+            yield (_LINES, pos, n - 1 if buf[n - 1] == "\n" else n)
+            return
+        line_start = buf.rfind("\n", pos, special) + 1 or pos
+        if line_start > pos:
+            yield (_LINES, pos, line_start - 1)
+        line_end = find("\n", special, n)
+        if line_end < 0:
+            line_end = n
+        yield from _tokenize_line(buf, line_start, line_end)
+        pos = line_end + 1
+        for k, i in enumerate(next_special):
+            if i < pos:
+                i = find(_SPECIAL_CHARS[k], pos, n)
+                next_special[k] = i if i >= 0 else n
+
+def _tokenize_line(buf, pos, end, at_line_start = True):
+    match = _TOKEN_RE.match
+    stmt = -1   # start of the pending statement
+    # line start reported with the opening brackets, -1 once another event was on the line
+    line_start = pos if at_line_start else -1
+    while pos < end:
+        tok = match(buf, pos, end)
+        pos = tok.end()
+        c = buf[tok.start()]
+        if c in " \t\r\f\v":
+            continue
+        if c == "#":
+            if stmt < 0:
+                yield (_HEADER, buf[tok.start():end].strip())
+            break   # the comment runs to the end of line (kept in the property content)
+        if c == "[":
+            inline = _INLINE_LIST_RE.match(buf, pos, end)
+            if inline:
+                # value list closed on the same line -> part of a property
+                if stmt < 0:
+                    stmt = tok.start()
+                pos = inline.end()
+                continue
+        if c == "{" or c == "[":
+            name, _, rest = (buf[stmt:tok.start()] if stmt >= 0 else "").partition(" ")
+            DEF = rest + c
+            # keep a trailing comment on the opening line with the DEF
+            tail = buf[pos:end].strip()
+            if tail.startswith("#"):
+                DEF += " " + tail
+                pos = end
+            if c == "{":
+                yield (_OPEN_NODE, name, DEF if stmt >= 0 else None, line_start)
+            else:
+                yield (_OPEN_CONTAINER, name, DEF, line_start)
+            stmt = -1
+            line_start = -1
+        elif c == "}" or c == "]":
+            if stmt >= 0:
+                name, _, content = buf[stmt:tok.start()].strip().partition(" ")
+                yield (_PROPERTY, name, content)
+                stmt = -1
+            line_start = -1
+            yield (_CLOSE, end + 1 if end < len(buf) and buf[end] == "\n" and not buf[pos:end].strip() else -1)
+        elif stmt < 0:
+            stmt = tok.start()
+    if stmt >= 0:
+        name, _, content = buf[stmt:end].strip().partition(" ")
+        yield (_PROPERTY, name, content)
+
+# ================== Array fields ==================
+# multi-value numeric fields stored as one NumPy array instead of one property per line
+_ARRAY_FIELDS = {
+    "point": np.float64,            # Coordinate / TextureCoordinate
+    "vector": np.float64,           # Normal
+    "color": np.float64,            # Color
+    "coordIndex": np.int32,
+    "normalIndex": np.int32,
+    "texCoordIndex": np.int32,
+    "colorIndex": np.int32,
+}
+_ARRAY_CHUNK_ROWS = 65536   # rows formatted per % operation
+
+def _fold_arrays(events):
+    """
+    Replace (_OPEN_CONTAINER of an _ARRAY_FIELDS name, _LINES, _CLOSE) by a single
+    (_ARRAY, name, DEF, start, end, line start, end of line) event, every other event passes through.
+    """
+    held = []
+    for event in events:
+        kind = event[0]
+        if held:
+            if len(held) == 1 and kind == _LINES:
+                held.append(event)
+                continue
+            if len(held) == 2 and kind == _CLOSE:
+                yield (_ARRAY, held[0][1], held[0][2], held[1][1], held[1][2], held[0][3], event[1])
+                held = []
+                continue
+            yield from held
+            held = []
+        if kind == _OPEN_CONTAINER and event[1] in _ARRAY_FIELDS:
+            held.append(event)
+        else:
+            yield event
+    yield from held
+
+def _float_format(first_row, values):
+    # "%.<n>f" when the first row has a fixed number of decimals (e.g. the "%.4f" of
+    # stl_to_ifs_str) that no value exceeds, otherwise the shortest exact "%.15g"
+    decimals = {len(token.partition(".")[2]) if "." in token else -1 for token in first_row.replace(",", " ").split()}
+    if len(decimals) == 1 and "e" not in first_row.lower():
+        d = decimals.pop()
+        if d > 0 and np.array_equal(np.round(values, d), values, equal_nan=True):
+            return f"%.{d}f"
+    return "%.15g"
+
+def _parse_array(name, text):
+    """
+    Vectorised parse of the body of a numeric field, one row per line, e.g.
+    "0.1 0.2 0.3" or "0, 1, 2, -1".
+    Returns (values of shape (rows, columns), row format) or None if the body is
+    not a table of numbers.
+    """
+    dtype = _ARRAY_FIELDS[name]
+    first = text.strip().split("\n", 1)[0].strip()
+    columns = len(first.replace(",", " ").split())
+    if not columns:
+        return None
+    try:
+        with warnings.catch_warnings():
+            # older NumPy only warns and returns the numbers read so far
+            warnings.simplefilter("error", DeprecationWarning)
+            values = np.fromstring(text.replace(",", " "), dtype=dtype, sep=" ")
+    except (ValueError, DeprecationWarning):
+        return None
+    if values.size % columns:
+        return None
+    values = values.reshape(-1, columns)
+    # keep the separators of the first row
+    sep = ", " if ", " in first else ("," if "," in first.rstrip(",") else " ")
+    end = "," if first.endswith(",") else ""
+    number = "%d" if dtype is np.int32 else _float_format(first, values[0])
+    return values, sep.join([number] * columns) + end
+
+def _iter_format_rows(values, row_format, tab):
+    # one "%" operation per chunk of rows formats the whole block in C
+    line = tab + row_format + "\n"
+    rows = values.reshape(len(values), -1)
+    for start in range(0, len(rows), _ARRAY_CHUNK_ROWS):
+        block = rows[start:start + _ARRAY_CHUNK_ROWS]
+        yield (line * len(block)) % tuple(block.ravel().tolist())
+
+def _format_rows(values, row_format, tab):
+    return "".join(_iter_format_rows(values, row_format, tab))
+
+# ================== Search Index ==================
+def _node_keys(node):
+    """
+    Return (node type, DEF identifier) of a Node, e.g.
+        "geometry DEF base_link Mesh {" -> ("Mesh", "base_link")
+        "RotationalMotor {"             -> ("RotationalMotor", None)
+    properties and containers have no type.
+    """
+    if not isinstance(node, Node) or not node.name:
+        return None, None
+    words = node.name.split()
+    if node.DEF:
+        words += node.DEF.split("{", 1)[0].split()
+    identifier = None
+    if "DEF" in words:
+        i = words.index("DEF")
+        if i + 1 < len(words):
+            identifier = words[i + 1]
+    node_type = words[-1] if words[-1] != identifier else None
+    return node_type, identifier
+
+def _use_key(node):
+    """
+    Return the DEF identifier referenced by a USE site, e.g.
+        "boundingObject USE base_link" -> "base_link"
+        "USE base_link" (in a children list) -> "base_link"
+    None for every other structure.
+    """
+    if node.__class__ is not property:
+        return None
+    if node.name == "USE":
+        words = node.content.split()
+    elif node.content.startswith("USE "):
+        words = node.content.split()[1:]
+    else:
+        return None
+    return words[0] if words else None
+
+class _proto_index:
+    # name / node type / DEF identifier -> {id(node): node}
+    # dicts keep insertion order and allow O(1) removal
+    def __init__(self, owner = None):
+        self.owner = owner  # proto_robot holding the index, recorded on the indexed nodes (see _index_of)
+        self.by_name = {}
+        self.by_type = {}
+        self.by_def = {}    # symbol table: DEF identifier -> defining nodes
+        self.uses = {}      # reverse references: DEF identifier -> USE sites
+
+    def add(self, root, subtree = True):
+        # index root and all its descendants (only root if subtree is False)
+        owner = self.owner
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            key = id(node)
+            self.by_name.setdefault(node.name, {})[key] = node
+            if owner is not None and node.__class__ is not property:
+                node._owner = owner
+            node_type, identifier = _node_keys(node)
+            if node_type:
+                self.by_type.setdefault(node_type, {})[key] = node
+            if identifier:
+                self.by_def.setdefault(identifier, {})[key] = node
+            used = _use_key(node)
+            if used:
+                self.uses.setdefault(used, {})[key] = node
+            if subtree:
+                stack.extend(reversed(node.children))
+
+    def remove(self, root, subtree = True):
+        # drop root and all its descendants (only root if subtree is False)
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            key = id(node)
+            self.by_name.get(node.name, {}).pop(key, None)
+            node_type, identifier = _node_keys(node)
+            if node_type:
+                self.by_type.get(node_type, {}).pop(key, None)
+            if identifier:
+                self.by_def.get(identifier, {}).pop(key, None)
+            used = _use_key(node)
+            if used:
+                self.uses.get(used, {}).pop(key, None)
+            if subtree:
+                stack.extend(node.children)
+
+def _rename_def_text(node, old, new):
+    # "geometry DEF old Mesh {" -> "geometry DEF new Mesh {", "DEF old Solid {" -> "DEF new Solid {"
+    if node.name == "DEF":
+        first, sep, rest = node.DEF.partition(" ")
+        if first == old:
+            node.DEF = new + sep + rest
+    else:
+        node.DEF = re.sub(r'\bDEF(\s+)' + re.escape(old) + r'(?=[\s{\[]|$)', lambda m: "DEF" + m.group(1) + new, node.DEF, count=1)
+
+def _rename_use_text(node, old, new):
+    # "USE old" -> "USE new", as field content or as a list item named "USE"
+    if node.name == "USE":
+        node.content = re.sub(r'^(\s*)' + re.escape(old) + r'(?=\s|$)', lambda m: m.group(1) + new, node.content, count=1)
+    else:
+        node.content = re.sub(r'^USE(\s+)' + re.escape(old) + r'(?=\s|$)', lambda m: "USE" + m.group(1) + new, node.content, count=1)
+
+def _index_of(node):
+    # the built index of the robot that owns node, if any. The robot found last time is
+    # kept on the node and trusted while it has no index or its index holds the node,
+    # so add_child() in a big tree does not walk up to the root every time
+    if node.__class__ is property:
+        node = node.parent
+    owner = getattr(node, "_owner", None)
+    if owner is not None:
+        index = owner._index
+        if index is None or index.by_name.get(node.name, {}).get(id(node)) is node:
+            return index
+    start = node
+    while node is not None:
+        if node.parent is node:     # only the proto_robot is its own parent
+            if start is not node:
+                start._owner = node
+            return node._index
+        node = node.parent
+    return None
+
+# ================== Traversal ==================
+def _iter_tree(root, predicate = None, max_depth = None, order = "pre"):
+    """
+    Iterate over the descendants of root (root itself excluded) with an explicit stack.
+    Args:
+        predicate: only yield structures for which predicate(structure) is true
+        max_depth: do not descend below this depth (direct children are depth 1)
+        order: "pre" (document order, parents first) or "post" (children first)
+    """
+    if order == "pre":
+        stack = [(child, 1) for child in reversed(root.children)]
+        while stack:
+            node, depth = stack.pop()
+            if predicate is None or predicate(node):
+                yield node
+            if node.children and (max_depth is None or depth < max_depth):
+                stack.extend((child, depth + 1) for child in reversed(node.children))
+    elif order == "post":
+        # (node, depth, children already pushed)
+        stack = [(child, 1, False) for child in reversed(root.children)]
+        while stack:
+            node, depth, expanded = stack.pop()
+            if expanded or not node.children or (max_depth is not None and depth >= max_depth):
+                if predicate is None or predicate(node):
+                    yield node
+            else:
+                stack.append((node, depth, True))
+                stack.extend((child, depth + 1, False) for child in reversed(node.children))
+    else:
+        raise ValueError(f"unknown traversal order: {order}")
+
+# ================== Selectors ==================
+# combinator between two compounds: whitespace (descendant) or ">" (child)
+_SELECTOR_COMBINATOR_RE = re.compile(r'\s*(>?)\s*')
+# one simple selector of a compound
+_SELECTOR_SIMPLE_RE = re.compile(r"""
+    (?P<word>[A-Za-z_][\w-]*|\*)
+  | \#(?P<ident>[^\s>\[\]\#]+)
+  | \[\s*(?P<attr>name|type|def|content)\s*
+      (?:(?P<op>[*^$!]?=)\s*(?:"(?P<quoted>(?:[^"\\]|\\.)*)"|(?P<bare>[^\]\s]*))\s*)?
+    \]
+""", re.VERBOSE)
+
+_SELECTOR_OPS = {
+    None: lambda value, arg: bool(value),
+    "=": lambda value, arg: value == arg,
+    "!=": lambda value, arg: value != arg,
+    "*=": lambda value, arg: value is not None and arg in value,
+    "^=": lambda value, arg: value is not None and value.startswith(arg),
+    "$=": lambda value, arg: value is not None and value.endswith(arg),
+}
+
+def _selector_attr(node, attr):
+    if attr == "name":
+        return node.name
+    if attr == "content":
+        return getattr(node, "content", None)
+    node_type, identifier = _node_keys(node)
+    return node_type if attr == "type" else identifier
+
+def _word_test(word):
+    # field name or node type, e.g. "maxTorque" or "RotationalMotor"
+    if word == "*":
+        return lambda node: True
+    # the type differs from the name only when it comes from the DEF, check that cheaply first
+    return lambda node: node.name == word or (node.DEF is not None and word in node.DEF and isinstance(node, Node) and _node_keys(node)[0] == word)
+
+def _attr_test(attr, op, arg):
+    compare = _SELECTOR_OPS[op]
+    return lambda node: compare(_selector_attr(node, attr), arg)
+
+def _all_tests(tests):
+    if len(tests) == 1:
+        return tests[0]
+    return lambda node: all(test(node) for test in tests)
+
+class _selector:
+    """Selector compiled by compile_selector()"""
+    def __init__(self, text, child_axis, tests, keys):
+        self.text = text
+        self.child_axis = child_axis    # per step: True if it must be a direct child of the previous one
+        self.tests = tests              # per step: structure -> bool
+        self.keys = keys                # index lookups [(table, key)] giving candidates for the last step
+
+    def iter(self, root):
+        # against the index when the tree has one, otherwise one pruned traversal
+        index = _index_of(root)
+        if index is not None and self.keys:
+            return self._iter_indexed(root, index)
+        return self._iter_tree(root)
+
+    def _iter_tree(self, root):
+        # pre-order traversal carrying the steps each structure may match,
+        # subtrees where no step can match any more are skipped
+        tests = self.tests
+        child_axis = self.child_axis
+        last = len(tests) - 1
+        # pending steps -> the descendant steps among them, which stay open below
+        open_below = {}
+        stack = [(child, (0,)) for child in reversed(root.children)]
+        while stack:
+            node, pending = stack.pop()
+            advanced = None
+            matched = False
+            for i in pending:
+                if tests[i](node):
+                    if i == last:
+                        matched = True
+                    elif advanced is None:
+                        advanced = [i + 1]
+                    else:
+                        advanced.append(i + 1)
+            if matched:
+                yield node
+            if node.children:
+                inherited = open_below.get(pending)
+                if inherited is None:
+                    inherited = open_below[pending] = tuple(i for i in pending if not child_axis[i])
+                if advanced:
+                    inherited = tuple(dict.fromkeys(inherited + tuple(advanced)))
+                if inherited:
+                    stack.extend((child, inherited) for child in reversed(node.children))
+
+    def _iter_indexed(self, root, index):
+        # candidates of the last step from the index, the other steps are matched upwards
+        candidates = {}
+        for table, key in self.keys:
+            candidates.update(getattr(index, table).get(key, {}))
+        whole_tree = root.parent is root
+        last = len(self.tests) - 1
+        for node in candidates.values():
+            if (whole_tree or _is_descendant(node, root)) and self._matches_up(node, last, root):
+                yield node
+
+    def _matches_up(self, node, i, root):
+        # node matches step i and steps 0 .. i-1 match its ancestors below root
+        if not self.tests[i](node):
+            return False
+        parent = node.parent
+        if i == 0:
+            return not self.child_axis[0] or parent is root
+        while parent is not None and parent is not root and parent.parent is not parent:
+            if self._matches_up(parent, i - 1, root):
+                return True
+            if self.child_axis[i]:
+                return False
+            parent = parent.parent
+        return False
+
+    def __repr__(self):
+        return f"_selector({self.text!r})"
+
+def _is_descendant(node, root):
+    node = node.parent
+    while node is not None:
+        if node is root:
+            return True
+        if node.parent is node:
+            return False
+        node = node.parent
+    return False
+
+@functools.lru_cache(maxsize=256)
+def compile_selector(text):
+    """
+    Compile a selector once, repeated queries reuse it (compile_selector.cache_info()).
+    Compounds are separated by whitespace (descendant) or ">" (direct child), a leading
+    ">" only matches direct children of the structure the query runs on.
+    A compound combines:
+        word                field name or node type, "*" for any
+        #ident              node defined with "DEF ident"
+        [attr] [attr=v]     attr is name / type / def / content, operators = != *= ^= $=,
+                            v may be "quoted"
+    e.g. "HingeJoint > device > RotationalMotor > maxTorque", "boundingObject [type=Mesh] > url",
+         "#base_link url", "url[content*=.STL]"
+    """
+    child_axis = []
+    tests = []
+    keys = []
+    pos = 0
+    n = len(text)
+    while True:
+        combinator = _SELECTOR_COMBINATOR_RE.match(text, pos)
+        pos = combinator.end()
+        if pos >= n:
+            if combinator.group(1) or not tests:
+                raise ValueError(f"invalid selector {text!r}: missing compound at the end")
+            break
+        compound = []
+        keys = []
+        while pos < n:
+            m = _SELECTOR_SIMPLE_RE.match(text, pos)
+            if not m:
+                break
+            pos = m.end()
+            if m.group("word"):
+                word = m.group("word")
+                compound.append(_word_test(word))
+                if word != "*" and not keys:
+                    keys = [("by_name", word), ("by_type", word)]
+            elif m.group("ident"):
+                compound.append(lambda node, ident = m.group("ident"): _node_keys(node)[1] == ident)
+                keys = [("by_def", m.group("ident"))]
+            else:
+                attr, op = m.group("attr"), m.group("op")
+                arg = m.group("quoted")
+                arg = re.sub(r'\\(.)', r'\1', arg) if arg is not None else m.group("bare")
+                compound.append(_attr_test(attr, op, arg))
+                if op == "=" and attr != "content":
+                    keys = [({"name": "by_name", "type": "by_type", "def": "by_def"}[attr], arg)]
+        if not compound or (pos < n and not text[pos].isspace() and text[pos] != ">"):
+            raise ValueError(f"invalid selector {text!r} at position {pos}")
+        child_axis.append(bool(combinator.group(1)))
+        tests.append(_all_tests(compound))
+    return _selector(text, tuple(child_axis), tuple(tests), keys)
+
+# ================== Transactions ==================
+def _restage(root, stage):
+    # put root at stage and every descendant one stage below its parent
+    if root.stage == stage and all(child.stage == stage + 1 for child in root.children):
+        return
+    stack = [(root, stage)]
+    while stack:
+        node, stage = stack.pop()
+        node.stage = stage
+        if node.__class__ is not property:
+            node._src = None    # the source text has the indentation of the old stage
+        stack.extend((child, stage + 1) for child in node.children)
+
+def _stage_below(parent):
+    # stage of a child of parent, the proto_robot itself sits at stage -1
+    return 0 if parent.parent is parent else parent.stage + 1
+
+class transaction:
+    """
+    Batch of edits on a proto_robot, applied in one pass by commit():
+        with robot.transaction() as tx:
+            tx.set_all("RotationalMotor > maxTorque", "0.001")
+            tx.set_field(motor, "maxVelocity", "10")
+            tx.replace(bounding_object, mesh_node)
+            tx.delete(unused_node)
+    Edits are applied in the order they were queued. Parent links and stages of
+    inserted structures are fixed up, and the search index is updated once at the
+    end instead of after every edit. If an edit fails, the edits already applied
+    are undone and the error is raised again.
+    """
+    def __init__(self, robot):
+        self.robot = robot
+        self._ops = []
+
+    # set content / name / DEF of a structure, None leaves the attribute unchanged
+    def set(self, target, content = None, name = None, DEF = None):
+        self._ops.append((self._apply_set, (target, content, name, DEF)))
+
+    # set the field "name" of node, e.g. set_field(motor, "maxTorque", "10"), added if missing
+    def set_field(self, node, name, content):
+        self._ops.append((self._apply_set_field, (node, name, content)))
+
+    # set the content of every structure matching selector (and where(structure), if given);
+    # the selector is evaluated now, in a single traversal or index lookup
+    def set_all(self, selector, content, where = None):
+        for target in self.robot.iter_select(selector):
+            if where is None or where(target):
+                self.set(target, content)
+
+    # put new in place of old, in the same parent and at the same stage
+    def replace(self, old, new):
+        self._ops.append((self._apply_replace, (old, new)))
+
+    # insert child under parent at position index (appended if None)
+    def insert(self, parent, child, index = None):
+        self._ops.append((self._apply_insert, (parent, child, index)))
+
+    # remove target and its subtree from its parent
+    def delete(self, target):
+        self._ops.append((self._apply_delete, (target,)))
+
+    # forget the queued edits
+    def discard(self):
+        self._ops.clear()
+
+    def __len__(self):
+        return len(self._ops)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+        return False
+
+    # apply the queued edits, returns how many were applied
+    def commit(self):
+        robot = self.robot
+        ops, self._ops = self._ops, []
+        self._index = robot._index
+        self._undo = []
+        self._fresh = []        # (structure, subtree) to (re)index once the batch is applied
+        self._detached = set()  # id() of the structures taken out of the tree
+        robot._index = None     # add_child / replace_child must not touch the index meanwhile
+        try:
+            for apply, args in ops:
+                apply(*args)
+        except BaseException:
+            for undo in reversed(self._undo):
+                undo()
+            # removals already reached the index, rebuild it on the next lookup
+            robot._index = None
+            raise
+        else:
+            index = robot._index = self._index
+            if index is not None:
+                for node, subtree in self._fresh:
+                    if self._attached(node):
+                        index.add(node, subtree)
+        finally:
+            self._index = self._undo = self._fresh = self._detached = None
+        return len(ops)
+
+    def _attached(self, node):
+        while node.parent is not node:
+            if id(node) in self._detached:
+                return False
+            node = node.parent
+        return node is self.robot
+
+    def _apply_set(self, target, content, name, DEF):
+        old = (target.content if content is not None else None, target.name, target.DEF)
+        # only name, DEF and USE references are index keys
+        rekey = (name is not None and name != target.name) or (DEF is not None and DEF != target.DEF) \
+            or (content is not None and "USE" in f"{old[0]} {content}")
+        if rekey and self._index is not None:
+            self._index.remove(target, subtree = False)
+            self._fresh.append((target, False))
+        if content is not None:
+            target.content = content
+        if name is not None:
+            target.name = name
+        if DEF is not None:
+            target.DEF = DEF
+        _touch(target)
+        self._undo.append(lambda: self._restore(target, *old))
+
+    @staticmethod
+    def _restore(target, content, name, DEF):
+        if content is not None:
+            target.content = content
+        target.name = name
+        target.DEF = DEF
+
+    def _apply_set_field(self, node, name, content):
+        for child in node.children:
+            if child.name == name and child.__class__ is property:
+                self._apply_set(child, content, None, None)
+                return
+        self._apply_insert(node, property(name = name, parent = node, content = content), None)
+
+    def _apply_replace(self, old, new):
+        parent = old.parent
+        children = parent.children
+        i = children.index(old)
+        undo = (new.parent, new.stage)
+        children[i] = new
+        new.parent = parent
+        _restage(new, old.stage)
+        _touch(parent)
+        self._take_out(old)
+        self._put_in(new)
+        def revert():
+            children[i] = old
+            new.parent = undo[0]
+            _restage(new, undo[1])
+        self._undo.append(revert)
+
+    def _apply_insert(self, parent, child, index):
+        if parent.children is _NO_CHILDREN:
+            parent.children = []
+            self._undo.append(lambda: setattr(parent, "children", _NO_CHILDREN))
+        children = parent.children
+        undo = (child.parent, child.stage)
+        if index is None:
+            index = len(children)
+        children.insert(index, child)
+        child.parent = parent
+        _restage(child, _stage_below(parent))
+        _touch(parent)
+        self._put_in(child)
+        def revert():
+            children.remove(child)
+            child.parent = undo[0]
+            _restage(child, undo[1])
+        self._undo.append(revert)
+
+    def _apply_delete(self, target):
+        children = target.parent.children
+        i = children.index(target)
+        del children[i]
+        _touch(target.parent)
+        self._take_out(target)
+        self._undo.append(lambda: children.insert(i, target))
+
+    def _take_out(self, node):
+        self._detached.add(id(node))
+        if self._index is not None:
+            self._index.remove(node)
+
+    def _put_in(self, node):
+        self._detached.discard(id(node))
+        self._fresh.append((node, True))
+
+# ================== Subtree digests / diff ==================
+_generations = itertools.count(1)  # digests computed before the last invalidate_hashes() of their robot are stale
+
+def _touch(node):
+    # an edit at node: the cached digests and source spans from node up to the root are stale.
+    # Every ancestor is cleared: one without a span (e.g. closed on a line shared with its
+    # parent, "] }") can still sit below ancestors that have one
+    if node.__class__ is property:
+        node = node.parent
+    while node is not None:
+        node._digest = None
+        node._src = None
+        if node.parent is node:
+            break
+        node = node.parent
+
+def _own_text(node):
+    # what identifies a structure apart from its children
+    if node.__class__ is property:
+        return f"p\0{node.name}\0{node.content}"
+    return f"{node._kind}\0{node.name}\0{node.DEF}"
+
+def _subtree_digest(root, generation):
+    """
+    Merkle digest (16 bytes blake2b) of root: its own line, the text of its leaf
+    properties and the digests of its other children, so equal digests mean equal
+    subtrees whatever their stage. Digests are cached on the structures and only
+    the missing / stale ones are computed, children first, without recursion.
+    """
+    # pre-order list of the structures to (re)hash, walked backwards: children before parents
+    order = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        cached = getattr(node, "_digest", None)
+        if cached is not None and cached[0] == generation:
+            continue
+        order.append(node)
+        stack.extend([child for child in node.children if child.__class__ is not property])
+    with _paused_gc():
+        for node in reversed(order):
+            parts = [f"p\0{child.name}\0{child.content}" if child.__class__ is property else "\1" + child._digest[1].hex()
+                     for child in node.children]
+            parts.append(_own_text(node) if node.parent is not node else "r")
+            h = hashlib.blake2b("\0".join(parts).encode('utf-8'), digest_size=16)
+            if node.__class__ is array_field:
+                values = node.values
+                h.update(f"{node.row_format}\0{values.dtype.str}\0{values.shape}".encode('utf-8'))
+                h.update(np.ascontiguousarray(values).data)
+            node._digest = (generation, h.digest())
+    return root._digest[1]
+
+def _generation_of(node):
+    # hash generation of the robot holding node, 0 for a detached structure
+    while node is not None and node.parent is not node:
+        node = node.parent
+    return node._hash_generation if node is not None else 0
+
+def _diff_key(node, generation):
+    # equal keys <=> equal subtrees, leaf properties are compared by their text
+    if node.__class__ is property:
+        return _own_text(node)
+    cached = getattr(node, "_digest", None)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    return _subtree_digest(node, generation)
+
+# one reported difference, old / new are the structures (None for added / removed)
+diff_entry = collections.namedtuple("diff_entry", ("kind", "path", "old", "new"))
+
+def _path_label(node):
+    if node.name == "DEF" and node.DEF:
+        return "DEF " + node.DEF.split()[0]     # "DEF link1 Solid {" -> "DEF link1"
+    if node.name:
+        return node.name
+    return "(blank)" if node.__class__ is property else "{}"
+
+def _child_path(children, i):
+    # "name" for a field that appears once among its siblings, "name[k]" otherwise;
+    # the unnamed body of a PROTO is "{}", blank lines are "(blank)"
+    label = _path_label(children[i])
+    same = [j for j, child in enumerate(children) if child.name == children[i].name and _path_label(child) == label]
+    return f"{label}[{same.index(i)}]" if len(same) > 1 else label
+
+def diff(a, b):
+    """
+    Structural diff of two proto_robot (or two structures), returns a list of
+    diff_entry(kind, path, old, new) with kind "added", "removed" or "changed".
+    path is the "/" joined field names from the root, e.g.
+        "Robot/children/HingeJoint[2]/endPoint/children/Shape/geometry/url"
+    Subtrees with the same digest are skipped, so once the digests are cached the
+    work is proportional to the changed part of the trees, not to their size.
+    Comment lines (robot.header) and stages are not compared.
+    """
+    changes = []
+    generation_a, generation_b = _generation_of(a), _generation_of(b)
+    if _diff_key(a, generation_a) == _diff_key(b, generation_b):
+        return changes
+    # (old structure, new structure, path) pairs whose digests differ
+    stack = [(a, b, "")]
+    while stack:
+        old, new, path = stack.pop()
+        if old.parent is not old and _own_text(old) != _own_text(new):
+            changes.append(diff_entry("changed", path, old, new))
+        if old.__class__ is property or old.__class__ is array_field:
+            continue
+        old_children, new_children = old.children, new.children
+        prefix = path + "/" if path else ""
+        old_keys = [_diff_key(child, generation_a) for child in old_children]
+        new_keys = [_diff_key(child, generation_b) for child in new_children]
+        # most edits leave long equal runs at both ends, only align the middle
+        lo, n = 0, min(len(old_keys), len(new_keys))
+        while lo < n and old_keys[lo] == new_keys[lo]:
+            lo += 1
+        hi = 0
+        while hi < n - lo and old_keys[-1 - hi] == new_keys[-1 - hi]:
+            hi += 1
+        matcher = difflib.SequenceMatcher(None, old_keys[lo:len(old_keys) - hi], new_keys[lo:len(new_keys) - hi], autojunk=False)
+        pending = []
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            i1, i2, j1, j2 = i1 + lo, i2 + lo, j1 + lo, j2 + lo
+            # inside a replaced block, pair the structures of the same field in order
+            unmatched = collections.defaultdict(collections.deque)
+            for j in range(j1, j2):
+                unmatched[(new_children[j].name, new_children[j].__class__)].append(j)
+            paired = set()
+            for i in range(i1, i2):
+                child = old_children[i]
+                candidates = unmatched.get((child.name, child.__class__))
+                if candidates:
+                    j = candidates.popleft()
+                    paired.add(j)
+                    pending.append((child, new_children[j], prefix + _child_path(new_children, j)))
+                else:
+                    changes.append(diff_entry("removed", prefix + _child_path(old_children, i), child, None))
+            for j in range(j1, j2):
+                if j not in paired:
+                    changes.append(diff_entry("added", prefix + _child_path(new_children, j), None, new_children[j]))
+        stack.extend(reversed(pending))
+    return changes
+
+# ================== Serializer ==================
+_INDENTS = ["  " * stage for stage in range(64)]
+_WRITE_CHUNK = 4096     # lines joined per out.write() call
+_COPY_DIRECT = 1 << 16  # source spans from this size on are written directly, not batched
+
+def _write_source(out, source, start, end):
+    # source[start:end] to out; the bytes of a memory-mapped file go straight to the
+    # binary buffer of a text file without being decoded
+    if source.__class__ is str:
+        out.write(source[start:end])
+        return
+    buffer = getattr(out, "buffer", None)
+    if buffer is None or (getattr(out, "encoding", "") or "").lower().replace("-", "") != "utf8":
+        out.write(source[start:end].decode('utf-8'))
+        return
+    out.flush()
+    view = memoryview(source)[start:end]
+    try:
+        buffer.write(view)
+    finally:
+        view.release()
+
+def _indent(stage):
+    if 0 <= stage < len(_INDENTS):
+        return _INDENTS[stage]
+    return "  " * stage
+
+def _property_line(node, tab):
+    # text of a leaf property, shared by _write_tree() and property; a blank line
+    # of the source (no name) is written empty, without indentation
+    if node.name:
+        return f"{tab}{node.name} {node.content}\n"
+    return f"{tab}{node.content}\n" if node.content else "\n"
+
+def _write_tree(out, roots):
+    """
+    Write roots and their descendants to out in one pre-order traversal.
+    Lines are collected in small batches so that no subtree is ever copied
+    into its parent's text, the only full copy is the one held by out.
+    Structures that still have their source span are copied from the file
+    they were read from, only the modified ones are formatted again.
+    """
+    lines = []
+    append = lines.append
+    # stack items are either structures or their pending closing line
+    stack = list(reversed(roots))
+    pop = stack.pop
+    push = stack.extend
+    while stack:
+        node = pop()
+        cls = node.__class__
+        if cls is str:
+            append(node)
+        elif cls is property:
+            # most structures are leaf properties, skip the method lookups
+            append(_property_line(node, _indent(node.stage)))
+        elif getattr(node, "_src", None) is not None:
+            # unmodified since it was read: copy its text from the source as is
+            source, start, end = node._src
+            if end - start < _COPY_DIRECT:
+                append(source[start:end] if source.__class__ is str else source[start:end].decode('utf-8'))
+            else:
+                out.write("".join(lines))
+                lines.clear()
+                _write_source(out, source, start, end)
+        else:
+            tab = _indent(node.stage)
+            if node._streamed:
+                # generated text of any size (array rows, ...) goes to out chunk by chunk
+                out.write("".join(lines))
+                lines.clear()
+                for piece in node._iter_text(tab):
+                    out.write(piece)
+            else:
+                append(node._open_line(tab))
+            if node.children:
+                stack.append(node._close_line(tab))
+                push(reversed(node.children))
+            else:
+                append(node._close_line(tab))
+        if len(lines) >= _WRITE_CHUNK:
+            out.write("".join(lines))
+            lines.clear()
+    out.write("".join(lines))
+
+def _iter_text_chunks(roots):
+    """
+    The text _write_tree() writes for roots, as a generator of chunks: one per
+    line, per source span or per piece of a streamed structure
+    """
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        if node.__class__ is str:
+            yield node
+        elif getattr(node, "_src", None) is not None:
+            source, start, end = node._src
+            yield source[start:end] if source.__class__ is str else source[start:end].decode('utf-8')
+        else:
+            tab = _indent(node.stage)
+            if node._streamed:
+                yield from node._iter_text(tab)
+            else:
+                yield node._open_line(tab)
+            if node.children:
+                stack.append(node._close_line(tab))
+                stack.extend(reversed(node.children))
+            else:
+                yield node._close_line(tab)
+
+def _build_tree(robot, buf, events, cursor, current_stage, intern):
+    """
+    Apply _tokenize() events of buf below cursor, returns the final (cursor, current_stage).
+    Full line comments go to robot.header.
+    """
+    new = object.__new__
+    for event in events:
+        kind = event[0]
+        if kind == _LINES:
+            # fast path: a block of lines without any structural character,
+            # every one of them is a property of the current cursor
+            stage = current_stage + 1
+            append = cursor.children.append
+            lines = [line.strip().partition(" ") for line in buf[event[1]:event[2]].split("\n")]
+            for name, _, content in lines:
+                p = new(property)
+                p.name = intern(name, name)
+                p.stage = stage
+                p.parent = cursor
+                p.children = _NO_CHILDREN
+                p.DEF = None
+                p.content = content
+                append(p)
+        elif kind == _PROPERTY:
+            cursor.children.append(property(name = intern(event[1], event[1]), parent = cursor, content = event[2], stage=current_stage+1))
+        elif kind == _OPEN_NODE:
+            current_stage += 1
+            cursor.children.append(Node(name = intern(event[1], event[1]), parent = cursor, DEF = event[2], stage=current_stage))
+            cursor = cursor.children[-1]
+            cursor._src = event[3]     # line start until the closing bracket gives the span
+        elif kind == _OPEN_CONTAINER:
+            current_stage += 1
+            cursor.children.append(container(name = intern(event[1], event[1]), parent = cursor, DEF = event[2], stage=current_stage))
+            cursor = cursor.children[-1]
+            cursor._src = event[3]
+        elif kind == _CLOSE:
+            current_stage -= 1
+            if cursor.parent is not cursor:
+                start = cursor._src
+                cursor._src = (buf, start, event[1]) if start.__class__ is int and start >= 0 and event[1] >= 0 else None
+            cursor = cursor.parent
+        elif kind == _ARRAY:
+            parsed = _parse_array(event[1], buf[event[3]:event[4]])
+            if parsed is None:
+                # not numeric after all, keep it as a container of properties
+                cursor, current_stage = _build_tree(robot, buf, [(_OPEN_CONTAINER, event[1], event[2], event[5]), (_LINES, event[3], event[4]), (_CLOSE, event[6])], cursor, current_stage, intern)
+            else:
+                field = array_field(name = intern(event[1], event[1]), parent = cursor, DEF = event[2], stage = current_stage+1, values = parsed[0], row_format = parsed[1])
+                field._src = (buf, event[5], event[6]) if event[5] >= 0 and event[6] >= 0 else None
+                cursor.children.append(field)
+        else:   # _HEADER
+            robot.header += event[1] + "\n"
+            # the comment goes to the header, the text around it cannot be copied as is
+            node = cursor
+            while node.parent is not node:
+                node._src = None
+                node = node.parent
+    return cursor, current_stage
+
+@contextlib.contextmanager
+def _paused_gc():
+    # the tree is full of parent <-> child cycles, so the cyclic GC would
+    # rescan every node allocated so far on each collection while it grows
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+# ================== Lazy loading ==================
+# a string in the raw bytes of the file, same rule as _TOKEN_RE
+_BYTES_STRING_RE = re.compile(rb'"(?:[^"\\\n]|\\.)*"?')
+_BYTES_SPECIAL_CHARS = (b"{", b"}", b"[", b"]", b'"', b"#")
+
+def _match_brackets(data):
+    """
+    Bracket matching scan over the raw bytes of a proto file.
+    Returns (opens, closes): offsets of every '{' / '[' outside strings and
+    comments, sorted, and the offset of the matching bracket (len(data) if
+    it is never closed).
+    """
+    n = len(data)
+    find = data.find
+    opens = array.array("q")
+    closes = array.array("q")
+    stack = []
+    pos = 0
+    next_special = [find(c) for c in _BYTES_SPECIAL_CHARS]
+    next_special = [i if i >= 0 else n for i in next_special]
+    while True:
+        special = min(next_special)
+        if special >= n:
+            break
+        c = data[special]
+        if c == 0x22:       # '"'
+            pos = _BYTES_STRING_RE.match(data, special).end()
+        elif c == 0x23:     # '#', comment up to the end of line
+            pos = find(b"\n", special)
+            pos = n if pos < 0 else pos + 1
+        elif c == 0x7b or c == 0x5b:    # '{' '['
+            stack.append(len(opens))
+            opens.append(special)
+            closes.append(n)
+            pos = special + 1
+        else:               # '}' ']'
+            if stack:
+                closes[stack.pop()] = special
+            pos = special + 1
+        for k, i in enumerate(next_special):
+            if i < pos:
+                i = find(_BYTES_SPECIAL_CHARS[k], pos)
+                next_special[k] = i if i >= 0 else n
+    return opens, closes
+
+class _lazy_source:
+    """
+    Memory-mapped proto file of a lazily loaded proto_robot.
+    Only the offsets of the brackets are known up front, the children of a
+    LazyNode / lazy_container are parsed from the mapping on first access.
+    """
+    def __init__(self, robot, proto_filename):
+        self.robot = robot
+        self.filename = proto_filename
+        with open(proto_filename, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.opens, self.closes = _match_brackets(self.data)
+        self.intern = {}.setdefault
+
+    def _next_block(self, pos, end):
+        # index of the first bracket in [pos, end) that spans several lines, None if there is none;
+        # brackets closed on their own line (e.g. "centerOfMass [ 0 0 0 ]") stay in the text
+        opens = self.opens
+        i = bisect.bisect_left(opens, pos)
+        while i < len(opens) and opens[i] < end:
+            if self.data.find(b"\n", opens[i], self.closes[i]) >= 0:
+                return i
+            i = bisect.bisect_right(opens, self.closes[i], i)
+        return None
+
+    def _text_events(self, text, start, end):
+        # events of data[start:end], which may begin and end in the middle of a line
+        data = self.data
+        pos = 0
+        if start > 0 and data[start - 1] != 0x0a:
+            pos = text.find("\n")
+            if pos < 0:
+                pos = len(text)
+            yield from _tokenize_line(text, 0, pos, at_line_start = False)
+            pos += 1
+        if pos >= len(text):
+            return
+        if end < len(data) and data[end - 1] != 0x0a:
+            # the last line goes on after end (up to a closing bracket)
+            last = max(text.rfind("\n", pos) + 1, pos)
+            yield from _tokenize(text, pos, last)
+            yield from _tokenize_line(text, last, len(text))
+        else:
+            yield from _tokenize(text, pos)
+
+    def load_children(self, parent, start, end, stage):
+        """Parse data[start:end], the body of parent, into parent.children"""
+        data = self.data
+        robot = self.robot
+        intern = self.intern
+        new = object.__new__
+        cursor = parent
+        with _paused_gc():
+            pos = start
+            while pos < end:
+                i = self._next_block(pos, end)
+                if i is None:
+                    text = data[pos:end].decode('utf-8')
+                    cursor, stage = _build_tree(robot, text, _fold_arrays(self._text_events(text, pos, end)), cursor, stage, intern)
+                    break
+                q = self.opens[i]
+                line_start = data.rfind(b"\n", pos, q) + 1 or pos
+                if line_start > pos:
+                    text = data[pos:line_start].decode('utf-8')
+                    cursor, stage = _build_tree(robot, text, _fold_arrays(self._text_events(text, pos, line_start)), cursor, stage, intern)
+                # the opening line, its last event opens the block
+                text = data[line_start:q + 1].decode('utf-8')
+                events = list(_tokenize_line(text, 0, len(text), at_line_start = line_start == 0 or data[line_start - 1] == 0x0a))
+                cursor, stage = _build_tree(robot, text, events[:-1], cursor, stage, intern)
+                kind, name, DEF, alone = events[-1]
+                span = self._span_of(line_start, i) if alone >= 0 else None
+                body_start = q + 1
+                line_end = data.find(b"\n", body_start)
+                tail = data[body_start:line_end].strip()
+                if tail.startswith(b"#"):
+                    # keep a trailing comment on the opening line with the DEF
+                    if DEF is not None:
+                        DEF += " " + tail.decode('utf-8')
+                    body_start = line_end
+                pos = self.closes[i] + 1
+                if kind == _OPEN_CONTAINER and name in _ARRAY_FIELDS:
+                    field = self._array_field(name, cursor, DEF, stage + 1, i, body_start)
+                    if field is not None:
+                        field._src = span
+                        cursor.children.append(field)
+                        continue
+                node = new(LazyNode if kind == _OPEN_NODE else lazy_container)
+                node.name = intern(name, name)
+                node.stage = stage + 1
+                node.parent = cursor
+                node.DEF = DEF
+                node._span = (self, body_start, self.closes[i])
+                node._src = span
+                cursor.children.append(node)
+
+    def _span_of(self, line_start, i):
+        # (data, start, end) of the structure opened by bracket i at line_start, None
+        # if its closing bracket does not end its line
+        close = self.closes[i]
+        line_end = self.data.find(b"\n", close)
+        if line_end < 0 or self.data[close + 1:line_end].strip():
+            return None
+        return (self.data, line_start, line_end + 1)
+
+    def _array_field(self, name, parent, DEF, stage, i, body_start):
+        # numeric block without nested brackets and alone on its lines -> array_field, else None
+        end = self.closes[i]
+        if i + 1 < len(self.opens) and self.opens[i + 1] < end:
+            return None
+        text = self.data[body_start:end].decode('utf-8')
+        if text.split("\n", 1)[0].strip() or text[text.rfind("\n") + 1:].strip():
+            return None
+        parsed = _parse_array(name, text)
+        if parsed is None:
+            return None
+        return array_field(name = self.intern(name, name), parent = parent, DEF = DEF, stage = stage, values = parsed[0], row_format = parsed[1])
 
 class proto_robot:
-    def __init__(self, proto_filename = None):
+    def __init__(self, proto_filename = None, cache = None, lazy = False):
         self.header = ""
         self.children = []
         self.cursor = self
         self.parent = self      # parent of the root is itself
+        self._index = None      # search index, built on first lookup
+        self._source = None     # memory-mapped file of a lazy robot
+        self._digest = None     # cached subtree digest, see digest()
+        self._src = None        # (text / mmap, start, end) of the file while nothing was edited
+        self._hash_generation = next(_generations)
+        self._registry = weakref.WeakValueDictionary()     # node id -> node, see node_id()
+        self._next_id = itertools.count(1)                  # 0 is the robot itself
         if proto_filename:
-            self.read_proto_file(proto_filename)
+            self.read_proto_file(proto_filename, cache, lazy)
 
     # add child to the current node
     def add_child(self, child):
         self.children.append(child)
+        _touch(self)
+        if self._index is not None:
+            self._index.add(child)
+
+    # remove a direct child (and its subtree)
+    def remove_child(self, child):
+        self.children.remove(child)
+        _touch(self)
+        if self._index is not None:
+            self._index.remove(child)
+
+    # batch of edits applied in one pass, see transaction
+    def transaction(self):
+        return transaction(self)
 
     # iterator to set the current node
     def set_current(self, child):
         self.cursor = child    
     
     # read proto file and build the robot structure
-    def read_proto_file(self, proto_filename):
-        # init variables
-        current_stage = -1
-        
-        # read the proto file
+    # cache: optional proto_cache.proto_cache, reuses the snapshot of an unchanged file
+    # lazy: memory-map the file and only parse the top level, nested nodes are
+    #       parsed when their children are first accessed (the cache is not used)
+    def read_proto_file(self, proto_filename, cache = None, lazy = False):
+        if lazy and os.path.getsize(proto_filename) > 0:
+            self.read_proto_lazy(proto_filename)
+            return
+        if cache is not None and cache.load(self, proto_filename):
+            return
+        start = time.perf_counter()
+        # read the whole proto file as a single buffer
         with open(proto_filename, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-        
-        # parse the proto file
-        for line in lines:
-            line = line.strip()
-            if line.startswith("#"):            #header
-                self.header += line+"\n"
-            else:
-                if line.endswith("["):
-                    line = line.split(" ",1)
-                    current_stage += 1
-                    self.cursor.add_child(container(name = line[0], parent=self.cursor, DEF = line[1], stage=current_stage))
-                    self.set_current(self.cursor.children[-1])
-                elif line.endswith("{"):
-                    current_stage += 1
-                    if line != "{":
-                        line = line.split(" ",1)
-                        self.cursor.add_child(Node(name = line[0], parent = self.cursor, DEF = line[1], stage=current_stage))
-                        self.set_current(self.cursor.children[-1])
-                    else:
-                        self.cursor.add_child(Node(name = "", parent = self.cursor, stage=current_stage))
-                        self.set_current(self.cursor.children[-1])
-                elif line.endswith("]") or line.endswith("}") or line.endswith("} "):
-                    if line.startswith("centerOfMass"):
-                        line = line.split(" ",1)
-                        self.cursor.add_child(property(name = line[0], parent = self.cursor, content = line[1], stage=current_stage+1))
-                    else:
-                        current_stage -= 1
-                        self.set_current(self.cursor.parent)
-                else:
-                    line = line.split(" ",1)
-                    if len(line) == 1:
-                        self.cursor.add_child(property(name = line[0], parent = self.cursor, stage=current_stage+1))
-                    else:
-                        self.cursor.add_child(property(name = line[0], parent = self.cursor, content = line[1], stage=current_stage+1))
-        # return lines
+            buf = file.read()
+        self.read_proto_string(buf)
+        if cache is not None:
+            cache.store(self, proto_filename, time.perf_counter() - start)
+
+    # build the robot structure from the text of a proto file
+    def read_proto_string(self, buf):
+        whole = not self.children and not self.header
+        with _paused_gc():
+            # field names repeat all over the file, keep a single copy of each
+            cursor, _ = _build_tree(self, buf, _fold_arrays(_tokenize(buf)), self.cursor, -1, {}.setdefault)
+        # until something is edited, the robot is written back as buf
+        self._src = (buf, 0, len(buf)) if whole else None
+        self.set_current(cursor)
+        self.invalidate_index()
     
+    # memory-map the proto file, parse the top level and leave every multi-line
+    # node / container as a LazyNode / lazy_container
+    def read_proto_lazy(self, proto_filename):
+        whole = not self.children and not self.header
+        self._source = _lazy_source(self, proto_filename)
+        self._source.load_children(self, 0, len(self._source.data), -1)
+        self._src = (self._source.data, 0, len(self._source.data)) if whole else None
+        self.set_current(self)
+        self.invalidate_index()
+
     # search the robot structure with the given name
     def search(self, name):
-        result_list = []
+        return list(self.iter_search(name))
+
+    # first structure with the given name in document order, None if there is none
+    def search_first(self, name):
+        return next(self.iter_search(name), None)
+
+    # lazily yield the descendants, see _iter_tree()
+    def iter_nodes(self, predicate = None, max_depth = None, order = "pre"):
+        return _iter_tree(self, predicate, max_depth, order)
+
+    # lazily yield the descendants with the given name
+    def iter_search(self, name, max_depth = None, order = "pre"):
+        return _iter_tree(self, lambda s: s.name == name, max_depth, order)
+
+    # structures matching a selector, see compile_selector(), e.g. "RotationalMotor > maxTorque"
+    def select(self, selector):
+        return list(self.iter_select(selector))
+
+    # first match of a selector, None if there is none
+    def select_first(self, selector):
+        return next(self.iter_select(selector), None)
+
+    # lazily yield the matches of a selector
+    def iter_select(self, selector):
+        return compile_selector(selector).iter(self)
+
+    # parse every lazy node that was not accessed yet
+    def load_all(self):
+        stack = [self]
+        with _paused_gc():
+            while stack:
+                # leaf properties cannot hold lazy nodes, skip them
+                stack.extend([child for child in stack.pop().children if child.__class__ is not property])
+
+    # ================== Indexed lookups ==================
+    def build_index(self):
+        self._index = _proto_index(self)
         for child in self.children:
-            if child.name == name:
-                result_list.append(child)
-            result_list += child.search(name)
-        return result_list
+            self._index.add(child)
+        return self._index
+
+    # drop the index after editing name / DEF / children directly, it is rebuilt on the next lookup
+    def invalidate_index(self):
+        self._index = None
+        self.invalidate_hashes()
+
+    # drop every cached subtree digest, needed after editing content / values directly
+    def invalidate_hashes(self):
+        self._hash_generation = next(_generations)
+        self._digest = None
+
+    # Merkle digest of the whole tree (16 bytes), see diff()
+    def digest(self):
+        return _subtree_digest(self, self._hash_generation)
+
+    # after editing header directly: write the robot from its structures, not as the file it was read from
+    def mark_modified(self):
+        _touch(self)
+
+    # write the structures overlapping any of the sorted, disjoint (start, end) offsets of the
+    # text that was read in the layout of write() rather than verbatim, e.g. blocks that were
+    # pasted into the text with another indentation
+    def reformat_spans(self, spans):
+        starts = [start for start, _ in spans]
+        ends = [end for _, end in spans]
+        for node in self.iter_nodes(lambda s: s.__class__ is not property and getattr(s, "_src", None) is not None):
+            _, start, end = node._src
+            i = bisect.bisect_right(ends, start)
+            if i < len(spans) and starts[i] < end:
+                _touch(node)
+
+    def _get_index(self):
+        if self._index is None:
+            self.build_index()
+        return self._index
+
+    # all structures with the given field name, e.g. "geometry", "boundingObject", "maxTorque"
+    def find_by_name(self, name):
+        return list(self._get_index().by_name.get(name, {}).values())
+
+    # all nodes of the given type, e.g. "HingeJoint", "Mesh", "RotationalMotor"
+    def find_by_type(self, node_type):
+        return list(self._get_index().by_type.get(node_type, {}).values())
+
+    # all nodes defined with "DEF <identifier>"
+    def find_by_def(self, identifier):
+        return list(self._get_index().by_def.get(identifier, {}).values())
+
+    # ================== Node ids ==================
+    # stable integer handle of a node / container (e.g. for a tree view), given out on first request.
+    # The id stays with the object through edits and moves, the registry only holds weak references
+    def node_id(self, node):
+        if node is self:
+            return 0
+        if node.__class__ is property:
+            raise TypeError("properties have no node id, use the id of their parent")
+        nid = getattr(node, "_nid", None)
+        if nid is None or self._registry.get(nid) is not node:
+            nid = node._nid = next(self._next_id)
+            self._registry[nid] = node
+        return nid
+
+    # node / container with the given id, None if it was never handed out or the node is gone
+    def node_by_id(self, nid):
+        if nid == 0:
+            return self
+        return self._registry.get(nid)
+
+    # ================== DEF / USE symbol table ==================
+    # node defined with "DEF <identifier>", None if there is none
+    def resolve(self, identifier):
+        return next(iter(self._get_index().by_def.get(identifier, {}).values()), None)
+
+    # node referenced by a USE site such as "boundingObject USE base_link"
+    def resolve_use(self, use_site):
+        identifier = _use_key(use_site)
+        return self.resolve(identifier) if identifier else None
+
+    # every "USE <identifier>" site, e.g. all boundingObjects sharing a visual geometry
+    def find_uses(self, identifier):
+        return list(self._get_index().uses.get(identifier, {}).values())
+
+    # rename a DEF and all its USE sites, returns the number of structures changed
+    def rename_def(self, old, new):
+        index = self._get_index()
+        defs = index.by_def.pop(old, {})
+        uses = index.uses.pop(old, {})
+        for node in defs.values():
+            _rename_def_text(node, old, new)
+            _touch(node)
+        for node in uses.values():
+            _rename_use_text(node, old, new)
+            _touch(node)
+        if defs:
+            index.by_def.setdefault(new, {}).update(defs)
+        if uses:
+            index.uses.setdefault(new, {}).update(uses)
+        return len(defs) + len(uses)
 
     def save_robot(self, File_path = None):
         if not File_path:
@@ -122,7 +1514,7 @@ class proto_robot:
                 pass
         
         # get robot name
-        Proto_Object = self.search("PROTO")[0]
+        Proto_Object = self.search_first("PROTO")
         robot_Name = Proto_Object.DEF.split(" ")[0]
         
         if not File_path:
@@ -137,17 +1529,40 @@ class proto_robot:
         # print(save_file_name)
         # print(Proto_Object.DEF)
         
-        Proto_Object.DEF = Proto_Object.DEF.replace(robot_Name, save_file_name)
-        Proto_Object.children[2].content = Proto_Object.children[2].content.replace(robot_Name, save_file_name)
-        with open(save_file, 'w') as f:
-            f.write(str(self))
+        with self.transaction() as tx:
+            # only an actual rename marks the PROTO declaration as modified
+            if save_file_name != robot_Name:
+                tx.set(Proto_Object, DEF = Proto_Object.DEF.replace(robot_Name, save_file_name))
+                # default of the name field, the third field of a urdf2webots PROTO
+                if len(Proto_Object.children) > 2:
+                    name_field = Proto_Object.children[2]
+                    tx.set(name_field, name_field.content.replace(robot_Name, save_file_name))
+        # write next to the target and swap it in: a lazy robot may still be
+        # reading the old file through its memory map
+        tmp_file = save_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            self.write(f)
+        os.replace(tmp_file, save_file)
+
+    # stream the proto text to a file handle / io.TextIOBase in a single traversal
+    def write(self, out):
+        if self._src is not None:
+            # nothing was edited since the file was read
+            _write_source(out, *self._src)
+            return
+        out.write(self.header)
+        if self._source is not None:
+            # lazy nodes are parsed as the traversal reaches them
+            with _paused_gc():
+                _write_tree(out, self.children)
+        else:
+            _write_tree(out, self.children)
 
     # str()
     def __str__(self):
-        s = self.header
-        for child in self.children:
-            s += str(child)
-        return s
+        out = io.StringIO()
+        self.write(out)
+        return out.getvalue()
 
     # repr() -> the thing that is printed when you print the object
     def __repr__(self):
@@ -159,7 +1574,16 @@ class proto_robot:
             dct[child.name] = child.__dict__()
         return dct
 
+# shared children of every leaf property, replaced by a real list on the first add_child()
+_NO_CHILDREN = ()
+
 class structure:
+    # no per-instance __dict__: a big proto holds millions of these
+    __slots__ = ("name", "stage", "parent", "children", "DEF")
+    # True: _write_tree() writes the opening part from the chunks of _iter_text(tab)
+    # instead of _open_line(tab), so it is never held as one string
+    _streamed = False
+
     def __init__(self, name, parent, stage = 0, DEF = None):
         self.name = name
         self.stage = stage
@@ -168,27 +1592,98 @@ class structure:
         self.DEF = DEF
 
     def add_child(self, child):
+        if self.children is _NO_CHILDREN:
+            self.children = []
         self.children.append(child)
+        _touch(self)
+        index = _index_of(self)
+        if index is not None:
+            index.add(child)
+
+    # remove a direct child (and its subtree)
+    def remove_child(self, child):
+        self.children.remove(child)
+        _touch(self)
+        index = _index_of(self)
+        if index is not None:
+            index.remove(child)
+
+    # replace a direct child with another structure
+    def replace_child(self, old_child, new_child):
+        self.children[self.children.index(old_child)] = new_child
+        new_child.parent = self
+        _touch(self)
+        index = _index_of(self)
+        if index is not None:
+            index.remove(old_child)
+            index.add(new_child)
     
     def update(self, new_structure):
+        _touch(self)
+        index = _index_of(self)
+        if index is not None:
+            index.remove(self)
         self.name = new_structure.name
         self.DEF = new_structure.DEF
         self.stage = new_structure.stage
         self.children = new_structure.children
         self.parent = new_structure.parent
+        index = _index_of(self)
+        if index is not None:
+            index.add(self)
     
     # search the structure with the given name
     def search(self, name):
-        result_list = []
-        for child in self.children:
-            if child.name == name:
-                result_list.append(child)
-            result_list += child.search(name)
-        return result_list
+        return list(self.iter_search(name))
+
+    # first structure with the given name in document order, None if there is none
+    def search_first(self, name):
+        return next(self.iter_search(name), None)
+
+    # lazily yield the descendants, see _iter_tree()
+    def iter_nodes(self, predicate = None, max_depth = None, order = "pre"):
+        return _iter_tree(self, predicate, max_depth, order)
+
+    # lazily yield the descendants with the given name
+    def iter_search(self, name, max_depth = None, order = "pre"):
+        return _iter_tree(self, lambda s: s.name == name, max_depth, order)
+
+    # structures matching a selector, see compile_selector(), e.g. "RotationalMotor > maxTorque"
+    def select(self, selector):
+        return list(self.iter_select(selector))
+
+    # first match of a selector, None if there is none
+    def select_first(self, selector):
+        return next(self.iter_select(selector), None)
+
+    # lazily yield the matches of a selector
+    def iter_select(self, selector):
+        return compile_selector(selector).iter(self)
 
     def copy(self):
         return self.__class__(self.name, self.parent, self.DEF, self.stage)
-    
+
+    # Merkle digest of this subtree (16 bytes), see diff()
+    def digest(self):
+        return _subtree_digest(self, _generation_of(self))
+
+    # after editing content / DEF / values directly: drops the cached digests and
+    # source text of this structure and its ancestors, so that they are written again
+    def mark_modified(self):
+        _touch(self)
+
+    # False while the children of a lazily read node are not parsed yet
+    def is_loaded(self):
+        return True
+
+    # stream this structure and its descendants to a file handle / io.TextIOBase
+    def write(self, out):
+        _write_tree(out, [self])
+
+    # the same text as write(), chunk by chunk, for generators that write it themselves
+    def iter_text(self):
+        return _iter_text_chunks([self])
+
     def __str__(self):
         return f"{self.name} {self.attributes} {self.children}"
 
@@ -198,6 +1693,13 @@ class structure:
 class Node(structure):
     # Node class is used to store the node information
     # for parts starts with '{' and ends with '}'
+    # _digest: (generation, subtree digest), see _subtree_digest()
+    # _src: (source text / mmap, start, end) of the unmodified structure in the file it was read from
+    # _nid: id given out by proto_robot.node_id(), weakly referenced by the robot's registry
+    # _owner: proto_robot last found above the node, see _index_of()
+    __slots__ = ("_digest", "_src", "_nid", "_owner", "__weakref__")
+    _kind = "n"                 # tag of the structure in the digests
+
     def __init__(self, name, parent, DEF = None, stage = 0):
         super().__init__(name, parent, stage, DEF)
     
@@ -218,22 +1720,21 @@ class Node(structure):
                     s += str(child)
         return s+ tab + "}\n"
     
-    def __str__(self):
-        tab = "  " * self.stage
-        s = ""
+    # opening / closing line written by _write_tree()
+    def _open_line(self, tab):
         if self.name == "":
-            s = tab + "{\n"
-            for child in self.children:
-                s += str(child)
-        else:
-            s += tab + f"{self.name}"
-            if self.DEF:
-                s += f" {self.DEF}"+ "\n"
-            else:
-                s += " {\n"
-            for child in self.children:
-                s += str(child)
-        return s + tab + "}\n"
+            return tab + "{\n"
+        if self.DEF:
+            return f"{tab}{self.name} {self.DEF}\n"
+        return f"{tab}{self.name} {{\n"
+
+    def _close_line(self, tab):
+        return tab + "}\n"
+    
+    def __str__(self):
+        out = io.StringIO()
+        self.write(out)
+        return out.getvalue()
     
     def __dict__(self):
         dct = {"DEF":self.DEF.replace("{","") if self.DEF else None}
@@ -245,8 +1746,11 @@ class Node(structure):
 class property(structure):
     # property class is used to store the property information
     # usually contains only one line
+    __slots__ = ("content",)
+
     def __init__(self, name, parent, stage = 0, content = ""):
         super().__init__(name, parent, stage, DEF = None)
+        self.children = _NO_CHILDREN
         self.content = content
 
     def get_self_only(self):
@@ -256,10 +1760,18 @@ class property(structure):
         super().update(new_property)
         self.content = new_property.content
 
+    # leaf: the digest of its own line, not cached
+    def digest(self):
+        return hashlib.blake2b(_own_text(self).encode('utf-8'), digest_size=16).digest()
+
+    def _open_line(self, tab):
+        return _property_line(self, tab)
+
+    def _close_line(self, tab):
+        return ""
+
     def __str__(self):
-        tab = "  " * self.stage
-        s = tab + f"{self.name} {self.content}"+"\n"
-        return s
+        return self._open_line(_indent(self.stage))
     def __dict__(self):
         return {self.name: self.content, "structure_type": "property"}
     
@@ -269,6 +1781,9 @@ class property(structure):
 class container(structure):
     # container class is used to store the container information
     # for parts starts with '[' and ends with ']'
+    __slots__ = ("_digest", "_src", "_nid", "_owner", "__weakref__")
+    _kind = "c"
+
     def __init__(self, name, parent, DEF = None, stage = 0):
         super().__init__(name, parent, stage, DEF)
 
@@ -281,13 +1796,16 @@ class container(structure):
                 s += str(child)
         return s + tab + "]\n"
     
+    def _open_line(self, tab):
+        return f"{tab}{self.name} {self.DEF}\n"
+
+    def _close_line(self, tab):
+        return tab + "]\n"
+
     def __str__(self):
-        tab = "  " * self.stage
-        s = ""
-        s += tab + f"{self.name} " + self.DEF + "\n"
-        for child in self.children:
-            s += str(child)
-        return s + tab + "]\n"
+        out = io.StringIO()
+        self.write(out)
+        return out.getvalue()
     
     def __dict__(self):
         dct = {"DEF":self.DEF.replace("[","")}
@@ -296,6 +1814,73 @@ class container(structure):
         dct["structure_type"] = "container"
         return dct
 
+class array_field(container):
+    # numeric field ("point [", "coordIndex [", ...) held as one NumPy array of
+    # shape (rows, columns), a row per line of the file, instead of a property per line
+    __slots__ = ("values", "row_format")
+    _kind = "a"
+    _streamed = True
+
+    def __init__(self, name, parent, DEF = "[", stage = 0, values = None, row_format = "%.15g %.15g %.15g"):
+        super().__init__(name, parent, DEF, stage)
+        self.children = _NO_CHILDREN
+        self.values = values
+        self.row_format = row_format    # printf format of one row, e.g. "%.4f %.4f %.4f" or "%d, %d, %d, %d"
+
+    def get_self_only(self):
+        return str(self)
+
+    # the rows are written with the opening line, there are no children
+    def _open_line(self, tab):
+        return "".join(self._iter_text(tab))
+
+    def _iter_text(self, tab):
+        yield f"{tab}{self.name} {self.DEF}\n"
+        yield from _iter_format_rows(self.values, self.row_format, _indent(self.stage + 1))
+
+    def copy(self):
+        return self.__class__(self.name, self.parent, self.DEF, self.stage, self.values.copy(), self.row_format)
+
+    def __dict__(self):
+        return {"DEF": self.DEF.replace("[", ""), "values": self.values.tolist(), "structure_type": "array"}
+
+# ================== Lazy structures ==================
+# slot descriptor holding the real children list of every structure
+_children_slot = structure.children
+
+def _get_lazy_children(self):
+    span = self._span
+    if span is not None:
+        # first access: parse the body from the memory-mapped file
+        self._span = None
+        _children_slot.__set__(self, [])
+        source, start, end = span
+        source.load_children(self, start, end, self.stage)
+    return _children_slot.__get__(self)
+
+def _set_lazy_children(self, children):
+    self._span = None
+    _children_slot.__set__(self, children)
+
+_lazy_children = builtins.property(_get_lazy_children, _set_lazy_children)
+
+class LazyNode(Node):
+    # Node read by proto_robot(lazy = True), children are parsed on first access
+    __slots__ = ("_span",)     # (_lazy_source, body start, body end) until loaded, then None
+    children = _lazy_children
+
+    # True once the children have been parsed
+    def is_loaded(self):
+        return self._span is None
+
+class lazy_container(container):
+    # container read by proto_robot(lazy = True), children are parsed on first access
+    __slots__ = ("_span",)
+    children = _lazy_children
+
+    def is_loaded(self):
+        return self._span is None
+
 if __name__ == "__main__":
     # open a file dialog to select the proto file
     Tk().withdraw() # we don't want a full GUI, so keep the root window from appearing
@@ -0,0 +1,388 @@
+"""
+球體近似碰撞模型: 把 boundingObject 的網格換成最多 N 個球, 以 Group 內的 Transform { Sphere } 取代
+
+流程 (只使用 NumPy):
+    1. 體素化 (與 convex_decomposition 相同): 內部體素與表面取樣點
+    2. 中軸取樣: 內部體素到外部的距離場 (可分離的精確歐氏距離轉換),
+       距離為 26 鄰域局部最大值的體素即中軸上的候選球心, 半徑為到最近表面取樣點的距離
+       每個候選球心再以數個倍率放大半徑, 以少量超出網格換取覆蓋率
+    3. 貪婪選球: 每次選 (新覆蓋的內部體素 - overshoot_weight x 超出網格的體素) 最大的候選球,
+       直到球數達到 max_spheres, 覆蓋率達到 coverage, 或沒有正收益的候選球
+    4. 球體樹: 選出的球為葉層, 依最長軸中位數把每層分成最多 branching 個一組,
+       每組以一個包住組內所有球的球為上一層, 直到只剩根球
+寫出的是葉層的球 (Webots 沒有球體樹節點, 較粗的層寫出來也會參與碰撞), 各層在 sphere_fit.levels。
+以體素估計兩個指標 (相對於網格體積):
+    覆蓋率 coverage   被球覆蓋的內部體積
+    超出 overshoot    球超出網格的體積
+寫出:
+    boundingObject Group {
+      children [
+        Transform {
+          translation ...
+          children [
+            Sphere { radius ... }
+          ]
+        }
+      ]
+    }
+各 STL 以行程池計算, 結果可存入 ifs_cache (以 STL 內容雜湊與參數為鍵)。
+
+用法:
+    python -m urdf_converter.core.sphere_tree robot.proto [max_spheres]
+或在 main.py 設定 URDF_CONVERTER_COLLISION=spheres, 於換成 collision 網格之前執行
+"""
+import os
+import sys
+import argparse
+import functools
+from collections import namedtuple
+
+import numpy as np
+
+from urdf_converter.core import proto_parser as proto
+from urdf_converter.core.stl_reader import read_stl
+from urdf_converter.core.convert_collision_to_ifs import map_stl_files
+from urdf_converter.core.collision_primitives import (
+    bounding_sites, collision_report, def_is_used, is_closed, link_name, primitive_fit, primitive_node,
+    print_collision_report,
+)
+from urdf_converter.core.convex_decomposition import voxelize
+
+# max_spheres: 每個網格最多的球數
+# resolution: 網格最長邊的體素數
+# coverage: 覆蓋率達到此值即停止加球
+# overshoot_weight: 超出網格的體積在選球時的權重 (越大越不允許超出)
+# branching: 球體樹每個球最多的子球數
+sphere_options = namedtuple("sphere_options", ("max_spheres", "resolution", "coverage", "overshoot_weight", "branching"),
+                            defaults=(16, 32, 0.95, 1.0, 4))
+DEFAULT_OPTIONS = sphere_options()
+
+# kind: 報告中顯示的名稱, centers: (N, 3), radii: (N,), 依選取順序
+# error: 球的聯集體積 / 網格體積 - 1 (= coverage + overshoot - 1)
+# levels: 球體樹由根到葉的 sphere_level, 最後一層即 centers / radii
+sphere_fit = namedtuple("sphere_fit", ("kind", "centers", "radii", "error", "coverage", "overshoot", "levels"))
+
+# 球體樹的一層: centers (K, 3), radii (K,), parents (K,) 為上一層包住它的球的索引 (根為 -1)
+sphere_level = namedtuple("sphere_level", ("centers", "radii", "parents"))
+
+_RADIUS_SCALES = (1.0, 1.25, 1.5)   # 候選球的半徑倍率
+_MAX_CENTERS = 400                  # 候選球心數上限 (均勻抽樣)
+_CHUNK_ELEMENTS = 1 << 22           # 距離矩陣每次計算的元素數 (球心數 x 點數)
+_MAX_COVER_BYTES = 64 << 20         # 候選球覆蓋位元矩陣的上限, 超過時減少候選球心
+# 每個位元組的 1 的個數, 查表計算覆蓋的格點數 (np.bitwise_count 需要 NumPy 2.0)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+# ================== 中軸取樣 ==================
+def distance_field(inside):
+    """
+    每個體素中心到最近外部體素中心的歐氏距離 (體素為單位), 網格外視為外部
+    各軸依序做一維的精確距離轉換 d[i] = min_j (d[j] + (i - j)^2)
+    """
+    d2 = np.where(np.pad(inside, 1), np.inf, 0.0)
+    for axis in range(3):
+        d2 = np.moveaxis(d2, axis, -1)
+        n = d2.shape[-1]
+        offsets = (np.arange(n)[:, None] - np.arange(n)[None, :]) ** 2.0
+        d2 = np.stack([(d2 + offsets[i]).min(axis=-1) for i in range(n)], axis=-1)
+        d2 = np.moveaxis(d2, -1, axis)
+    return np.sqrt(d2)[1:-1, 1:-1, 1:-1]
+
+def medial_voxels(inside, distance):
+    """
+    距離為 26 鄰域局部最大值的內部體素索引 (K, 3), 依距離由大到小
+    """
+    padded = np.pad(distance, 1)
+    nx, ny, nz = distance.shape
+    neighbours = np.zeros_like(distance)
+    for dx in range(3):
+        for dy in range(3):
+            for dz in range(3):
+                if (dx, dy, dz) != (1, 1, 1):
+                    np.maximum(neighbours, padded[dx:dx + nx, dy:dy + ny, dz:dz + nz], out=neighbours)
+    medial = np.argwhere(inside & (distance >= neighbours))
+    return medial[np.argsort(-distance[tuple(medial.T)], kind="stable")]
+
+def _chunk_rows(columns):
+    """
+    距離矩陣每批的列數, 每批最多 _CHUNK_ELEMENTS 個元素
+    """
+    return max(1, _CHUNK_ELEMENTS // max(columns, 1))
+
+def _nearest_distance(points, targets):
+    """
+    每個 point 到最近 target 的距離 (分批計算距離矩陣)
+    """
+    result = np.empty(len(points))
+    targets_sq = (targets ** 2).sum(axis=1)
+    step = _chunk_rows(len(targets))
+    for start in range(0, len(points), step):
+        chunk = points[start:start + step]
+        d2 = (chunk ** 2).sum(axis=1)[:, None] + targets_sq[None, :] - 2.0 * chunk @ targets.T
+        result[start:start + step] = np.sqrt(np.maximum(d2.min(axis=1), 0.0))
+    return result
+
+
+# ================== 球體樹 ==================
+def _split(centers, size):
+    """
+    球心依最長軸的中位數遞迴二分, 直到每組最多 size 個, 回傳各組的索引
+    """
+    groups = []
+    stack = [np.arange(len(centers))]
+    while stack:
+        indices = stack.pop()
+        if len(indices) <= size:
+            groups.append(indices)
+            continue
+        points = centers[indices]
+        axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+        indices = indices[np.argsort(points[:, axis], kind="stable")]
+        half = len(indices) // 2
+        stack.extend((indices[half:], indices[:half]))
+    return groups
+
+def bounding_sphere(centers, radii):
+    """
+    包住所有球的球 (center, radius): 球心為各球包圍盒的中心
+    """
+    center = ((centers - radii[:, None]).min(axis=0) + (centers + radii[:, None]).max(axis=0)) / 2.0
+    return center, float((np.linalg.norm(centers - center, axis=1) + radii).max())
+
+def sphere_levels(centers, radii, branching=DEFAULT_OPTIONS.branching):
+    """
+    以 centers / radii 為葉層建立球體樹, 回傳由根到葉的 sphere_level 列表;
+    每個球包住它在下一層的子球 (因此也包住其下所有的葉球)
+    """
+    levels = []
+    parents = np.full(len(radii), -1, dtype=np.int64)
+    while True:
+        levels.append(sphere_level(centers, radii, parents))
+        if len(radii) <= 1:
+            break
+        groups = _split(centers, max(branching, 2))
+        spheres = [bounding_sphere(centers[group], radii[group]) for group in groups]
+        for index, group in enumerate(groups):
+            parents[group] = index
+        centers = np.array([center for center, _ in spheres])
+        radii = np.array([radius for _, radius in spheres])
+        parents = np.full(len(radii), -1, dtype=np.int64)
+    return levels[::-1]
+
+
+# ================== 選球 ==================
+def _iter_covered(centers, radii, grid_points):
+    """
+    分批產生 (start, (k, len(grid_points)) bool): 第 start 起的 k 個球各包含哪些格點,
+    不會同時持有整個 (球數, 格點數) 矩陣
+    """
+    grid_sq = (grid_points ** 2).sum(axis=1)
+    step = _chunk_rows(len(grid_points))
+    for start in range(0, len(centers), step):
+        chunk = centers[start:start + step]
+        d2 = (chunk ** 2).sum(axis=1)[:, None] + grid_sq[None, :] - 2.0 * chunk @ grid_points.T
+        yield start, d2 <= radii[start:start + step, None] ** 2
+
+def _gains(covers, uncovered):
+    """
+    每個候選球 (covers 的一列, packbits 後的位元) 包含的未覆蓋內部格點數, 分批計算
+    """
+    gains = np.empty(len(covers))
+    step = _chunk_rows(covers.shape[1])
+    for start in range(0, len(covers), step):
+        gains[start:start + step] = _POPCOUNT[covers[start:start + step] & uncovered].sum(axis=1)
+    return gains
+
+def _kind(count, coverage, overshoot):
+    return f"Group ({count} 球, 覆蓋 {coverage:.0%}, 超出 {overshoot:.0%})"
+
+def fit_spheres(vertices, faces, options=DEFAULT_OPTIONS):
+    """
+    封閉網格的球體近似, 回傳 sphere_fit; 網格未封閉或沒有內部體素時回傳 None
+    """
+    if not len(faces) or not is_closed(faces):
+        return None
+    lo, pitch, inside, samples = voxelize(vertices, faces, options.resolution)
+    if not inside.any():
+        return None
+    distance = distance_field(inside)
+    medial = medial_voxels(inside, distance)
+    # 候選球各以一列位元記錄覆蓋的內部格點, 位元矩陣不超過 _MAX_COVER_BYTES
+    total = int(inside.sum())
+    max_centers = max(1, min(_MAX_CENTERS, _MAX_COVER_BYTES // (len(_RADIUS_SCALES) * ((total + 7) // 8))))
+    if len(medial) > max_centers:
+        medial = medial[np.sort(np.linspace(0, len(medial) - 1, max_centers).astype(np.int64))]
+    centers = lo + (medial + 0.5) * pitch
+    radii = _nearest_distance(centers, samples)
+
+    # 格點: 體素網格向外擴充到最大候選球可超出的範圍
+    pad = int(np.ceil((max(_RADIUS_SCALES) - 1.0) * radii.max() / pitch)) + 1
+    grid_inside = np.pad(inside, pad).ravel()
+    grid_points = lo + (np.argwhere(np.ones(np.array(inside.shape) + 2 * pad, dtype=bool)) - pad + 0.5) * pitch
+
+    scales = np.repeat(np.array(_RADIUS_SCALES)[None, :], len(centers), axis=0).ravel()
+    candidate_centers = np.repeat(centers, len(_RADIUS_SCALES), axis=0)
+    candidate_radii = np.repeat(radii, len(_RADIUS_SCALES)) * scales
+    covers = np.empty((len(candidate_centers), (total + 7) // 8), dtype=np.uint8)
+    penalty = np.empty(len(candidate_centers))
+    for start, block in _iter_covered(candidate_centers, candidate_radii, grid_points):
+        covers[start:start + len(block)] = np.packbits(block[:, grid_inside], axis=1)
+        penalty[start:start + len(block)] = options.overshoot_weight * (block & ~grid_inside).sum(axis=1)
+
+    uncovered = np.packbits(np.ones(total, dtype=bool))
+    remaining = total
+    chosen = []
+    while len(chosen) < options.max_spheres and remaining > (1.0 - options.coverage) * total:
+        gain = _gains(covers, uncovered) - penalty
+        best = int(np.argmax(gain))
+        if gain[best] <= 0:
+            break
+        chosen.append(best)
+        uncovered &= ~covers[best]
+        remaining = int(_POPCOUNT[uncovered].sum())
+    if not chosen:
+        return None
+
+    centers, radii = candidate_centers[chosen], candidate_radii[chosen]
+    union = np.zeros(len(grid_points), dtype=bool)
+    for _, block in _iter_covered(centers, radii, grid_points):
+        union |= block.any(axis=0)
+    coverage = float((union & grid_inside).sum()) / total
+    overshoot = float((union & ~grid_inside).sum()) / total
+    return sphere_fit(_kind(len(chosen), coverage, overshoot), centers, radii,
+                      coverage + overshoot - 1.0, coverage, overshoot,
+                      sphere_levels(centers, radii, options.branching))
+
+def _pack(fit):
+    """
+    sphere_fit -> 可序列化的陣列 (行程池回傳與 ifs_cache 儲存), 各層依序串接
+    """
+    levels = fit.levels
+    return (np.concatenate([level.centers for level in levels]), np.concatenate([level.radii for level in levels]),
+            np.concatenate([level.parents for level in levels]), np.array([len(level.radii) for level in levels]),
+            np.array((fit.coverage, fit.overshoot)))
+
+def _unpack(items):
+    centers, radii, parents, sizes, (coverage, overshoot) = items
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+    levels = [sphere_level(centers[a:b], radii[a:b], parents[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+    coverage, overshoot = float(coverage), float(overshoot)
+    leaves = levels[-1]
+    return sphere_fit(_kind(len(leaves.radii), coverage, overshoot), leaves.centers, leaves.radii,
+                      coverage + overshoot - 1.0, coverage, overshoot, levels)
+
+def fit_stl(stl_path, options=DEFAULT_OPTIONS):
+    """
+    讀取並擬合一個 STL, 回傳 _pack() 的陣列, 失敗為 None (在行程池中執行)
+    """
+    try:
+        vertices, faces = read_stl(stl_path)
+        fit = fit_spheres(vertices, faces, options)
+    except Exception as e:
+        print(f"❌ 球體擬合失敗 {os.path.basename(stl_path)}: {e}")
+        return None
+    if fit is None:
+        print(f"⚠️  {os.path.basename(stl_path)}: 網格未封閉或沒有體積, 無法以球體近似")
+        return None
+    return _pack(fit)
+
+def _cache_params(options):
+    return ("spheres", tuple(options))
+
+def fit_stl_files(stl_paths, workers=None, cache=None, options=DEFAULT_OPTIONS):
+    """
+    以行程池擬合多個 STL (重複的路徑只擬合一次), 回傳 {路徑: sphere_fit, 失敗為 None}
+    cache: 選用的 ifs_cache, 以 STL 內容雜湊與 options 為鍵
+    """
+    convert = functools.partial(fit_stl, options=options)
+    if cache is None:
+        packed = map_stl_files(convert, stl_paths, workers)
+    else:
+        params = _cache_params(options)
+        packed = map_stl_files(convert, stl_paths, workers,
+                               lambda path: cache.get_arrays(path, params),
+                               lambda path, items: cache.put_arrays(path, params, items))
+    return {path: _unpack(items) if items is not None else None for path, items in packed.items()}
+
+
+# ================== proto 改寫 ==================
+def sphere_group_node(fit, name="boundingObject"):
+    """
+    球的 Group 節點: name 為 "boundingObject" 時為 "boundingObject Group {",
+    為 None 時為 children 中的 "Group {"
+    """
+    if name is None:
+        node = proto.Node(name="Group", parent=None, DEF="{")
+    else:
+        node = proto.Node(name=name, parent=None, DEF="Group {")
+    children = proto.container(name="children", parent=node, DEF="[", stage=1)
+    for center, radius in zip(fit.centers, fit.radii):
+        sphere = primitive_fit("Sphere", center, np.eye(3), (radius,), 4.0 / 3.0 * np.pi * radius ** 3, 0.0)
+        transform = primitive_node(sphere, None)
+        transform.parent = children
+        children.add_child(transform)
+    node.add_child(children)
+    return node
+
+def fit_bounding_objects(robot, proto_dir, options=DEFAULT_OPTIONS, workers=None, cache=None):
+    """
+    把每個 boundingObject 指向的 STL 換成球的 Group (同一個 STL 只擬合一次)
+    無法擬合或 DEF 被其他 USE 引用的位置保留網格; 回傳 collision_report 列表
+    """
+    sites = bounding_sites(robot, proto_dir)
+    paths = [path for _, _, path in sites if os.path.exists(path)]
+    fits = fit_stl_files(paths, workers, cache, options) if paths else {}
+    report = []
+    with robot.transaction() as tx:
+        for bo, site, path in sites:
+            fit = fits.get(path)
+            replaced = False
+            if not os.path.exists(path):
+                note = "找不到檔案"
+            elif fit is None:
+                note = "無法以球體近似"
+            elif def_is_used(robot, site):
+                note = "DEF 被其他 USE 引用"
+            else:
+                tx.replace(site, sphere_group_node(fit, "boundingObject" if site is bo else None))
+                replaced = True
+                note = None
+            report.append(collision_report(link_name(bo), path, fit, replaced, note))
+    return report
+
+def process_proto_file(proto_file_path, output_path=None, options=DEFAULT_OPTIONS, workers=None, cache=None,
+                       ifs_cache=None):
+    """
+    讀取 proto, 以球體近似取代 boundingObject 的 STL 網格並寫入 output_path
+    (預設為同目錄下的 "copy_" + 檔名), 回傳輸出路徑
+    cache: 選用的 proto_cache, ifs_cache: 選用的擬合結果快取
+    """
+    proto_file_path = os.path.abspath(proto_file_path)
+    if output_path is None:
+        output_path = os.path.join(os.path.dirname(proto_file_path), "copy_" + os.path.basename(proto_file_path))
+    robot = proto.proto_robot(proto_filename=proto_file_path, cache=cache)
+    report = fit_bounding_objects(robot, os.path.dirname(proto_file_path), options, workers, ifs_cache)
+    print_collision_report(report, "球體組合")
+    if robot.search_first("PROTO") is None:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            robot.write(f)
+    else:
+        robot.save_robot(output_path)
+    print(f"✅ 已寫入: {output_path}")
+    return output_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="以球體的 Group 取代 boundingObject 的 STL 網格")
+    parser.add_argument("proto", help="proto 檔案")
+    parser.add_argument("max_spheres", nargs="?", type=int, default=DEFAULT_OPTIONS.max_spheres, help="每個網格最多的球數")
+    parser.add_argument("--resolution", type=int, default=DEFAULT_OPTIONS.resolution, help="網格最長邊的體素數")
+    parser.add_argument("--coverage", type=float, default=DEFAULT_OPTIONS.coverage, help="覆蓋率達到此值即停止加球")
+    parser.add_argument("--overshoot-weight", type=float, default=DEFAULT_OPTIONS.overshoot_weight,
+                        help="超出網格體積的權重")
+    parser.add_argument("--branching", type=int, default=DEFAULT_OPTIONS.branching, help="球體樹每個球最多的子球數")
+    parser.add_argument("--workers", type=int, help="行程數 (預設為 CPU 核心數)")
+    parser.add_argument("--output", help="輸出路徑 (預設 copy_<檔名>)")
+    args = parser.parse_args()
+    options = sphere_options(args.max_spheres, args.resolution, args.coverage, args.overshoot_weight, args.branching)
+    process_proto_file(args.proto, args.output, options, args.workers)
+    sys.exit(0)
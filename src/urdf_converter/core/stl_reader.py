@@ -0,0 +1,152 @@
+"""
+STL reader shared by the IFS converter, the collision mesh decimator and the viewer.
+
+Binary STL is memory-mapped with a structured dtype of its 50-byte records, so the
+triangles are a zero-copy view of the file; ASCII STL is parsed with one regex pass.
+Vertices are then merged with np.unique on a quantised integer view of the corners,
+which gives the same vertices, in the same order, as trimesh.load + merge_vertices.
+
+    count = stl_face_count("link1.STL")        # header only for binary STL
+    vertices, faces = read_stl("link1.STL")    # (N, 3) float64, (M, 3) int64
+"""
+import os
+import re
+import numpy as np
+
+# one binary STL triangle: normal, 3 corners and the attribute byte count (50 bytes, no padding)
+STL_RECORD = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attribute", "<u2"),
+])
+
+_HEADER_BYTES = 80
+_DATA_OFFSET = _HEADER_BYTES + 4    # header + uint32 triangle count
+
+# corners of an ASCII STL: "vertex 1.0 -2.5e-3 0"
+_ASCII_VERTEX = re.compile(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)', re.IGNORECASE)
+_ASCII_FACET_END = b"endfacet"
+
+# digits of vertex positions considered by the merge (trimesh tol.merge = 1e-8)
+MERGE_DIGITS = 8
+
+# odd 64-bit multipliers mixing the 3 integer coordinates into one key
+_HASH_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64)
+
+
+def _binary_count(path):
+    """Triangle count of a binary STL, None if the file is not one"""
+    size = os.path.getsize(path)
+    if size < _DATA_OFFSET:
+        return None
+    with open(path, 'rb') as f:
+        header = f.read(_DATA_OFFSET)
+    count = int(np.frombuffer(header, dtype="<u4", count=1, offset=_HEADER_BYTES)[0])
+    if _DATA_OFFSET + count * STL_RECORD.itemsize == size:
+        return count
+    # many binary headers also start with "solid": when the size does not match either,
+    # it is ASCII if the first facet shows up in the text that follows
+    if header.lstrip().lower().startswith(b"solid"):
+        with open(path, 'rb') as f:
+            head = f.read(1024).lower()
+        if b"facet" in head or b"endsolid" in head:
+            return None
+    # truncated file or trailing bytes: keep the complete records
+    return min(count, (size - _DATA_OFFSET) // STL_RECORD.itemsize)
+
+
+def is_binary_stl(path):
+    """True for a binary STL (also when its header starts with "solid"), False for ASCII"""
+    return _binary_count(path) is not None
+
+
+def stl_face_count(path, chunk_bytes=1 << 20):
+    """
+    Number of triangles, read from the header of a binary STL; an ASCII STL is
+    scanned chunk by chunk for "endfacet" without parsing any number.
+    """
+    count = _binary_count(path)
+    if count is not None:
+        return count
+    count = 0
+    overlap = len(_ASCII_FACET_END) - 1
+    tail = b""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                return count
+            block = tail + chunk.lower()
+            count += block.count(_ASCII_FACET_END)
+            # keep the end of the block in case "endfacet" spans two chunks, without counting it twice
+            tail = block[-overlap:]
+
+
+def read_stl_records(path):
+    """
+    Binary STL records as a read-only memory map of STL_RECORD, None for an ASCII STL.
+    Fields are zero-copy views: records["vertices"] is (M, 3, 3) float32.
+    """
+    count = _binary_count(path)
+    if count is None:
+        return None
+    if count == 0:
+        return np.zeros(0, dtype=STL_RECORD)
+    return np.memmap(path, dtype=STL_RECORD, mode='r', offset=_DATA_OFFSET, shape=(count,))
+
+
+def read_stl_triangles(path):
+    """
+    Triangle corners (M, 3, 3): a zero-copy float32 view of a binary STL,
+    float64 parsed from the text of an ASCII STL.
+    """
+    records = read_stl_records(path)
+    if records is not None:
+        return records["vertices"]
+    with open(path, 'rb') as f:
+        corners = _ASCII_VERTEX.findall(f.read())
+    if len(corners) % 3:
+        raise ValueError(f"{path}: ASCII STL with {len(corners)} vertices, not a multiple of 3")
+    return np.array(corners, dtype=np.float64).reshape(-1, 3, 3)
+
+
+def _hash_rows(keys):
+    """uint64 hash of every row of an (N, 3) int64 array (wrapping arithmetic)"""
+    rows = keys.astype(np.uint64)
+    h = ((rows[:, 0] * _HASH_MULTIPLIERS[0] + rows[:, 1]) * _HASH_MULTIPLIERS[1] + rows[:, 2]) * _HASH_MULTIPLIERS[2]
+    return h ^ (h >> np.uint64(29))
+
+
+def merge_triangle_vertices(triangles, digits=MERGE_DIGITS):
+    """
+    Shared vertices of a triangle soup (M, 3, 3), returns (vertices (N, 3) float64, faces (M, 3) int64).
+    Corners equal after rounding to digits decimals are merged; every group keeps the
+    position of its first corner and groups are numbered in order of first use.
+    Triangles with non-finite corners are dropped.
+    """
+    triangles = np.asarray(triangles)
+    finite = np.isfinite(triangles).all(axis=(1, 2))
+    if not finite.all():
+        triangles = triangles[finite]
+    corners = triangles.reshape(-1, 3).astype(np.float64)
+    if not len(corners):
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+
+    # quantised view: the integer coordinates hashed into one uint64 per corner, so that
+    # np.unique sorts a flat array; on a hash collision, unique on the raw 24-byte keys
+    keys = np.ascontiguousarray(np.round(corners * 10.0 ** digits).astype(np.int64))
+    _, first, inverse = np.unique(_hash_rows(keys), return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    if not np.array_equal(keys[first][inverse], keys):
+        _, first, inverse = np.unique(keys.view(np.dtype((np.void, keys.itemsize * 3))).ravel(),
+                                      return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+    order = np.argsort(first)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[order] = np.arange(len(first))
+    return corners[first[order]], rank[inverse].reshape(-1, 3)
+
+
+def read_stl(path, digits=MERGE_DIGITS):
+    """Vertices (N, 3) float64 and faces (M, 3) int64 of a binary or ASCII STL, vertices merged"""
+    return merge_triangle_vertices(read_stl_triangles(path), digits)
@@ -5,8 +5,13 @@ import json
 import shutil
 import subprocess
 from urdf_converter.core import proto_parser as proto
+from urdf_converter.core.proto_cache import proto_cache
+from urdf_converter.core.ifs_cache import ifs_cache
 from urdf_converter.utils import stl_tool
 from urdf_converter.core import convert_collision_to_ifs
+from urdf_converter.core import collision_primitives
+from urdf_converter.core import convex_decomposition
+from urdf_converter.core import sphere_tree
 from urdf_converter.ui.ui_picker import zenity_select_folder, zenity_select_file, zenity_select_path, zenity_select_multiple_files, zenity_select_multiple_folders
 
 Folder_Object = {'Dir': {}, 'File': []}
@@ -97,84 +102,99 @@ with open(proto_Filename, 'w', encoding='utf-8') as file:
     file.writelines(datas)
 
 # ================== 載入 Proto Robot ==================
-proto_bot = proto.proto_robot(proto_filename = proto_Filename)
+# 選用的解析快取 (設定 URDF_CONVERTER_PROTO_CACHE 才會啟用)
+parse_cache = proto_cache.from_env()
+proto_bot = proto.proto_robot(proto_filename = proto_Filename, cache = parse_cache)
+# 選用的 IFS 快取 (設定 URDF_CONVERTER_IFS_CACHE 才會啟用), 未變更的 STL 不再重新轉換 / 分解
+mesh_cache = ifs_cache.from_env()
+
+# ================== 基本形狀碰撞模型 (選用) ==================
+# 設定 URDF_CONVERTER_COLLISION=primitive 才會啟用: 體積誤差夠小的 boundingObject 改為
+# Transform { children [ Box / Cylinder / Capsule / Sphere ] }, 其餘仍由下方換成 collision 網格
+if os.environ.get(collision_primitives.COLLISION_ENV) == "primitive":
+    print("--- 以基本形狀擬合 boundingObject ---")
+    primitive_report = collision_primitives.fit_bounding_objects(proto_bot, os.path.dirname(proto_Filename))
+    collision_primitives.print_collision_report(primitive_report)
+
+# ================== 凸分解碰撞模型 (選用) ==================
+# 設定 URDF_CONVERTER_COLLISION=convex 才會啟用: boundingObject 的網格改為
+# Group { children [ IndexedFaceSet (凸包) ... ] }, 無法分解的仍由下方換成 collision 網格
+if os.environ.get(collision_primitives.COLLISION_ENV) == "convex":
+    print("--- 以凸分解取代 boundingObject ---")
+    convex_report = convex_decomposition.decompose_bounding_objects(proto_bot, os.path.dirname(proto_Filename), cache = mesh_cache)
+    collision_primitives.print_collision_report(convex_report, "凸包組合")
+
+# ================== 球體碰撞模型 (選用) ==================
+# 設定 URDF_CONVERTER_COLLISION=spheres 才會啟用: boundingObject 的網格改為
+# Group { children [ Transform { Sphere } ... ] }, 無法擬合的仍由下方換成 collision 網格
+if os.environ.get(collision_primitives.COLLISION_ENV) == "spheres":
+    print("--- 以球體近似取代 boundingObject ---")
+    sphere_report = sphere_tree.fit_bounding_objects(proto_bot, os.path.dirname(proto_Filename), cache = mesh_cache)
+    collision_primitives.print_collision_report(sphere_report, "球體組合")
 
 # ================== 自動替換 Collision Mesh (修正版) ==================
 print("--- 開始替換物理碰撞模型 ---")
 
-# 1. [建立對照表] 找出所有視覺模型的 DEF 名稱對應的 STL 路徑
-#    例如: { "Base": "package:/.../Base.STL", "L_Motor": "..." }
-geometry_nodes = proto_bot.search("geometry")
-def_map = {}
-
-for geo in geometry_nodes:
-    # 檢查這個 geometry 是否有定義 DEF (例如: "DEF Base Mesh")
-    if geo.DEF and "DEF" in geo.DEF:
-        # 解析 DEF 字串，取出名字 (例如 "Base")
-        parts = geo.DEF.split()
-        if len(parts) >= 2:
-            def_name = parts[1] # 取得中間的名字
-            
-            # 找出裡面的 url
-            url_props = geo.search("url")
-            if url_props:
-                # 儲存到對照表
-                def_map[def_name] = url_props[0].content
-                # print(f"Found visual def: {def_name} -> {def_map[def_name]}")
+# 1. [DEF/USE 符號表] proto_bot 維護 DEF 名稱 -> 節點 以及 DEF -> USE 位置 的對照表,
+#    例如 "boundingObject USE Base" 可直接解析到 "geometry DEF Base Mesh { url ... }"
 
 # 2. [執行替換] 找出 boundingObject 並替換掉 USE 引用
-bounding_objects = proto_bot.search("boundingObject")
+bounding_objects = proto_bot.find_by_name("boundingObject")
+url_edits = proto_bot.transaction()     # url 修改在迴圈結束後一次套用
 
 for bo in bounding_objects:
     # 狀況 A: boundingObject 是一個 property (例如: boundingObject USE Base)
     if isinstance(bo, proto.property):
-        if "USE" in bo.content:
+        # 被引用的視覺模型 (例如 "geometry DEF Base Mesh {"), 不是 USE 則為 None
+        geo = proto_bot.resolve_use(bo)
+        if geo is not None and geo.name != "geometry":
+            # 引用整個 Shape (例如 "DEF Base Shape {"): 取其 geometry
+            geo = geo.select_first("> geometry")
+        url_prop = geo.search_first("url") if geo is not None else None
+        if url_prop is None and bo.content.startswith("USE"):
+            print(f"  [略過] boundingObject {bo.content}: 找不到引用的視覺網格 url")
+        if url_prop:
             # 取出被引用的名稱 (例如 "Base")
-            used_def_name = bo.content.replace("USE", "").strip()
+            used_def_name = bo.content.split()[-1]
+            original_url = url_prop.content
             
-            # 如果這個名稱在我們的對照表裡，代表它是引用視覺模型
-            if used_def_name in def_map:
-                original_url = def_map[used_def_name]
-                
-                # 產生 collision 檔名 (不分大小寫替換)
-                # 保持原始檔案的大小寫格式
-                if ".STL" in original_url:
-                    collision_url = original_url.replace(".STL", "_collision.STL")
-                elif ".stl" in original_url:
-                    collision_url = original_url.replace(".stl", "_collision.stl")
-                else:  # .Stl or other variations
-                    collision_url = original_url[:-4] + "_collision" + original_url[-4:]
-                
-                # 建構一個全新的 Mesh Node 來取代原本的 USE property
-                # 目標結構: 
-                # boundingObject Mesh {
-                #   url "..."
-                # }
-                
-                # 建立 Node: name="boundingObject", DEF="Mesh" (這樣會印出 "boundingObject Mesh {")
-                new_node = proto.Node(name="boundingObject", parent=bo.parent, DEF="Mesh {", stage=bo.stage)
-                
-                # 建立 url property
-                # 注意：這裡加上引號 " "
-                if not collision_url.startswith('"'):
-                    collision_url = f'"{collision_url}"'
-                    
-                new_url_prop = proto.property(name="url", parent=new_node, content=collision_url, stage=bo.stage + 1)
-                new_node.add_child(new_url_prop)
+            # 產生 collision 檔名 (不分大小寫替換)
+            # 保持原始檔案的大小寫格式
+            if ".STL" in original_url:
+                collision_url = original_url.replace(".STL", "_collision.STL")
+            elif ".stl" in original_url:
+                collision_url = original_url.replace(".stl", "_collision.stl")
+            else:  # .Stl or other variations
+                collision_url = original_url[:-4] + "_collision" + original_url[-4:]
+            
+            # 建構一個全新的 Mesh Node 來取代原本的 USE property
+            # 目標結構: 
+            # boundingObject Mesh {
+            #   url "..."
+            # }
+            
+            # 建立 Node: name="boundingObject", DEF="Mesh" (這樣會印出 "boundingObject Mesh {")
+            new_node = proto.Node(name="boundingObject", parent=bo.parent, DEF="Mesh {", stage=bo.stage)
+            
+            # 建立 url property
+            # 注意：這裡加上引號 " "
+            if not collision_url.startswith('"'):
+                collision_url = f'"{collision_url}"'
                 
-                # 關鍵步驟：在父節點的 children 列表中，把舊的 property 換成新的 Node
-                parent_node = bo.parent
-                if bo in parent_node.children:
-                    idx = parent_node.children.index(bo)
-                    parent_node.children[idx] = new_node
-                    print(f"  [成功] 替換 USE {used_def_name} -> 使用獨立 collision 檔")
+            new_url_prop = proto.property(name="url", parent=new_node, content=collision_url, stage=bo.stage + 1)
+            new_node.add_child(new_url_prop)
+            
+            # 關鍵步驟：在父節點的 children 列表中，把舊的 property 換成新的 Node
+            parent_node = bo.parent
+            if bo in parent_node.children:
+                parent_node.replace_child(bo, new_node)
+                print(f"  [成功] 替換 USE {used_def_name} -> 使用獨立 collision 檔")
 
     # 狀況 B: boundingObject 本身已經是 Node (直接定義 Mesh)
     elif isinstance(bo, proto.Node):
         # 這是您原本邏輯適用的情況，保留以防萬一
-        url_props = bo.search("url")
-        if url_props:
-            url_prop = url_props[0]
+        url_prop = bo.search_first("url")
+        if url_prop:
             original_url = url_prop.content
             if "_collision" not in original_url.lower() and (".stl" in original_url.lower()):
                  # 保持原始檔案的大小寫格式
@@ -184,16 +204,18 @@ for bo in bounding_objects:
                      new_url = original_url.replace(".stl", "_collision.stl")
                  else:  # .Stl or other variations
                      new_url = original_url[:-4] + "_collision" + original_url[-4:]
-                 url_prop.content = new_url
+                 url_edits.set(url_prop, new_url)
                  print(f"  [成功] 更新 Mesh URL: {os.path.basename(original_url)} -> collision")
+url_edits.commit()
 
 # ================== 結束替換 ==================
 print("--- 碰撞模型替換完成 ---")
 
 # ================== Solid Reference ==================
-l = proto_bot.search("endPoint")
+l = proto_bot.find_by_name("endPoint")
 
-# search empty solid and remove some properties
+# search empty solid and remove some properties, the edits are applied together at the end
+tx = proto_bot.transaction()
 for i in l:
     Reference_Template = proto.Node(name = "endPoint", parent = None, DEF = "SolidReference {")
     
@@ -204,43 +226,38 @@ for i in l:
     ## }
     ## ==========================================
     
-    n = i.search("name") #search for name property
+    n = i.search_first("name") #search for name property
     name = ""
     
-    if len(n) >= 1: #if name property is found
-        name = n[0].content #get the name
+    if n: #if name property is found
+        name = n.content #get the name
     
     # check if the node is a solid and empty
     if "Solid" in i.DEF and "Empty" in name:
-        name_object = i.search("name")
-        if len(name_object) >= 1:
-            name_object = name_object[0].content
-        else:
-            name_object = None
+        name_object = i.search_first("name")
+        if name_object:
+            name_object = name_object.content
         
         if name_object and ("Ref" not in name_object):
             # print
-            i.DEF = "SolidReference {"
-            i.children = []
-            i.add_child(proto.property(name = "solidName", parent = i, content = name_object[:-1:]+"_Ref\"", stage = i.stage+1))
+            tx.set(i, DEF = "SolidReference {")
+            for child in i.children:
+                tx.delete(child)
+            tx.insert(i, proto.property(name = "solidName", parent = i, content = name_object[:-1:]+"_Ref\"", stage = i.stage+1))
+tx.commit()
 
 # ================== Motor Torque Setting ==================
-l = proto_bot.search("RotationalMotor")     # search for RotationalMotor node
-
-for i in l:
-    t = i.search("maxTorque")
-    Reference_Template = proto.property(name = "maxTorque", parent = t[0].parent, content = "0.001", stage = t[0].stage)
-    if t[0].stage >6:
-        temp = i
-        proto_bot.set_current(t[0])
-        proto_bot.cursor.update(Reference_Template)   # replace the maxTorque property with the Reference_Template
-        proto_bot.set_current(temp)
-    # t = i.search("maxTorque")   
-    # print("content: ",t[0],"\tstage: ",t[0].stage, "\tparent name: ",t[0].parent.search("name")[0])
+# maxTorque of every RotationalMotor, in a single traversal and a single index update
+with proto_bot.transaction() as tx:
+    tx.set_all("RotationalMotor > maxTorque", "0.001", where = lambda t: t.stage > 6)
 
 # save the proto file
 proto_bot.save_robot(proto_Filename)
 
 # 在儲存後，建立副本並將所有 STL Mesh 轉為 IndexedFaceSet
-copy_proto_file = convert_collision_to_ifs.process_proto_file(proto_Filename)
-print(f"--- IFS 轉換完成，輸出副本: {copy_proto_file} ---")
\ No newline at end of file
+copy_proto_file = convert_collision_to_ifs.process_proto_file(proto_Filename, cache = parse_cache, ifs_cache = mesh_cache)
+print(f"--- IFS 轉換完成，輸出副本: {copy_proto_file} ---")
+if parse_cache:
+    print(f"--- 解析快取: {parse_cache.stats()} ---")
+if mesh_cache:
+    print(f"--- IFS 快取: {mesh_cache.stats()} ---")
\ No newline at end of file
@@ -7,11 +7,15 @@ A hierarchical editor for Webots proto files with tree view and property inspect
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, Menu
 from urdf_converter.core import proto_parser as proto
+from urdf_converter.core.proto_cache import proto_cache
 import os
 import subprocess
 from urdf_converter.utils import stl_tool
 
 class ProtoEditorUI:
+    # files at least this big are opened lazily (memory-mapped, nodes parsed on expand)
+    LAZY_LOAD_BYTES = 32 * 1024 * 1024
+
     def __init__(self, root):
         self.root = root
         self.root.title("Proto File Editor")
@@ -30,8 +34,15 @@ class ProtoEditorUI:
         # Current proto robot
         self.proto_robot = None
         self.current_file = None
-        self.selected_item = None
+        self.selected_id = None     # proto_robot.node_id() of the object in the inspector
         self.modified = False
+        # opt-in parse cache ($URDF_CONVERTER_PROTO_CACHE), None when disabled
+        self.parse_cache = proto_cache.from_env()
+        # tree item values hold proto_robot.node_id(): node id -> tree item,
+        # and collapsed items whose children are not inserted yet
+        self.tree_items = {}
+        self.pending_items = {}
+        self.expanded_items = set()
         
         # Setup UI
         self.create_menu()
@@ -129,6 +140,7 @@ class ProtoEditorUI:
         
         # Bind tree selection
         self.tree.bind('<<TreeviewSelect>>', self.on_tree_select)
+        self.tree.bind('<<TreeviewOpen>>', self.on_tree_open)
         
         # Right panel - Inspector
         right_frame = ttk.Frame(main_paned, width=500)
@@ -198,17 +210,23 @@ class ProtoEditorUI:
             self.status_bar.config(text=f"Loading {os.path.basename(filename)}...")
             self.root.update()
             
-            # Parse proto file
-            self.proto_robot = proto.proto_robot(proto_filename=filename)
+            # Parse proto file (big files lazily, only the expanded nodes get parsed)
+            hits = self.parse_cache.hits if self.parse_cache else 0
+            lazy = os.path.getsize(filename) >= self.LAZY_LOAD_BYTES
+            self.proto_robot = proto.proto_robot(proto_filename=filename, cache=self.parse_cache, lazy=lazy)
             self.current_file = filename
             self.modified = False
+            self.selected_id = None
             
             # Update tree
             self.populate_tree()
             
             # Update window title
             self.root.title(f"Proto Editor - {os.path.basename(filename)}")
-            self.status_bar.config(text=f"Loaded: {filename}")
+            note = " (cached)" if self.parse_cache and self.parse_cache.hits > hits else ""
+            if lazy:
+                note = " (lazy)"
+            self.status_bar.config(text=f"Loaded: {filename}{note}")
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load proto file:\n{str(e)}")
@@ -228,17 +246,27 @@ class ProtoEditorUI:
         for item in self.tree.get_children():
             save_expanded_state(item)
             self.tree.delete(item)
+        self.expanded_items = expanded_items
+        self.tree_items = {}
+        self.pending_items = {}
             
         if not self.proto_robot:
             return
             
         # Add root
         root_id = self.tree.insert('', 'end', text='Robot', 
-                                   values=('proto_robot', id(self.proto_robot)),
+                                   values=('proto_robot', self.proto_robot.node_id(self.proto_robot)),
                                    open=True)
+        self.tree_items[0] = root_id
         
         # Add children recursively
-        self.add_tree_children(root_id, self.proto_robot.children, expanded_items)
+        self.add_tree_children(root_id, self.proto_robot.children, self.expanded_items)
+        
+        # Node ids survive edits: keep the inspected object selected after a refresh
+        item_id = self.tree_items.get(self.selected_id)
+        if item_id:
+            self.tree.selection_set(item_id)
+            self.tree.see(item_id)
         
     def add_tree_children(self, parent_id, children, expanded_items=None):
         """Recursively add children to tree - Unity-like filtering"""
@@ -330,13 +358,32 @@ class ProtoEditorUI:
                 # Check if this item was previously expanded
                 is_expanded = label in expanded_items
                 
+                node_id = self.proto_robot.node_id(child)
                 item_id = self.tree.insert(parent_id, 'end', text=label,
-                                          values=(type_name, id(child)),
+                                          values=(type_name, node_id),
                                           open=is_expanded)
+                self.tree_items[node_id] = item_id
                 
-                # Add children recursively if any
+                # Add children recursively if any, collapsed items get a placeholder
+                # and are filled in on_tree_open() (keeps lazily read files unparsed)
                 if has_children:
-                    self.add_tree_children(item_id, child.children, expanded_items)
+                    if is_expanded:
+                        self.add_tree_children(item_id, child.children, expanded_items)
+                    else:
+                        self.tree.insert(item_id, 'end', text="...")
+                        self.pending_items[item_id] = child
+                
+    def on_tree_open(self, event):
+        """Insert the children of an item the first time it is expanded"""
+        self.load_tree_item(self.tree.focus())
+        
+    def load_tree_item(self, item_id):
+        """Replace the placeholder of a collapsed item with its children"""
+        node = self.pending_items.pop(item_id, None)
+        if node is None:
+            return
+        self.tree.delete(*self.tree.get_children(item_id))
+        self.add_tree_children(item_id, node.children, self.expanded_items)
                 
     def on_tree_select(self, event):
         """Handle tree item selection"""
@@ -350,26 +397,22 @@ class ProtoEditorUI:
         if not values:
             return
             
-        obj_id = int(values[1])
+        node_id = int(values[1])
+        if node_id == self.selected_id:
+            return      # reselected after populate_tree(), the inspector is up to date
         
-        # Find the actual object
-        obj = self.find_object_by_id(self.proto_robot, obj_id)
+        # Find the actual object (O(1) through the robot's node id registry)
+        obj = self.find_object_by_id(node_id)
         
-        if obj:
-            self.selected_item = obj
+        if obj is not None:
+            self.selected_id = node_id
             self.show_inspector(obj)
             
-    def find_object_by_id(self, root, obj_id):
-        """Find object in tree by id"""
-        if id(root) == obj_id:
-            return root
-            
-        if hasattr(root, 'children'):
-            for child in root.children:
-                result = self.find_object_by_id(child, obj_id)
-                if result:
-                    return result
-        return None
+    def find_object_by_id(self, node_id):
+        """Find object in tree by node id"""
+        if not self.proto_robot:
+            return None
+        return self.proto_robot.node_by_id(node_id)
         
     def show_empty_inspector(self):
         """Show empty inspector state"""
@@ -738,7 +781,13 @@ class ProtoEditorUI:
         
     def update_property(self, obj, attr_name, value):
         """Update object property and mark as modified"""
-        setattr(obj, attr_name, value)
+        # <FocusOut> fires on every focus change: an unchanged value must not mark the
+        # structure as edited, or its unmodified lines would be formatted again on save
+        if getattr(obj, attr_name, None) == value:
+            return
+        # the transaction keeps the search index in step with name / DEF / USE edits
+        with self.proto_robot.transaction() as tx:
+            tx.set(obj, **{attr_name: value})
         self.modified = True
         self.status_bar.config(text="Modified (unsaved changes)")
         
@@ -829,16 +878,8 @@ class ProtoEditorUI:
             messagebox.showwarning("Warning", "No proto file loaded")
             return
         
-        # Find all nodes that have "Mesh" in their DEF
-        meshes = []
-        def find_meshes(node):
-            if hasattr(node, 'DEF') and node.DEF and 'Mesh' in node.DEF:
-                meshes.append(node)
-            if hasattr(node, 'children'):
-                for child in node.children:
-                    find_meshes(child)
-        
-        find_meshes(self.proto_robot)
+        # Find all Mesh nodes (e.g. "geometry DEF base_link Mesh {")
+        meshes = self.proto_robot.find_by_type("Mesh")
         
         result_window = tk.Toplevel(self.root)
         result_window.title(f"Meshes Found: {len(meshes)}")
@@ -861,9 +902,9 @@ class ProtoEditorUI:
             text_widget.insert(tk.END, f"{i}. {def_name}\n")
             
             # Get URL
-            urls = mesh.search("url")
-            if urls:
-                url = urls[0].content.strip('"')
+            url_prop = mesh.search_first("url")
+            if url_prop:
+                url = url_prop.content.strip('"')
                 text_widget.insert(tk.END, f"   URL: {url}\n")
             else:
                 text_widget.insert(tk.END, "   URL: (no url)\n")
@@ -877,24 +918,10 @@ class ProtoEditorUI:
             messagebox.showwarning("Warning", "No proto file loaded")
             return
         
-        # Use both methods to find motors:
-        # 1. Search by name (for nodes like: name="RotationalMotor", DEF="{")
-        motors_by_name = self.proto_robot.search("RotationalMotor")
-        motors_by_name.extend(self.proto_robot.search("LinearMotor"))
-        
-        # 2. Find nodes that have "Motor" in their DEF (for nodes like: name="device", DEF="RotationalMotor {")
-        motors_by_def = []
-        def find_motors(node):
-            if hasattr(node, 'DEF') and node.DEF and 'Motor' in node.DEF and '{' in node.DEF:
-                motors_by_def.append(node)
-            if hasattr(node, 'children'):
-                for child in node.children:
-                    find_motors(child)
-        
-        find_motors(self.proto_robot)
-        
-        # Combine and remove duplicates
-        motors = list({id(m): m for m in motors_by_name + motors_by_def}.values())
+        # The type index covers both forms:
+        # name="RotationalMotor", DEF="{" and name="device", DEF="RotationalMotor {"
+        motors = self.proto_robot.find_by_type("RotationalMotor")
+        motors.extend(self.proto_robot.find_by_type("LinearMotor"))
         
         result_window = tk.Toplevel(self.root)
         result_window.title(f"Motors Found: {len(motors)}")
@@ -916,23 +943,23 @@ class ProtoEditorUI:
             motor_type = motor.DEF.replace("{", "").strip() if motor.DEF else "Motor"
             
             # Get motor name
-            names = motor.search("name")
-            motor_name = names[0].content.strip('"') if names else "(unnamed)"
+            name_prop = motor.search_first("name")
+            motor_name = name_prop.content.strip('"') if name_prop else "(unnamed)"
             
             text_widget.insert(tk.END, f"{i}. {motor_type}: {motor_name}\n")
             
             # Get maxTorque
-            torques = motor.search("maxTorque")
-            if torques:
-                text_widget.insert(tk.END, f"   maxTorque: {torques[0].content}\n")
+            torque = motor.search_first("maxTorque")
+            if torque:
+                text_widget.insert(tk.END, f"   maxTorque: {torque.content}\n")
             
             # Get minPosition and maxPosition if available
-            min_pos = motor.search("minPosition")
-            max_pos = motor.search("maxPosition")
+            min_pos = motor.search_first("minPosition")
+            max_pos = motor.search_first("maxPosition")
             if min_pos:
-                text_widget.insert(tk.END, f"   minPosition: {min_pos[0].content}\n")
+                text_widget.insert(tk.END, f"   minPosition: {min_pos.content}\n")
             if max_pos:
-                text_widget.insert(tk.END, f"   maxPosition: {max_pos[0].content}\n")
+                text_widget.insert(tk.END, f"   maxPosition: {max_pos.content}\n")
             
             text_widget.insert(tk.END, "\n")
         
@@ -954,85 +981,66 @@ class ProtoEditorUI:
         # Find all mesh folders (look for folders named 'meshes' or containing STL files)
         mesh_folders = set()
         
-        # Search for geometry nodes to find mesh paths
-        geometry_nodes = []
-        def find_geometry(node):
-            if hasattr(node, 'name') and node.name == 'geometry':
-                geometry_nodes.append(node)
-            if hasattr(node, 'children'):
-                for child in node.children:
-                    find_geometry(child)
-        
-        find_geometry(self.proto_robot)
-        
-        # Extract mesh folder paths from URLs
-        for geo in geometry_nodes:
-            url_props = geo.search("url")
-            if url_props:
-                url = url_props[0].content.strip('"')
-                if url.startswith("./"):
-                    mesh_path = os.path.join(proto_dir, url[2:])
-                elif not os.path.isabs(url):
-                    mesh_path = os.path.join(proto_dir, url)
-                else:
-                    mesh_path = url
+        # Extract mesh folder paths from the URLs of the geometry nodes
+        for url_prop in self.proto_robot.select("geometry url"):
+            url = url_prop.content.strip('"')
+            if url.startswith("./"):
+                mesh_path = os.path.join(proto_dir, url[2:])
+            elif not os.path.isabs(url):
+                mesh_path = os.path.join(proto_dir, url)
+            else:
+                mesh_path = url
                 
-                if os.path.exists(mesh_path):
-                    mesh_dir = os.path.dirname(mesh_path)
-                    # Add the mesh directory and check parent folders
-                    mesh_folders.add(mesh_dir)
-                    # Also check if there's a parent "meshes" folder
-                    parent = os.path.dirname(mesh_dir)
-                    if os.path.basename(parent).lower() == 'meshes' or 'meshes' in parent.lower():
-                        mesh_folders.add(parent)
+            if os.path.exists(mesh_path):
+                mesh_dir = os.path.dirname(mesh_path)
+                # Add the mesh directory and check parent folders
+                mesh_folders.add(mesh_dir)
+                # Also check if there's a parent "meshes" folder
+                parent = os.path.dirname(mesh_dir)
+                if os.path.basename(parent).lower() == 'meshes' or 'meshes' in parent.lower():
+                    mesh_folders.add(parent)
         
         # Collect meshes that need replacement
         meshes_to_replace = []
         missing_collision_files = []
         
-        bounding_objects = self.proto_robot.search("boundingObject")
-        
-        for bo in bounding_objects:
-            meshes = bo.search("Mesh")
-            for mesh_node in meshes:
-                url_props = mesh_node.search("url")
-                if url_props:
-                    url_prop = url_props[0]
-                    original_url = url_prop.content.strip('"')
+        # url of the Mesh nodes inside boundingObjects, in one traversal
+        for url_prop in self.proto_robot.select("boundingObject [name=Mesh] > url"):
+            original_url = url_prop.content.strip('"')
                     
-                    if ".stl" in original_url.lower() and "_collision" not in original_url.lower():
-                        # Convert relative path to absolute
-                        if original_url.startswith("./"):
-                            mesh_file = os.path.join(proto_dir, original_url[2:])
-                        elif not os.path.isabs(original_url):
-                            mesh_file = os.path.join(proto_dir, original_url)
-                        else:
-                            mesh_file = original_url
+            if ".stl" in original_url.lower() and "_collision" not in original_url.lower():
+                # Convert relative path to absolute
+                if original_url.startswith("./"):
+                    mesh_file = os.path.join(proto_dir, original_url[2:])
+                elif not os.path.isabs(original_url):
+                    mesh_file = os.path.join(proto_dir, original_url)
+                else:
+                    mesh_file = original_url
                         
-                        # Generate collision file path
-                        if ".STL" in original_url:
-                            collision_url = original_url.replace(".STL", "_collision.STL")
-                        elif ".stl" in original_url:
-                            collision_url = original_url.replace(".stl", "_collision.stl")
-                        else:
-                            collision_url = original_url[:-4] + "_collision" + original_url[-4:]
+                # Generate collision file path
+                if ".STL" in original_url:
+                    collision_url = original_url.replace(".STL", "_collision.STL")
+                elif ".stl" in original_url:
+                    collision_url = original_url.replace(".stl", "_collision.stl")
+                else:
+                    collision_url = original_url[:-4] + "_collision" + original_url[-4:]
                         
-                        if collision_url.startswith("./"):
-                            collision_file = os.path.join(proto_dir, collision_url[2:])
-                        elif not os.path.isabs(collision_url):
-                            collision_file = os.path.join(proto_dir, collision_url)
-                        else:
-                            collision_file = collision_url
+                if collision_url.startswith("./"):
+                    collision_file = os.path.join(proto_dir, collision_url[2:])
+                elif not os.path.isabs(collision_url):
+                    collision_file = os.path.join(proto_dir, collision_url)
+                else:
+                    collision_file = collision_url
                         
-                        # Check if collision file exists
-                        if not os.path.exists(collision_file):
-                            if os.path.exists(mesh_file):
-                                missing_collision_files.append(mesh_file)
-                            else:
-                                # Original file doesn't exist, skip
-                                continue
+                # Check if collision file exists
+                if not os.path.exists(collision_file):
+                    if os.path.exists(mesh_file):
+                        missing_collision_files.append(mesh_file)
+                    else:
+                        # Original file doesn't exist, skip
+                        continue
                         
-                        meshes_to_replace.append((url_prop, original_url, collision_url))
+                meshes_to_replace.append((url_prop, original_url, collision_url))
         
         # Generate missing collision meshes
         if missing_collision_files:
@@ -1069,12 +1077,13 @@ class ProtoEditorUI:
         
         # Replace URLs
         count = 0
-        for url_prop, original_url, collision_url in meshes_to_replace:
-            # Add quotes if needed
-            if not collision_url.startswith('"'):
-                collision_url = f'"{collision_url}"'
-            url_prop.content = collision_url
-            count += 1
+        with self.proto_robot.transaction() as tx:
+            for url_prop, original_url, collision_url in meshes_to_replace:
+                # Add quotes if needed
+                if not collision_url.startswith('"'):
+                    collision_url = f'"{collision_url}"'
+                tx.set(url_prop, collision_url)
+                count += 1
         
         self.modified = True
         self.populate_tree()
@@ -1090,10 +1099,8 @@ class ProtoEditorUI:
         issues = []
         
         # Check for empty names
-        all_nodes = self.proto_robot.search("")
-        for node in all_nodes:
-            if hasattr(node, 'name') and not node.name:
-                issues.append("Found node with empty name")
+        for node in self.proto_robot.iter_search(""):
+            issues.append("Found node with empty name")
                 
         if issues:
             messagebox.showwarning("Validation Issues", "\n".join(issues))
@@ -1103,6 +1110,7 @@ class ProtoEditorUI:
     def expand_all(self, tree):
         """Expand all tree items"""
         def expand_children(item):
+            self.load_tree_item(item)
             tree.item(item, open=True)
             for child in tree.get_children(item):
                 expand_children(child)
@@ -11,6 +11,8 @@ import open3d.visualization.gui as gui
 import open3d.visualization.rendering as rendering
 import numpy as np
 
+from urdf_converter.utils.stl_tool import read_triangle_mesh
+
 
 class STLSimplifierApp:
     """
@@ -197,7 +199,7 @@ class STLSimplifierApp:
         for fp in stl_files:
             if fp not in self._original_meshes:
                 try:
-                    mesh = o3d.io.read_triangle_mesh(fp)
+                    mesh = read_triangle_mesh(fp)
                     if not mesh.has_vertex_normals():
                         mesh.compute_vertex_normals()
                     self._original_meshes[fp] = mesh
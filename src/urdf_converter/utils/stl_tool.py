@@ -1,8 +1,17 @@
 import open3d as o3d
 import os
 import glob
+import shutil
+from urdf_converter.core.stl_reader import read_stl, stl_face_count, is_binary_stl
 from urdf_converter.ui.ui_picker import zenity_select_folder
 
+def read_triangle_mesh(stl_path):
+    """
+    以 stl_reader 讀取 STL (binary 以 memory map 讀取, 頂點已合併), 轉成 Open3D 的 TriangleMesh
+    """
+    vertices, faces = read_stl(stl_path)
+    return o3d.geometry.TriangleMesh(o3d.utility.Vector3dVector(vertices), o3d.utility.Vector3iVector(faces))
+
 def generate_collision_meshes(mesh_folder, target_faces=300):
     """
     遍歷指定資料夾，將所有 .stl 檔案生成 _collision.stl 版本
@@ -34,13 +43,17 @@ def generate_collision_meshes(mesh_folder, target_faces=300):
         #     continue
 
         try:
-            # 1. 讀取
-            mesh = o3d.io.read_triangle_mesh(input_path)
-            if len(mesh.triangles) <= target_faces:
-                # 如果原本面數就很少，直接複製一份
-                o3d.io.write_triangle_mesh(output_path, mesh)
+            # 1. 只讀標頭取得面數, 原本面數就很少時直接複製一份
+            #    (binary 直接複製檔案, ASCII 與先前相同以 Open3D 另存為 binary)
+            if stl_face_count(input_path) <= target_faces:
+                if is_binary_stl(input_path):
+                    shutil.copyfile(input_path, output_path)
+                else:
+                    o3d.io.write_triangle_mesh(output_path, read_triangle_mesh(input_path))
                 continue
 
+            mesh = read_triangle_mesh(input_path)
+
             # 2. 減面 (Quadric Decimation)
             mesh_smp = mesh.simplify_quadric_decimation(target_number_of_triangles=target_faces)
             mesh_smp.compute_vertex_normals()
@@ -0,0 +1,174 @@
+"""
+Shared fixtures: a small urdf2webots style PROTO (irregular spacing and comments
+included, so that verbatim writes can be checked) and closed trimesh meshes.
+"""
+import numpy as np
+import pytest
+import trimesh
+
+from urdf_converter.core import proto_parser as proto
+
+SAMPLE_PROTO = """\
+#VRML_SIM R2023b utf8
+# license: Apache License 2.0
+# Extracted from: robot.urdf
+
+PROTO sample [
+  field  SFVec3f     translation     0 0 0
+  field  SFRotation  rotation        0 0 1 0
+  field  SFString    name            "sample"  # Is `Robot.name`.
+  field  SFString    controller      "void"
+]
+{
+  Robot {
+    translation IS translation
+    rotation IS rotation
+    name IS name
+    controller IS controller
+    children [
+      DEF base_visual Shape {
+        appearance PBRAppearance {
+          baseColor 0.5 0.5 0.5
+          roughness 1.000000
+        }
+        geometry DEF base Mesh {
+          url "meshes/base.STL"
+        }
+      }
+      HingeJoint {
+        jointParameters HingeJointParameters {
+          axis 0 0 1
+          anchor 0 0 0.1
+        }
+        device [
+          RotationalMotor {
+            name "joint1"
+            maxTorque 10
+          }
+          PositionSensor {
+            name "joint1_sensor"
+          }
+        ]
+        endPoint Solid {
+          translation 0 0 0.1
+          children [
+            Shape {
+              geometry DEF arm_geo IndexedFaceSet {
+                coord Coordinate {
+                  point [
+                    0 0 0
+                    1 0 0
+                    0 1 0
+                  ]
+                }
+                coordIndex [
+                  0, 1, 2, -1
+                ]
+              }
+            }
+          ]
+          name "arm"
+          boundingObject USE arm_geo
+          physics Physics {
+            density -1
+            mass 1.0
+            centerOfMass [ 0 0 0 ]
+          }
+        }
+      }
+    ]
+    name   "sample"   # spacing kept on write
+    boundingObject USE base
+    physics Physics {
+    }
+  }
+}
+"""
+
+
+# robot referencing STL meshes (written by the mesh_dir fixture): a DEF / USE pair,
+# two files with the same content, a url list, a missing file and "$robot"
+ROBOT_PROTO = """\
+#VRML_SIM R2023b utf8
+PROTO robot [
+  field  SFString    name            "robot"  # Is `Robot.name`.
+]
+{
+  Robot {
+    name IS name
+    customData "$robot"
+    children [
+      DEF base_visual Shape {
+        geometry DEF base Mesh {
+          url "meshes/box.STL"
+        }
+      }
+      HingeJoint {
+        endPoint Solid {
+          children [
+            Shape {
+              geometry Mesh {
+                url [ "meshes/box_copy.STL" ]
+              }
+            }
+            Shape {
+              geometry Mesh {
+                url "meshes/missing.STL"
+              }
+            }
+          ]
+          name "arm"
+          boundingObject Mesh {
+            url "meshes/cylinder.stl"
+          }
+        }
+      }
+    ]
+    boundingObject USE base
+  }
+}
+"""
+
+
+def parse(text):
+    """proto_robot of a proto text"""
+    robot = proto.proto_robot()
+    robot.read_proto_string(text)
+    return robot
+
+
+@pytest.fixture
+def sample_text():
+    return SAMPLE_PROTO
+
+
+@pytest.fixture
+def sample_robot():
+    return parse(SAMPLE_PROTO)
+
+
+@pytest.fixture
+def sample_file(tmp_path):
+    path = tmp_path / "sample.proto"
+    path.write_text(SAMPLE_PROTO, encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def mesh_dir(tmp_path):
+    """Directory holding robot.proto (ROBOT_PROTO) and its binary STL meshes"""
+    meshes = tmp_path / "meshes"
+    meshes.mkdir()
+    box = trimesh.creation.box([0.1, 0.2, 0.4])
+    box.export(meshes / "box.STL")
+    box.export(meshes / "box_copy.STL")
+    trimesh.creation.cylinder(0.05, 0.3, sections=24).export(meshes / "cylinder.stl")
+    (tmp_path / "robot.proto").write_text(ROBOT_PROTO, encoding="utf-8")
+    return tmp_path
+
+
+@pytest.fixture
+def box_mesh():
+    """Closed box 0.1 x 0.2 x 0.4 centred on the origin, as (vertices, faces)"""
+    mesh = trimesh.creation.box([0.1, 0.2, 0.4])
+    return np.asarray(mesh.vertices, dtype=np.float64), np.asarray(mesh.faces, dtype=np.int64)
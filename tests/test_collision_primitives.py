@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+import trimesh
+
+from urdf_converter.core import collision_primitives as cp
+from tests.conftest import ROBOT_PROTO, SAMPLE_PROTO, parse
+
+
+def arrays(mesh):
+    return np.asarray(mesh.vertices, dtype=np.float64), np.asarray(mesh.faces, dtype=np.int64)
+
+
+# ================== Geometry ==================
+def test_volume_and_closedness(box_mesh):
+    vertices, faces = box_mesh
+    assert cp.mesh_volume(vertices, faces) == pytest.approx(0.008)
+    assert cp.mesh_volume(vertices, faces[:, ::-1]) == pytest.approx(0.008)
+    assert cp.is_closed(faces)
+    assert not cp.is_closed(faces[:-1])
+    assert cp.fit_primitives(vertices, faces[:-1]) == []
+
+
+def test_enclosing_ball_contains_every_point():
+    points = np.random.default_rng(2).normal(size=(2000, 3))
+    center, radius = cp.enclosing_ball(points)
+    distances = np.linalg.norm(points - center, axis=1)
+    assert distances.max() <= radius * (1 + 1e-9)
+    # the ball touches the points it is spanned by
+    assert distances.max() == pytest.approx(radius)
+
+
+# ================== Fits on closed meshes ==================
+def test_rotated_box_fits_a_box():
+    mesh = trimesh.creation.box([0.1, 0.2, 0.4])
+    transform = trimesh.transformations.rotation_matrix(0.7, [1, 2, 3])
+    transform[:3, 3] = [0.5, -0.2, 1.0]
+    mesh.apply_transform(transform)
+    best = cp.fit_primitives(*arrays(mesh))[0]
+    assert best.kind == "Box"
+    assert best.error == pytest.approx(0.0, abs=1e-9)
+    assert sorted(best.size[0]) == pytest.approx([0.1, 0.2, 0.4])
+    assert best.translation == pytest.approx([0.5, -0.2, 1.0])
+
+
+def test_cylinder_fits_a_cylinder():
+    best = cp.fit_primitives(*arrays(trimesh.creation.cylinder(0.05, 0.3, sections=64)))[0]
+    assert best.kind == "Cylinder"
+    assert best.size == pytest.approx((0.3, 0.05))
+    assert 0 <= best.error < 0.01
+    # Cylinder / Capsule axis is the Z axis of the Transform
+    assert abs(best.rotation[:, 2] @ [0, 0, 1]) == pytest.approx(1.0)
+
+
+def test_sphere_and_capsule_fits():
+    fits = cp.fit_primitives(*arrays(trimesh.creation.icosphere(3, 0.1)))
+    sphere = next(fit for fit in fits if fit.kind == "Sphere")
+    assert sphere.size[0] == pytest.approx(0.1)
+    assert sphere.error == pytest.approx(fits[0].error)
+    capsule = cp.fit_primitives(*arrays(trimesh.creation.capsule(0.3, 0.05)))[0]
+    assert capsule.kind == "Capsule"
+    assert capsule.size == pytest.approx((0.3, 0.05))
+
+
+def test_kinds_limit_the_fits(box_mesh):
+    fits = cp.fit_primitives(*box_mesh, kinds=("Sphere", "Cylinder"))
+    assert sorted(fit.kind for fit in fits) == ["Cylinder", "Sphere"]
+    assert fits[0].error <= fits[1].error
+
+
+# ================== proto rewrite ==================
+def test_link_name_of_interface_fields():
+    robot = parse(ROBOT_PROTO)
+    names = [cp.link_name(bo) for bo in robot.iter_nodes(lambda node: node.name == "boundingObject")]
+    # "name IS name": the default of the field, without its trailing comment
+    assert names == ["arm", "robot"]
+    # no such field: the PROTO name
+    robot = parse(SAMPLE_PROTO.replace("    name IS name\n", "    name IS robotName\n").replace(
+        '    name   "sample"   # spacing kept on write\n', ""))
+    assert [cp.link_name(bo) for bo in robot.iter_nodes(lambda node: node.name == "boundingObject")] == [
+        "arm", "sample"]
+
+
+def test_fit_bounding_objects_replaces_meshes(mesh_dir):
+    robot = parse(ROBOT_PROTO)
+    report = cp.fit_bounding_objects(robot, str(mesh_dir))
+    assert [(row.link, row.fit.kind, row.replaced) for row in report] == [
+        ("arm", "Cylinder", True), ("robot", "Box", True)]
+    assert robot.find_by_type("Cylinder") and robot.find_by_type("Box")
+    # the visual Mesh keeps its DEF
+    assert robot.find_by_def("base")[0].DEF == "DEF base Mesh {"
+
+
+def test_used_def_and_error_limit_keep_the_mesh(mesh_dir):
+    text = ROBOT_PROTO.replace("boundingObject Mesh {", "boundingObject DEF arm_collision Mesh {").replace(
+        "    boundingObject USE base\n", "    boundingObject USE arm_collision\n")
+    report = cp.fit_bounding_objects(parse(text), str(mesh_dir))
+    assert [(row.replaced, row.note) for row in report] == [(False, "DEF 被其他 USE 引用"), (True, None)]
+    report = cp.fit_bounding_objects(parse(ROBOT_PROTO), str(mesh_dir), max_error=-1.0)
+    assert [(row.replaced, row.note) for row in report] == [(False, "誤差超過 -1")] * 2
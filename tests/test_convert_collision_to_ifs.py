@@ -0,0 +1,240 @@
+import io
+import os
+import re
+
+import numpy as np
+import pytest
+
+from urdf_converter.core import convert_collision_to_ifs as ifs
+from urdf_converter.core.ifs_cache import ifs_cache
+from tests.conftest import ROBOT_PROTO, parse
+
+
+def ifs_str_reference(vertices, faces, indent_level=6):
+    """IndexedFaceSet text as formatted row by row before ifs_str()"""
+    indent = " " * indent_level
+    sub_indent = " " * (indent_level + 2)
+    points = f"\n{sub_indent}  ".join(f"{v[0]:.4f} {v[1]:.4f} {v[2]:.4f}" for v in vertices)
+    indices = f"\n{sub_indent}  ".join(f"{f[0]}, {f[1]}, {f[2]}, -1" for f in faces)
+    return (f"IndexedFaceSet {{\n{indent}creaseAngle 1.0\n"
+            f"{indent}coord Coordinate {{\n{sub_indent}point [\n{sub_indent}  {points}\n{sub_indent}]\n{indent}}}\n"
+            f"{indent}coordIndex [\n{sub_indent}  {indices}\n{indent}]\n{indent[:-2]}}}")
+
+
+# ================== Text emission ==================
+def test_ifs_str_matches_row_by_row_formatting(box_mesh):
+    vertices, faces = box_mesh
+    assert ifs.ifs_str(vertices, faces) == ifs_str_reference(vertices, faces)
+    assert ifs.ifs_str(vertices, faces, indent_level=10) == ifs_str_reference(vertices, faces, 10)
+
+
+def test_iter_ifs_str_chunks_join_to_ifs_str():
+    rng = np.random.default_rng(0)
+    vertices = rng.random((1000, 3))
+    faces = rng.integers(0, 1000, (1500, 3))
+    chunks = list(ifs.iter_ifs_str(vertices, faces, chunk_rows=128))
+    assert len(chunks) > 20
+    assert "".join(chunks) == ifs.ifs_str(vertices, faces) == ifs_str_reference(vertices, faces)
+
+
+# ================== Parallel conversion ==================
+def test_convert_stl_files_deduplicates_and_matches_serial(mesh_dir):
+    meshes = mesh_dir / "meshes"
+    paths = [str(meshes / "box.STL"), str(meshes / "cylinder.stl"), str(meshes / "box.STL"), str(meshes / "missing.STL")]
+    serial = ifs.convert_stl_files(paths, workers=1)
+    parallel = ifs.convert_stl_files(paths, workers=2)
+    assert list(serial) == [paths[0], paths[1], paths[3]]
+    assert serial == parallel
+    assert serial[paths[3]] is None
+    assert serial[paths[0]] == ifs.stl_to_ifs_str(paths[0])
+
+
+def test_map_stl_files_skips_cached_paths(mesh_dir):
+    meshes = mesh_dir / "meshes"
+    paths = [str(meshes / "box.STL"), str(meshes / "cylinder.stl")]
+    converted = []
+    stored = {}
+
+    def convert(path):
+        converted.append(path)
+        return path.upper()
+
+    results = ifs.map_stl_files(convert, paths, 1, get={paths[0]: "cached"}.get, put=stored.__setitem__)
+    assert results == {paths[0]: "cached", paths[1]: paths[1].upper()}
+    assert converted == [paths[1]]
+    assert stored == {paths[1]: paths[1].upper()}
+
+
+# ================== Tree rewrite ==================
+def rewrite(mesh_dir, mode, **kwargs):
+    """Output of process_proto_file() for robot.proto, always written as <mode>/out.proto"""
+    (mesh_dir / mode).mkdir(exist_ok=True)
+    output = mesh_dir / mode / "out.proto"
+    ifs.process_proto_file(str(mesh_dir / "robot.proto"), str(output), rewrite=mode, workers=1, **kwargs)
+    return output.read_text(encoding="utf-8")
+
+
+def test_tree_rewrite_replaces_stl_meshes(mesh_dir):
+    text = rewrite(mesh_dir, "tree", instancing=False)
+    robot = parse(text)
+    assert robot.search_first("PROTO").DEF.split()[0] == "out"
+    assert robot.search_first("customData").content == '"$out"'
+    assert "geometry DEF base IndexedFaceSet {" in text
+    assert len(robot.find_by_type("IndexedFaceSet")) == 3
+    # the missing STL keeps its Mesh
+    meshes = robot.find_by_type("Mesh")
+    assert [ifs.stl_url(mesh) for mesh in meshes] == ["meshes/missing.STL"]
+    # unedited lines are written as read
+    assert text.startswith("#VRML_SIM R2023b utf8\nPROTO out [\n")
+    assert '  field  SFString    name            "robot"  # Is `Robot.name`.\n' in text
+
+
+def test_regex_and_stream_rewrites_write_the_tree_bytes(mesh_dir):
+    tree = rewrite(mesh_dir, "tree", instancing=False)
+    assert rewrite(mesh_dir, "regex", instancing=False) == tree
+    assert rewrite(mesh_dir, "stream", instancing=False) == tree
+
+
+def test_unknown_rewrite_mode(mesh_dir):
+    with pytest.raises(ValueError):
+        rewrite(mesh_dir, "text")
+
+
+# ================== Stream rewrite ==================
+def test_stream_rewrite_writes_the_tree_bytes(mesh_dir, tmp_path):
+    tree = rewrite(mesh_dir, "tree")
+    assert rewrite(mesh_dir, "stream") == tree
+    cache = ifs_cache(tmp_path / "cache")
+    assert rewrite(mesh_dir, "stream", ifs_cache=cache) == tree
+    assert rewrite(mesh_dir, "stream", ifs_cache=cache) == tree
+    assert cache.hits == 2
+
+
+def test_streamed_node_without_mesh_writes_the_original_mesh():
+    robot = parse(ROBOT_PROTO)
+    mesh = robot.find_by_type("Mesh")[0]
+    name, DEF = ifs._ifs_header(mesh)
+    with robot.transaction() as tx:
+        tx.replace(mesh, ifs._streamed_ifs(name, DEF, "meshes/box.STL", lambda path: None, mesh))
+    out = io.StringIO()
+    robot.write(out)
+    assert out.getvalue() == ROBOT_PROTO
+
+
+def test_mesh_loader_does_not_cache_missing_files(mesh_dir, tmp_path):
+    cache = ifs_cache(tmp_path / "cache")
+    load = ifs._last_mesh_loader(cache)
+    missing = str(mesh_dir / "meshes" / "missing.STL")
+    assert load(missing) is None
+    assert os.listdir(cache.cache_dir) == []
+    box = str(mesh_dir / "meshes" / "box.STL")
+    vertices, faces, _ = load(box)
+    assert load(box).vertices is vertices
+    assert ifs._last_mesh_loader(cache)(box).faces.tolist() == faces.tolist()
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+# ================== Mesh optimisation ==================
+def triangle_soup(vertices, faces, jitter=0.0):
+    """Every face with its own three corners, moved by up to jitter"""
+    soup = vertices[faces].reshape(-1, 3)
+    soup = soup + np.random.default_rng(1).uniform(-jitter, jitter, soup.shape)
+    return soup, np.arange(len(soup)).reshape(-1, 3)
+
+
+def test_default_options_keep_the_arrays(box_mesh):
+    vertices, faces = box_mesh
+    mesh = ifs.optimize_mesh(vertices, faces)
+    assert np.array_equal(mesh.vertices, vertices) and np.array_equal(mesh.faces, faces)
+    assert mesh.point_format == ifs.POINT_FORMAT
+
+
+def test_quantize_step_merges_vertices_on_the_grid(box_mesh):
+    vertices, faces = triangle_soup(*box_mesh, jitter=1e-3)
+    mesh = ifs.optimize_mesh(vertices, faces, ifs.ifs_options(step=0.01))
+    assert len(mesh.vertices) == 8 and len(mesh.faces) == 12
+    assert np.allclose(mesh.vertices * 100, np.round(mesh.vertices * 100))
+    assert mesh.point_format == "%.2f %.2f %.2f"
+    # the box diagonal is about 0.458: 1e-2 * 0.458 floors to a 0.001 step
+    assert ifs.optimize_mesh(vertices, faces, ifs.ifs_options(relative_step=1e-2)).point_format == "%.3f %.3f %.3f"
+
+
+def test_weld_joins_close_vertices_at_their_mean(box_mesh):
+    vertices, faces = triangle_soup(*box_mesh, jitter=1e-6)
+    mesh = ifs.optimize_mesh(vertices, faces, ifs.ifs_options(weld=1e-4))
+    assert len(mesh.vertices) == 8 and len(mesh.faces) == 12
+    assert np.abs(mesh.vertices - np.round(mesh.vertices, 2)).max() < 1e-6
+    # every face keeps its corners
+    assert np.allclose(np.sort(mesh.vertices[mesh.faces].sum(axis=1), axis=0),
+                       np.sort(vertices[faces].sum(axis=1), axis=0), atol=1e-5)
+    with pytest.raises(ValueError):
+        ifs.optimize_mesh(vertices * 1e6, faces, ifs.ifs_options(weld=1e-12))
+
+
+def test_degenerate_and_duplicate_faces_are_dropped(box_mesh):
+    vertices, faces = box_mesh
+    faces = np.vstack([faces, faces[:1, ::-1], [[0, 0, 1]]])
+    mesh = ifs.optimize_mesh(vertices, faces, ifs.ifs_options(step=1e-4))
+    assert len(mesh.faces) == 12
+
+
+def test_compact_format_drops_trailing_zeros(box_mesh):
+    vertices, faces = box_mesh
+    mesh = ifs.optimize_mesh(vertices, faces, ifs.ifs_options(compact=True))
+    text = ifs.ifs_str(mesh.vertices, mesh.faces, point_format=mesh.point_format)
+    assert "-0.05 -0.1 -0.2" in text and "0.0500" not in text
+    assert ifs.ifs_str(vertices, faces).count("\n") == text.count("\n")
+
+
+# ================== Instancing ==================
+def assert_use_after_def(text):
+    for identifier in set(re.findall(r"\bUSE (\S+)", text)):
+        assert text.index(f"DEF {identifier} ") < text.index(f"USE {identifier}")
+
+
+def test_equal_meshes_are_written_once(mesh_dir):
+    (mesh_dir / "robot.proto").write_text(ROBOT_PROTO.replace("meshes/missing.STL", "meshes/cylinder.stl"),
+                                          encoding="utf-8")
+    text = rewrite(mesh_dir, "tree")
+    robot = parse(text)
+    assert len(robot.find_by_type("IndexedFaceSet")) == 2
+    assert "              geometry USE base\n" in text
+    assert "              geometry DEF IFS_cylinder IndexedFaceSet {\n" in text
+    assert "          boundingObject USE IFS_cylinder\n" in text
+    assert_use_after_def(text)
+    assert rewrite(mesh_dir, "stream") == text
+
+
+def test_referenced_duplicate_is_written_in_full(mesh_dir):
+    text = ROBOT_PROTO.replace("geometry Mesh {\n                url [", "geometry DEF copy Mesh {\n                url [")
+    text = text.replace('boundingObject Mesh {\n            url "meshes/cylinder.stl"\n          }', "boundingObject USE copy")
+    (mesh_dir / "robot.proto").write_text(text, encoding="utf-8")
+    output = rewrite(mesh_dir, "tree")
+    assert "geometry DEF copy IndexedFaceSet {" in output
+    assert len(parse(output).find_by_type("IndexedFaceSet")) == 2
+    assert_use_after_def(output)
+
+
+def test_mesh_digest_follows_the_written_text(mesh_dir):
+    meshes = mesh_dir / "meshes"
+    box = ifs.stl_to_mesh(str(meshes / "box.STL"))
+    copy = ifs.stl_to_mesh(str(meshes / "box_copy.STL"))
+    cylinder = ifs.stl_to_mesh(str(meshes / "cylinder.stl"))
+    assert ifs.mesh_digest(*box) == ifs.mesh_digest(*copy)
+    assert ifs.mesh_digest(*box) != ifs.mesh_digest(*cylinder)
+    assert ifs.mesh_digest(box.vertices, box.faces, "%.2f %.2f %.2f") != ifs.mesh_digest(*box)
+
+
+def test_robot_variable_only_edits_changed_fields(mesh_dir):
+    # structures holding an edited field lose their span ("{  # ..." would become "{ # ...")
+    unresolved = ROBOT_PROTO.replace("meshes/", "nowhere/").replace("  Robot {", "  Robot {  # root")
+    # "$robots" is not the variable: only the PROTO name changes
+    text = unresolved.replace('"$robot"', '"$robots"')
+    (mesh_dir / "robot.proto").write_text(text, encoding="utf-8")
+    assert rewrite(mesh_dir, "tree") == text.replace("PROTO robot", "PROTO out")
+    # a copy named robot.proto substitutes "$robot" with itself
+    (mesh_dir / "robot.proto").write_text(unresolved, encoding="utf-8")
+    (mesh_dir / "robot").mkdir()
+    output = mesh_dir / "robot" / "robot.proto"
+    ifs.process_proto_file(str(mesh_dir / "robot.proto"), str(output), workers=1)
+    assert output.read_text(encoding="utf-8") == unresolved
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+import trimesh
+
+from urdf_converter.core import convex_decomposition as cd
+from urdf_converter.core.ifs_cache import ifs_cache
+from tests.conftest import ROBOT_PROTO, parse
+
+
+def arrays(mesh):
+    return np.asarray(mesh.vertices, dtype=np.float64), np.asarray(mesh.faces, dtype=np.int64)
+
+
+@pytest.fixture
+def two_boxes():
+    """Closed mesh of two separate cubes: one hull would double the volume"""
+    first = trimesh.creation.box([0.1, 0.1, 0.1])
+    second = trimesh.creation.box([0.1, 0.1, 0.1])
+    second.apply_translation([0.3, 0, 0])
+    return arrays(trimesh.util.concatenate([first, second]))
+
+
+# ================== Convex hull ==================
+def test_convex_hull_of_a_cube():
+    corners = np.array([(x, y, z) for x in (0, 1) for y in (0, 2) for z in (0, 3)], dtype=np.float64)
+    points = np.vstack([np.random.default_rng(3).random((500, 3)) * [1, 2, 3], corners])
+    vertices, faces = cd.convex_hull(points)
+    assert sorted(map(tuple, vertices)) == sorted(map(tuple, corners))
+    assert len(faces) == 12
+    assert cd.hull_volume(vertices, faces) == pytest.approx(6.0)
+    # outward normals: every point is on the inner side of every face
+    normals, offsets = cd._face_planes(vertices, faces)
+    assert (points @ normals.T - offsets).max() < 1e-9
+
+
+def test_convex_hull_vertex_limit_and_degenerate_input():
+    points = np.random.default_rng(4).normal(size=(500, 3))
+    vertices, faces = cd.convex_hull(points, max_vertices=20)
+    assert len(vertices) == 20
+    assert 0 < cd.hull_volume(vertices, faces) < cd.hull_volume(*cd.convex_hull(points))
+    assert cd.convex_hull(points[:3]) is None
+    assert cd.convex_hull(np.column_stack([points[:, :2], np.zeros(len(points))])) is None
+
+
+def test_voxel_volume(box_mesh):
+    lo, pitch, inside, samples = cd.voxelize(*box_mesh, resolution=40)
+    assert inside.sum() * pitch ** 3 == pytest.approx(0.008, rel=0.02)
+    assert np.all(samples >= lo - 1e-12)
+
+
+# ================== Decomposition ==================
+def test_convex_mesh_gives_one_exact_hull(box_mesh):
+    fit = cd.decompose(*box_mesh)
+    assert len(fit.hulls) == 1
+    assert fit.error == pytest.approx(0.0, abs=1e-9)
+    assert fit.kind == "Group (1 凸包)"
+
+
+def test_separate_parts_are_split(two_boxes):
+    fit = cd.decompose(*two_boxes)
+    assert len(fit.hulls) == 2
+    assert fit.error == pytest.approx(0.0, abs=1e-9)
+    centers = sorted(round(float(vertices[:, 0].mean()), 6) for vertices, _ in fit.hulls)
+    assert centers == [0.0, 0.3]
+    single = cd.decompose(*two_boxes, cd.convex_options(max_hulls=1))
+    assert len(single.hulls) == 1 and single.error == pytest.approx(1.0)
+
+
+def test_open_mesh_is_not_decomposed(box_mesh):
+    vertices, faces = box_mesh
+    assert cd.decompose(vertices, faces[:-1]) is None
+
+
+def test_pack_round_trip(two_boxes):
+    fit = cd.decompose(*two_boxes)
+    unpacked = cd._unpack(cd._pack(fit))
+    assert unpacked.kind == fit.kind
+    assert (unpacked.volume, unpacked.error, unpacked.concavity) == (fit.volume, fit.error, fit.concavity)
+    for (vertices, faces), (expected_vertices, expected_faces) in zip(unpacked.hulls, fit.hulls):
+        assert np.array_equal(vertices, expected_vertices) and np.array_equal(faces, expected_faces)
+
+
+# ================== proto rewrite ==================
+def test_bounding_objects_become_hull_groups(mesh_dir, tmp_path):
+    cache = ifs_cache(tmp_path / "cache")
+    robot = parse(ROBOT_PROTO)
+    report = cd.decompose_bounding_objects(robot, str(mesh_dir), workers=1, cache=cache)
+    assert [(row.link, row.replaced) for row in report] == [("arm", True), ("robot", True)]
+    groups = robot.find_by_type("Group")
+    assert len(groups) == 2
+    assert all(len(group.select("IndexedFaceSet")) == 1 for group in groups)
+    cd.decompose_bounding_objects(parse(ROBOT_PROTO), str(mesh_dir), workers=1, cache=cache)
+    assert cache.hits == 2
@@ -0,0 +1,57 @@
+import os
+import shutil
+
+import numpy as np
+import trimesh
+
+from urdf_converter.core import convert_collision_to_ifs as ifs
+from urdf_converter.core.ifs_cache import ifs_cache
+
+
+def test_text_hit_equals_conversion(mesh_dir, tmp_path):
+    cache = ifs_cache(tmp_path / "cache")
+    box = str(mesh_dir / "meshes" / "box.STL")
+    first = ifs.stl_to_ifs_str(box, cache=cache)
+    second = ifs.stl_to_ifs_str(box, cache=cache)
+    assert first == second == ifs.stl_to_ifs_str(box)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_are_keyed_by_content_and_parameters(mesh_dir, tmp_path):
+    cache = ifs_cache(tmp_path / "cache")
+    meshes = mesh_dir / "meshes"
+    ifs.stl_to_ifs_str(str(meshes / "box.STL"), cache=cache)
+    # same content under another name: hit
+    ifs.stl_to_ifs_str(str(meshes / "box_copy.STL"), cache=cache)
+    assert cache.hits == 1
+    # other parameters: miss
+    ifs.stl_to_ifs_str(str(meshes / "box.STL"), indent_level=8, cache=cache)
+    assert cache.misses == 2
+    # edited file: miss, and the new text
+    trimesh.creation.box([1, 1, 1]).export(meshes / "box.STL")
+    text = ifs.stl_to_ifs_str(str(meshes / "box.STL"), cache=cache)
+    assert cache.misses == 3
+    assert "0.5000 0.5000 0.5000" in text
+
+
+def test_mesh_arrays_round_trip(mesh_dir, tmp_path):
+    cache = ifs_cache(tmp_path / "cache")
+    path = str(mesh_dir / "meshes" / "cylinder.stl")
+    loaded = ifs.load_stl_meshes([path], workers=1, cache=cache)[path]
+    cached = ifs.load_stl_meshes([path], workers=1, cache=cache)[path]
+    assert cache.hits == 1
+    assert np.array_equal(loaded.vertices, cached.vertices) and np.array_equal(loaded.faces, cached.faces)
+    assert loaded.point_format == cached.point_format
+
+
+def test_moved_file_and_eviction(mesh_dir, tmp_path):
+    cache = ifs_cache(tmp_path / "cache")
+    box = mesh_dir / "meshes" / "box.STL"
+    ifs.stl_to_ifs_str(str(box), cache=cache)
+    moved = tmp_path / "moved.STL"
+    shutil.copy2(box, moved)
+    ifs.stl_to_ifs_str(str(moved), cache=cache)
+    assert cache.hits == 1
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.evictions > 0 and os.listdir(cache.cache_dir) == []
@@ -0,0 +1,68 @@
+import io
+import os
+
+from urdf_converter.core import proto_parser as proto
+from urdf_converter.core.proto_cache import proto_cache
+from tests.conftest import SAMPLE_PROTO, parse
+
+
+def written(robot):
+    out = io.StringIO()
+    robot.write(out)
+    return out.getvalue()
+
+
+def test_hit_equals_fresh_parse(sample_file, tmp_path):
+    cache = proto_cache(tmp_path / "cache")
+    first = proto.proto_robot(proto_filename=str(sample_file), cache=cache)
+    second = proto.proto_robot(proto_filename=str(sample_file), cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    fresh = parse(SAMPLE_PROTO)
+    assert proto.diff(second, fresh) == []
+    assert second.digest() == fresh.digest() == first.digest()
+    assert written(second) == SAMPLE_PROTO
+    assert second.search_first("point").values.tolist() == [[0, 0, 0], [1, 0, 0], [0, 1, 0]]
+
+
+def test_hit_writes_unedited_parts_verbatim(sample_file, tmp_path):
+    cache = proto_cache(tmp_path / "cache")
+    proto.proto_robot(proto_filename=str(sample_file), cache=cache)
+    cached = proto.proto_robot(proto_filename=str(sample_file), cache=cache)
+    fresh = parse(SAMPLE_PROTO)
+    for robot in (cached, fresh):
+        with robot.transaction() as tx:
+            tx.set(robot.search_first("maxTorque"), "5")
+    assert cache.hits == 1
+    assert written(cached) == written(fresh) == SAMPLE_PROTO.replace("maxTorque 10", "maxTorque 5")
+
+
+def test_touched_file_is_still_a_hit(sample_file, tmp_path):
+    cache = proto_cache(tmp_path / "cache")
+    proto.proto_robot(proto_filename=str(sample_file), cache=cache)
+    st = os.stat(sample_file)
+    os.utime(sample_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    proto.proto_robot(proto_filename=str(sample_file), cache=cache)
+    assert cache.hits == 1
+
+
+def test_changed_file_is_a_miss(sample_file, tmp_path):
+    cache = proto_cache(tmp_path / "cache")
+    proto.proto_robot(proto_filename=str(sample_file), cache=cache)
+    sample_file.write_text(SAMPLE_PROTO.replace("maxTorque 10", "maxTorque 20"), encoding="utf-8")
+    robot = proto.proto_robot(proto_filename=str(sample_file), cache=cache)
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert robot.search_first("maxTorque").content == "20"
+
+
+def test_invalidate_and_evict(sample_file, tmp_path):
+    cache = proto_cache(tmp_path / "cache")
+    proto.proto_robot(proto_filename=str(sample_file), cache=cache)
+    cache.invalidate(str(sample_file))
+    proto.proto_robot(proto_filename=str(sample_file), cache=cache)
+    assert cache.misses == 2
+
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.evictions == 1
+    assert os.listdir(cache.cache_dir) == []
@@ -0,0 +1,479 @@
+import io
+import difflib
+import gc
+
+import numpy as np
+
+from urdf_converter.core import proto_parser as proto
+from tests.conftest import SAMPLE_PROTO, parse
+
+
+def written(structure):
+    out = io.StringIO()
+    structure.write(out)
+    return out.getvalue()
+
+
+# ================== Tokenizer ==================
+def test_parse_write_round_trip_is_verbatim(sample_robot):
+    assert written(sample_robot) == SAMPLE_PROTO
+
+
+def test_read_proto_file_matches_read_proto_string(sample_file):
+    robot = proto.proto_robot(proto_filename=str(sample_file))
+    assert written(robot) == SAMPLE_PROTO
+    assert proto.diff(robot, parse(SAMPLE_PROTO)) == []
+
+
+def test_tokenizer_structure(sample_robot):
+    assert sample_robot.header.startswith("#VRML_SIM R2023b utf8\n")
+    declaration = sample_robot.search_first("PROTO")
+    assert declaration.__class__ is proto.container
+    assert declaration.DEF == "sample ["
+    assert [field.name for field in declaration.children] == ["field"] * 4
+
+    robot = sample_robot.select_first("Robot")
+    assert robot.__class__ is proto.Node and robot.stage == 1
+    translation = robot.children[0]
+    assert (translation.name, translation.content, translation.stage) == ("translation", "IS translation", 2)
+
+    # one-line brackets stay a property
+    center = sample_robot.search_first("centerOfMass")
+    assert center.__class__ is proto.property and center.content == "[ 0 0 0 ]"
+    # empty node
+    physics = robot.select_first("> physics")
+    assert physics.DEF == "Physics {" and physics.children == []
+
+
+# ================== Search index ==================
+def test_index_lookups(sample_robot):
+    assert [n.content for n in sample_robot.find_by_name("maxTorque")] == ["10"]
+    assert [n.name for n in sample_robot.find_by_type("RotationalMotor")] == ["RotationalMotor"]
+    assert [n.name for n in sample_robot.find_by_type("Mesh")] == ["geometry"]
+    assert [n.DEF for n in sample_robot.find_by_def("arm_geo")] == ["DEF arm_geo IndexedFaceSet {"]
+    assert sample_robot.find_by_name("missing") == []
+
+
+def test_index_follows_add_and_remove_child(sample_robot):
+    motor = sample_robot.find_by_type("RotationalMotor")[0]
+    velocity = proto.property(name="maxVelocity", parent=motor, stage=motor.stage + 1, content="3")
+    motor.add_child(velocity)
+    assert sample_robot.find_by_name("maxVelocity") == [velocity]
+
+    # a deep subtree added under a new parent is indexed as a whole
+    sensor = proto.Node(name="DistanceSensor", parent=motor.parent, DEF="{", stage=motor.stage)
+    sensor.add_child(proto.property(name="name", parent=sensor, stage=sensor.stage + 1, content='"ds"'))
+    motor.parent.add_child(sensor)
+    assert sample_robot.find_by_type("DistanceSensor") == [sensor]
+    assert '"ds"' in [n.content for n in sample_robot.find_by_name("name")]
+
+    motor.remove_child(velocity)
+    motor.parent.remove_child(sensor)
+    assert sample_robot.find_by_name("maxVelocity") == []
+    assert sample_robot.find_by_type("DistanceSensor") == []
+
+
+# ================== Traversal ==================
+def test_iter_nodes_orders_and_depth(sample_robot):
+    joint = sample_robot.find_by_type("HingeJoint")[0]
+    device = joint.select_first("> device")
+    assert [n.name for n in device.iter_nodes(max_depth=1)] == ["RotationalMotor", "PositionSensor"]
+    assert [n.name for n in device.iter_nodes()] == ["RotationalMotor", "name", "maxTorque", "PositionSensor", "name"]
+    assert [n.name for n in device.iter_nodes(order="post")] == ["name", "maxTorque", "RotationalMotor", "name", "PositionSensor"]
+    # document order, same as the recursive search
+    assert sample_robot.search("name") == list(sample_robot.iter_search("name"))
+    assert [n.content.strip() for n in sample_robot.iter_search("name")][1:] == ['"joint1"', '"joint1_sensor"', '"arm"', '"sample"   # spacing kept on write']
+
+
+def test_iter_search_is_lazy(sample_robot):
+    seen = []
+    matches = sample_robot.iter_nodes(lambda n: seen.append(n) or n.name == "Robot")
+    assert seen == []
+    assert next(matches).name == "Robot"
+    # stopped at the first match instead of walking the whole tree
+    assert len(seen) < 10
+
+
+# ================== Compact structures ==================
+def test_structures_have_no_instance_dict(sample_robot):
+    for node in [sample_robot.find_by_type("Robot")[0], sample_robot.search_first("children"),
+                 sample_robot.search_first("maxTorque"), sample_robot.search_first("point")]:
+        try:
+            node.unknown_attribute = 1
+        except AttributeError:
+            pass
+        else:
+            raise AssertionError(f"{node.__class__.__name__} accepts arbitrary attributes")
+
+
+def test_copy_keeps_fields(sample_robot):
+    motor = sample_robot.find_by_type("RotationalMotor")[0]
+    torque = motor.select_first("> maxTorque")
+    clone = torque.copy()
+    assert (clone.name, clone.content, clone.stage) == (torque.name, torque.content, torque.stage)
+    point = sample_robot.search_first("point")
+    clone = point.copy()
+    assert clone.row_format == point.row_format and (clone.values == point.values).all()
+    assert clone.values is not point.values
+
+
+# ================== Serializer ==================
+def test_str_and_iter_text_match_write(sample_robot):
+    for node in [sample_robot.find_by_type("HingeJoint")[0], sample_robot.search_first("device"),
+                 sample_robot.search_first("coordIndex"), sample_robot.search_first("maxTorque")]:
+        assert str(node) == written(node) == "".join(node.iter_text())
+
+
+def test_generated_nodes_are_indented_by_stage(sample_robot):
+    motor = sample_robot.find_by_type("RotationalMotor")[0]
+    limits = proto.Node(name="multiplier", parent=motor, DEF="Group {", stage=motor.stage + 1)
+    limits.add_child(proto.property(name="value", parent=limits, stage=motor.stage + 2, content="2"))
+    motor.add_child(limits)
+    assert written(motor) == (
+        "          RotationalMotor {\n"
+        '            name "joint1"\n'
+        "            maxTorque 10\n"
+        "            multiplier Group {\n"
+        "              value 2\n"
+        "            }\n"
+        "          }\n"
+    )
+
+
+def test_blank_property_renders_the_same_in_str_and_write():
+    blank = proto.property(name="", parent=None, stage=3, content="")
+    assert str(blank) == written(blank) == "\n"
+
+
+def test_save_robot_renames_the_proto(sample_robot, tmp_path):
+    path = tmp_path / "renamed.proto"
+    sample_robot.save_robot(str(path))
+    text = path.read_text(encoding="utf-8")
+    assert "PROTO renamed [\n" in text
+    assert 'field  SFString    name            "renamed"' in text
+    assert text.replace("renamed", "sample") == SAMPLE_PROTO
+
+
+# ================== Lazy parsing ==================
+def test_lazy_tree_equals_eager_tree(sample_file):
+    lazy = proto.proto_robot(proto_filename=str(sample_file), lazy=True)
+    eager = parse(SAMPLE_PROTO)
+    robot = lazy.select_first("Robot")
+    assert robot.__class__ is proto.LazyNode and not robot.is_loaded()
+    # written straight from the file without parsing the nested nodes
+    assert written(lazy) == SAMPLE_PROTO
+    assert not robot.is_loaded()
+
+    assert proto.diff(lazy, eager) == []
+    assert lazy.digest() == eager.digest()
+    lazy.load_all()
+    assert [(n.name, n.DEF, n.stage) for n in lazy.iter_nodes()] == [(n.name, n.DEF, n.stage) for n in eager.iter_nodes()]
+
+
+def test_lazy_edit_matches_eager_edit(sample_file):
+    lazy = proto.proto_robot(proto_filename=str(sample_file), lazy=True)
+    eager = parse(SAMPLE_PROTO)
+    for robot in (lazy, eager):
+        with robot.transaction() as tx:
+            tx.set_all("RotationalMotor > maxTorque", "0.5")
+    assert written(lazy) == written(eager) == SAMPLE_PROTO.replace("maxTorque 10", "maxTorque 0.5")
+
+
+# ================== NumPy array fields ==================
+def test_numeric_fields_are_arrays(sample_robot):
+    point = sample_robot.search_first("point")
+    coord_index = sample_robot.search_first("coordIndex")
+    assert point.__class__ is proto.array_field and coord_index.__class__ is proto.array_field
+    assert point.values.dtype == np.float64 and point.values.shape == (3, 3)
+    assert coord_index.values.dtype == np.int32 and coord_index.values.tolist() == [[0, 1, 2, -1]]
+    assert coord_index.row_format == "%d, %d, %d, %d"
+
+
+def test_fixed_decimals_are_kept_when_values_change():
+    text = SAMPLE_PROTO.replace("                    0 0 0\n                    1 0 0\n",
+                                "                    0.0000 0.0000 0.0000\n                    1.2500 0.0000 -3.5000\n")
+    robot = parse(text)
+    point = robot.search_first("point")
+    assert point.row_format == "%.4f %.4f %.4f"
+    point.values = point.values * 2
+    point.mark_modified()
+    assert written(point) == (
+        "                  point [\n"
+        "                    0.0000 0.0000 0.0000\n"
+        "                    2.5000 0.0000 -7.0000\n"
+        "                    0.0000 2.0000 0.0000\n"
+        "                  ]\n"
+    )
+
+
+def test_non_numeric_rows_stay_properties():
+    robot = parse(SAMPLE_PROTO.replace("                    1 0 0\n", "                    1 a 0\n"))
+    point = robot.search_first("point")
+    assert point.__class__ is proto.container
+    assert [row.name for row in point.children] == ["0", "1", "0"]
+    assert written(robot) == SAMPLE_PROTO.replace("                    1 0 0\n", "                    1 a 0\n")
+
+
+# ================== Selectors ==================
+SELECTORS = {
+    "HingeJoint > device > RotationalMotor > maxTorque": [("maxTorque", "10")],
+    "RotationalMotor name": [("name", '"joint1"')],
+    "device > * > name": [("name", '"joint1"'), ("name", '"joint1_sensor"')],
+    "#arm_geo > coordIndex": [("coordIndex", None)],
+    "Shape > geometry[type=Mesh] > url": [("url", '"meshes/base.STL"')],
+    "url[content*=.STL]": [("url", '"meshes/base.STL"')],
+    "[content^=USE]": [("boundingObject", "USE arm_geo"), ("boundingObject", "USE base")],
+    "Solid > name": [("name", '"arm"')],
+    "PositionSensor > maxTorque": [],
+}
+
+
+def test_selectors_with_and_without_index(sample_robot):
+    for selector, expected in SELECTORS.items():
+        found = [(n.name, getattr(n, "content", None)) for n in sample_robot.select(selector)]
+        assert found == expected, selector
+    sample_robot.build_index()
+    for selector, expected in SELECTORS.items():
+        found = sorted((n.name, getattr(n, "content", None) or "") for n in sample_robot.select(selector))
+        assert found == sorted((name, content or "") for name, content in expected), selector
+
+
+def test_selector_relative_to_a_node(sample_robot):
+    joint = sample_robot.find_by_type("HingeJoint")[0]
+    assert [n.content for n in joint.select("> endPoint > name")] == ['"arm"']
+    assert joint.select("> name") == []
+    assert sample_robot.select_first("> Robot") is None
+    assert proto.compile_selector("RotationalMotor > maxTorque") is proto.compile_selector("RotationalMotor > maxTorque")
+
+
+# ================== DEF / USE ==================
+def test_resolve_and_find_uses(sample_robot):
+    base = sample_robot.resolve("base")
+    assert base.DEF == "DEF base Mesh {"
+    bounding_objects = sample_robot.find_by_name("boundingObject")
+    assert [sample_robot.resolve_use(bo) for bo in bounding_objects] == [sample_robot.resolve("arm_geo"), base]
+    assert sample_robot.resolve_use(sample_robot.search_first("maxTorque")) is None
+    assert sample_robot.find_uses("base") == [bounding_objects[1]]
+    assert sample_robot.find_uses("base_visual") == []
+    assert sample_robot.resolve("missing") is None
+
+
+def test_use_of_a_whole_shape_resolves_to_the_shape(sample_robot):
+    with sample_robot.transaction() as tx:
+        tx.set(sample_robot.find_uses("base")[0], "USE base_visual")
+    shape = sample_robot.resolve_use(sample_robot.find_uses("base_visual")[0])
+    assert (shape.name, shape.DEF) == ("DEF", "base_visual Shape {")
+    assert shape.select_first("> geometry").search_first("url").content == '"meshes/base.STL"'
+
+
+def test_rename_def_updates_uses(sample_robot):
+    assert sample_robot.rename_def("arm_geo", "arm_shape") == 2
+    assert sample_robot.resolve("arm_geo") is None
+    assert sample_robot.find_uses("arm_shape")[0].content == "USE arm_shape"
+    assert written(sample_robot) == SAMPLE_PROTO.replace("arm_geo", "arm_shape")
+
+
+# ================== Transactions ==================
+def test_transaction_edits(sample_robot):
+    motor = sample_robot.find_by_type("RotationalMotor")[0]
+    sensor = sample_robot.find_by_type("PositionSensor")[0]
+    base = sample_robot.resolve("base")
+    replacement = proto.Node(name="geometry", parent=None, DEF="Box {")
+    replacement.add_child(proto.property(name="size", parent=replacement, content="1 1 1"))
+    with sample_robot.transaction() as tx:
+        tx.set_field(motor, "maxTorque", "2")
+        tx.set_field(motor, "maxVelocity", "3")
+        tx.delete(sensor)
+        tx.replace(base, replacement)
+        assert len(tx) == 4
+    assert [(c.name, c.content) for c in motor.children] == [("name", '"joint1"'), ("maxTorque", "2"), ("maxVelocity", "3")]
+    assert sample_robot.find_by_type("PositionSensor") == []
+    assert sample_robot.resolve("base") is None
+    assert sample_robot.find_by_type("Box") == [replacement]
+    # inserted structures are put at the stage of their new place
+    assert (replacement.stage, replacement.children[0].stage) == (base.stage, base.stage + 1)
+    assert "        geometry Box {\n          size 1 1 1\n        }\n" in written(sample_robot)
+
+
+def test_failed_transaction_is_undone(sample_robot):
+    motor = sample_robot.find_by_type("RotationalMotor")[0]
+    detached = proto.property(name="orphan", parent=motor, content="1")
+    tx = sample_robot.transaction()
+    tx.set(motor.select_first("> maxTorque"), "99")
+    tx.insert(motor, proto.property(name="maxVelocity", parent=None, content="3"))
+    tx.delete(sample_robot.find_by_type("PositionSensor")[0])
+    tx.delete(detached)     # not in the tree: fails after three applied edits
+    try:
+        tx.commit()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("deleting a detached structure should fail")
+    assert written(sample_robot) == SAMPLE_PROTO
+    assert proto.diff(sample_robot, parse(SAMPLE_PROTO)) == []
+    assert sample_robot.find_by_name("maxVelocity") == []
+    assert len(sample_robot.find_by_type("PositionSensor")) == 1
+
+
+def test_exception_in_with_block_discards_the_edits(sample_robot):
+    try:
+        with sample_robot.transaction() as tx:
+            tx.set_all("maxTorque", "1")
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert written(sample_robot) == SAMPLE_PROTO
+
+
+# ================== Digests and diff ==================
+def test_diff_reports_changed_added_and_removed(sample_robot):
+    edited = parse(SAMPLE_PROTO
+                   .replace('          PositionSensor {\n            name "joint1_sensor"\n          }\n', "")
+                   .replace("            maxTorque 10\n", "            maxTorque 10\n            maxVelocity 4\n")
+                   .replace("density -1", "density 1000"))
+    changes = [(d.kind, d.path, d.old is None, d.new is None) for d in proto.diff(sample_robot, edited)]
+    assert changes == [
+        ("removed", "{}/Robot/children/HingeJoint/device/PositionSensor", False, True),
+        ("added", "{}/Robot/children/HingeJoint/device/RotationalMotor/maxVelocity", True, False),
+        ("changed", "{}/Robot/children/HingeJoint/endPoint/physics/density", False, False),
+    ]
+    density = proto.diff(sample_robot, edited)[-1]
+    assert (density.old.content, density.new.content) == ("-1", "1000")
+
+
+def test_digest_follows_edits(sample_robot):
+    reference = parse(SAMPLE_PROTO)
+    assert sample_robot.digest() == reference.digest()
+    assert proto.diff(sample_robot, reference) == []
+    joint = sample_robot.find_by_type("HingeJoint")[0]
+    joint_digest = joint.digest()
+    base_digest = sample_robot.resolve("base_visual").digest()
+    with sample_robot.transaction() as tx:
+        tx.set(sample_robot.search_first("maxTorque"), "11")
+    assert sample_robot.digest() != reference.digest()
+    assert joint.digest() != joint_digest
+    # untouched subtrees keep their digest
+    assert sample_robot.resolve("base_visual").digest() == base_digest
+    with sample_robot.transaction() as tx:
+        tx.set(sample_robot.search_first("maxTorque"), "10")
+    assert sample_robot.digest() == reference.digest()
+
+
+# ================== Verbatim save ==================
+def changed_lines(before, after):
+    """(removed, added) lines of a line diff"""
+    diff = list(difflib.ndiff(before.splitlines(keepends=True), after.splitlines(keepends=True)))
+    return [line[2:] for line in diff if line.startswith("- ")], [line[2:] for line in diff if line.startswith("+ ")]
+
+
+def test_edits_touch_only_the_edited_lines(sample_robot):
+    robot = sample_robot.select_first("Robot")
+    with sample_robot.transaction() as tx:
+        tx.set(robot.select_first("> controller"), '"my_controller"')
+        tx.set(sample_robot.search_first("anchor"), "0 0 0.2")
+        tx.delete(sample_robot.search_first("roughness"))
+        tx.insert(sample_robot.find_by_type("RotationalMotor")[0],
+                  proto.property(name="maxVelocity", parent=None, content="3"))
+    assert changed_lines(SAMPLE_PROTO, written(sample_robot)) == (
+        ["    controller IS controller\n", "          roughness 1.000000\n", "          anchor 0 0 0.1\n"],
+        ['    controller "my_controller"\n', "          anchor 0 0 0.2\n", "            maxVelocity 3\n"],
+    )
+    # comments and spacing in the edited Robot node are kept
+    assert '    name   "sample"   # spacing kept on write\n' in written(sample_robot)
+
+
+def test_saved_file_keeps_unedited_text(sample_file, tmp_path):
+    robot = proto.proto_robot(proto_filename=str(sample_file))
+    with robot.transaction() as tx:
+        tx.set(robot.search_first("mass"), "2.5")
+    path = tmp_path / "sample_copy" / "sample.proto"
+    path.parent.mkdir()
+    robot.save_robot(str(path))
+    assert changed_lines(SAMPLE_PROTO, path.read_text(encoding="utf-8")) == (
+        ["            mass 1.0\n"], ["            mass 2.5\n"])
+
+
+SHARED_CLOSINGS = """\
+#VRML_SIM R2023b utf8
+PROTO shared [
+]
+{
+  Robot {
+    children [
+      Transform {
+        children [
+          Shape {
+            geometry Box {
+              size 1 1 1
+            }
+          } ]
+        translation 0 0 1
+      }
+      Solid {
+        children [
+          Shape {
+            geometry Sphere { radius 0.1 }
+          }
+          ] }
+    ]
+    name "shared"
+  }
+}
+"""
+
+
+def test_edits_below_structures_without_a_span(tmp_path):
+    robot = parse(SHARED_CLOSINGS)
+    with robot.transaction() as tx:
+        tx.set(robot.search_first("size"), "2 2 2")
+        tx.set(robot.search_first("radius"), "0.2")
+    path = tmp_path / "shared.proto"
+    robot.save_robot(str(path))
+    for text in (str(robot), written(robot), path.read_text(encoding="utf-8")):
+        # the edited leaves, and the structures closed on a shared line above them, which
+        # have no span and are formatted; every other line is kept
+        assert changed_lines(SHARED_CLOSINGS, text) == (
+            ["              size 1 1 1\n", "          } ]\n", "            geometry Sphere { radius 0.1 }\n", "          ] }\n"],
+            ["              size 2 2 2\n", "          }\n", "        ]\n",
+             "            geometry Sphere {\n", "              radius 0.2\n", "            }\n", "        ]\n", "      }\n"])
+
+
+def test_reformat_spans_rewrites_only_the_overlapping_blocks():
+    pasted = "Physics {\n      density -1\n         mass 1.0\n  }"
+    text = SAMPLE_PROTO.replace("Physics {\n    }", pasted)
+    start = text.index(pasted)
+    robot = parse(text)
+    robot.reformat_spans([(start, start + len(pasted))])
+    assert changed_lines(text, written(robot)) == (
+        ["         mass 1.0\n", "  }\n"], ["      mass 1.0\n", "    }\n"])
+
+
+# ================== Node ids ==================
+def test_node_ids_survive_edits(sample_robot):
+    motor = sample_robot.find_by_type("RotationalMotor")[0]
+    sensor = sample_robot.find_by_type("PositionSensor")[0]
+    nid = sample_robot.node_id(motor)
+    assert sample_robot.node_id(sample_robot) == 0 and sample_robot.node_by_id(0) is sample_robot
+    assert sample_robot.node_id(motor) == nid and sample_robot.node_id(sensor) != nid
+    with sample_robot.transaction() as tx:
+        tx.set(motor, DEF="DEF m RotationalMotor {", name="DEF")
+        tx.delete(motor)
+        tx.insert(sample_robot.search_first("endPoint"), motor)
+    assert sample_robot.node_by_id(nid) is motor
+
+
+def test_node_ids_of_dropped_nodes(sample_robot):
+    sensor = sample_robot.find_by_type("PositionSensor")[0]
+    nid = sample_robot.node_id(sensor)
+    with sample_robot.transaction() as tx:
+        tx.delete(sensor)
+    del sensor, tx
+    gc.collect()
+    assert sample_robot.node_by_id(nid) is None
+    assert sample_robot.node_by_id(12345) is None
+    try:
+        sample_robot.node_id(sample_robot.search_first("maxTorque"))
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("properties have no node id")
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+import trimesh
+
+from urdf_converter.core import sphere_tree as st
+from urdf_converter.core.ifs_cache import ifs_cache
+from tests.conftest import ROBOT_PROTO, parse
+
+
+def arrays(mesh):
+    return np.asarray(mesh.vertices, dtype=np.float64), np.asarray(mesh.faces, dtype=np.int64)
+
+
+def assert_tree(levels, branching):
+    assert len(levels[0].radii) == 1 and levels[0].parents.tolist() == [-1]
+    for parent, child in zip(levels, levels[1:]):
+        assert np.bincount(child.parents, minlength=len(parent.radii)).max() <= branching
+        assert set(child.parents.tolist()) == set(range(len(parent.radii)))
+        # every sphere is inside its parent
+        reach = np.linalg.norm(child.centers - parent.centers[child.parents], axis=1) + child.radii
+        assert (reach <= parent.radii[child.parents] + 1e-12).all()
+
+
+# ================== Medial axis ==================
+def test_distance_field_is_the_exact_euclidean_distance():
+    inside = np.random.default_rng(5).random((7, 6, 5)) < 0.8
+    distance = st.distance_field(inside)
+    padded = np.pad(inside, 1)
+    outside = np.argwhere(~padded) - 1
+    for index in np.argwhere(inside)[::7]:
+        expected = np.sqrt(((outside - index) ** 2).sum(axis=1).min())
+        assert distance[tuple(index)] == pytest.approx(expected)
+    assert (distance[~inside] == 0).all()
+
+
+# ================== Sphere tree ==================
+def test_sphere_levels_bound_their_children():
+    rng = np.random.default_rng(6)
+    centers, radii = rng.normal(size=(37, 3)), rng.random(37) * 0.2
+    for branching in (2, 4, 8):
+        levels = st.sphere_levels(centers, radii, branching)
+        assert_tree(levels, branching)
+        assert np.array_equal(levels[-1].centers, centers) and np.array_equal(levels[-1].radii, radii)
+    assert len(st.sphere_levels(centers[:1], radii[:1])) == 1
+
+
+# ================== Fits ==================
+def test_sphere_is_covered_by_few_spheres():
+    fit = st.fit_spheres(*arrays(trimesh.creation.icosphere(3, 0.1)))
+    assert fit.coverage >= st.DEFAULT_OPTIONS.coverage
+    assert fit.overshoot < 0.05
+    assert len(fit.radii) < st.DEFAULT_OPTIONS.max_spheres
+    assert fit.radii.max() == pytest.approx(0.1, rel=0.1)
+
+
+def test_fit_metrics_and_levels(box_mesh):
+    fit = st.fit_spheres(*box_mesh)
+    assert len(fit.radii) <= st.DEFAULT_OPTIONS.max_spheres
+    assert fit.error == pytest.approx(fit.coverage + fit.overshoot - 1.0)
+    assert 0.8 < fit.coverage <= 1.0 and fit.overshoot >= 0
+    assert (np.abs(fit.centers) <= [0.05, 0.1, 0.2]).all()
+    assert np.array_equal(fit.levels[-1].centers, fit.centers)
+    assert np.array_equal(fit.levels[-1].radii, fit.radii)
+    assert_tree(fit.levels, st.DEFAULT_OPTIONS.branching)
+    # fewer spheres allowed: fewer chosen and less covered
+    small = st.fit_spheres(*box_mesh, st.sphere_options(max_spheres=2))
+    assert len(small.radii) == 2 and small.coverage < fit.coverage
+
+
+def test_gains_count_uncovered_bits():
+    rng = np.random.default_rng(7)
+    covers = rng.random((20, 100)) < 0.3
+    uncovered = rng.random(100) < 0.5
+    gains = st._gains(np.packbits(covers, axis=1), np.packbits(uncovered))
+    assert gains.tolist() == (covers & uncovered).sum(axis=1).tolist()
+
+
+def test_fit_does_not_need_numpy_2(box_mesh, monkeypatch):
+    expected = st.fit_spheres(*box_mesh)
+    monkeypatch.delattr(np, "bitwise_count", raising=False)
+    fit = st.fit_spheres(*box_mesh)
+    assert np.array_equal(fit.centers, expected.centers) and fit.coverage == expected.coverage
+
+
+def test_cover_budget_limits_the_candidates(box_mesh, monkeypatch):
+    monkeypatch.setattr(st, "_MAX_COVER_BYTES", 4096)
+    fit = st.fit_spheres(*box_mesh)
+    assert fit is not None and 0 < len(fit.radii) <= st.DEFAULT_OPTIONS.max_spheres
+    assert fit.error == pytest.approx(fit.coverage + fit.overshoot - 1.0)
+
+
+def test_open_mesh_is_not_fitted(box_mesh):
+    vertices, faces = box_mesh
+    assert st.fit_spheres(vertices, faces[:-1]) is None
+
+
+def test_pack_round_trip(box_mesh):
+    fit = st.fit_spheres(*box_mesh)
+    unpacked = st._unpack(st._pack(fit))
+    assert unpacked.kind == fit.kind
+    assert (unpacked.error, unpacked.coverage, unpacked.overshoot) == (fit.error, fit.coverage, fit.overshoot)
+    assert np.array_equal(unpacked.centers, fit.centers) and np.array_equal(unpacked.radii, fit.radii)
+    assert len(unpacked.levels) == len(fit.levels)
+    for level, expected in zip(unpacked.levels, fit.levels):
+        for array, expected_array in zip(level, expected):
+            assert np.array_equal(array, expected_array)
+
+
+# ================== proto rewrite ==================
+def test_bounding_objects_become_sphere_groups(mesh_dir, tmp_path):
+    cache = ifs_cache(tmp_path / "cache")
+    robot = parse(ROBOT_PROTO)
+    report = st.fit_bounding_objects(robot, str(mesh_dir), workers=1, cache=cache)
+    assert [(row.link, row.replaced) for row in report] == [("arm", True), ("robot", True)]
+    spheres = robot.find_by_type("Sphere")
+    assert len(spheres) == sum(len(row.fit.radii) for row in report)
+    again = st.fit_bounding_objects(parse(ROBOT_PROTO), str(mesh_dir), workers=1, cache=cache)
+    assert cache.hits == 2
+    assert [np.array_equal(a.fit.radii, b.fit.radii) for a, b in zip(report, again)] == [True, True]
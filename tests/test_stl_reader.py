@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+import trimesh
+
+from urdf_converter.core import stl_reader
+
+
+def trimesh_arrays(path):
+    mesh = trimesh.load(str(path), force="mesh")
+    return np.asarray(mesh.vertices), np.asarray(mesh.faces)
+
+
+@pytest.fixture
+def cylinder_files(tmp_path):
+    """The same cylinder as binary STL, ASCII STL and binary STL with a "solid" header"""
+    mesh = trimesh.creation.cylinder(0.05, 0.3, sections=24)
+    binary = tmp_path / "cylinder.stl"
+    mesh.export(binary)
+    ascii_path = tmp_path / "cylinder_ascii.stl"
+    mesh.export(ascii_path, file_type="stl_ascii")
+    solid = tmp_path / "cylinder_solid.stl"
+    data = bytearray(binary.read_bytes())
+    data[:80] = b"solid exported by a CAD tool".ljust(80, b" ")
+    solid.write_bytes(bytes(data))
+    return binary, ascii_path, solid
+
+
+def test_binary_read_matches_trimesh(cylinder_files):
+    binary, _, solid = cylinder_files
+    vertices, faces = stl_reader.read_stl(binary)
+    expected_vertices, expected_faces = trimesh_arrays(binary)
+    assert vertices.dtype == np.float64 and faces.dtype == np.int64
+    assert np.array_equal(vertices, expected_vertices)
+    assert np.array_equal(faces, expected_faces)
+    # a binary header starting with "solid" is still binary
+    assert stl_reader.is_binary_stl(solid)
+    solid_vertices, solid_faces = stl_reader.read_stl(solid)
+    assert np.array_equal(solid_vertices, vertices) and np.array_equal(solid_faces, faces)
+
+
+def test_ascii_fallback_matches_trimesh(cylinder_files):
+    binary, ascii_path, _ = cylinder_files
+    assert not stl_reader.is_binary_stl(ascii_path)
+    assert stl_reader.read_stl_records(ascii_path) is None
+    vertices, faces = stl_reader.read_stl(ascii_path)
+    expected_vertices, expected_faces = trimesh_arrays(ascii_path)
+    assert np.allclose(vertices, expected_vertices)
+    assert np.array_equal(faces, expected_faces)
+    # the float32 corners of the binary file: the same mesh
+    assert np.array_equal(faces, stl_reader.read_stl(binary)[1])
+
+
+def test_face_count(cylinder_files, tmp_path):
+    binary, ascii_path, solid = cylinder_files
+    count = len(trimesh_arrays(binary)[1])
+    assert stl_reader.stl_face_count(binary) == stl_reader.stl_face_count(solid) == count
+    # "endfacet" split across chunks is counted once
+    for chunk_bytes in (3, 7, 64, 1 << 20):
+        assert stl_reader.stl_face_count(ascii_path, chunk_bytes=chunk_bytes) == count
+    # trailing bytes: only the complete records
+    truncated = tmp_path / "truncated.stl"
+    truncated.write_bytes(binary.read_bytes()[:-10])
+    assert stl_reader.stl_face_count(truncated) == count - 1
+    assert len(stl_reader.read_stl_triangles(truncated)) == count - 1
+
+
+def test_ascii_vertex_count_must_be_a_multiple_of_three(tmp_path):
+    path = tmp_path / "broken.stl"
+    path.write_text("solid broken\nfacet normal 0 0 1\nouter loop\nvertex 0 0 0\nvertex 1 0 0\n"
+                    "endloop\nendfacet\nendsolid broken\n")
+    with pytest.raises(ValueError):
+        stl_reader.read_stl(path)
+
+
+def test_merge_drops_non_finite_triangles():
+    triangles = np.array([[[0, 0, 0], [1, 0, 0], [0, 1, 0]],
+                          [[0, 0, 0], [np.nan, 0, 0], [0, 1, 0]],
+                          [[1, 0, 0], [1, 1, 0], [0, 1, 0]]])
+    vertices, faces = stl_reader.merge_triangle_vertices(triangles)
+    assert vertices.tolist() == [[0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 1, 0]]
+    assert faces.tolist() == [[0, 1, 2], [1, 3, 2]]